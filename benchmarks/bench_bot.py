@@ -0,0 +1,274 @@
+"""Benchmarks of the hot paths of the bot
+
+Each benchmark reports the median time per call over its repeats.  The
+results are compared to benchmarks/baseline.json, scaled by the speed of a
+calibration loop on this machine against the one of the baseline, and the run
+fails when one of them is slower than the baseline by more than the threshold.
+
+    python benchmarks/bench_bot.py [--save] [--threshold 0.5]
+"""
+# Standard Library
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import timeit
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator
+from unittest.mock import patch
+
+from crypto_bot import bot, logs, recorder
+
+BASELINE = Path(__file__).with_name("baseline.json")
+# the timings of a benchmark, the median of them is kept
+REPEAT = 15
+# the loop timed beside the benchmarks, to scale the baseline to the machine
+CALIBRATION = "_calibration"
+
+
+class FakeExchange(bot.Exchange):
+    """ An exchange answering from memory, and never sleeping """
+
+    def __init__(self, position: bot.Position, orders: bot.Orders) -> None:
+        self._position = position
+        self._orders = orders
+        self.iterations = 0
+        self.clock = self
+
+    def sleep(self, seconds: float) -> None:
+        pass
+
+    @property
+    def position(self) -> bot.Position:
+        # a single iteration of the cycle, then the position is closed
+        self.iterations += 1
+        if self.iterations % 2 == 0:
+            raise bot.NotInCycle
+        return self._position
+
+    @property
+    def orders(self) -> bot.Orders:
+        return self._orders.copy()
+
+    @property
+    def ask(self) -> float:
+        return self._position.entry_price
+
+    def long(self, price: float, quantity: int) -> None:
+        pass
+
+    def short(self, price: float, quantity: int) -> None:
+        pass
+
+    def cancel(self, order_id: str) -> None:
+        pass
+
+    def cancel_all(self) -> None:
+        pass
+
+
+def ladder_orders(entry_price: float, quantity: int) -> bot.Orders:
+    """ The orders of a cycle in a steady state """
+    longs = {
+        f"long-{qty}": bot.Order(f"long-{qty}", "Buy", price, qty, "New")
+        for price, qty, _ in bot.allocate_longs(entry_price, quantity * 2)
+    }
+    shorts = {"short": bot.Order("short", "Sell", entry_price + 250, quantity, "New")}
+    return bot.Orders(longs, shorts)
+
+
+def feedback_burst(messages: int) -> Iterator[list]:
+    """ Order messages moving a deep ladder up and down """
+    for index in range(messages):
+        qty = 2 ** (index % 11)
+        status = "New" if index % 3 else "Filled"
+        yield [
+            {
+                "order_id": f"order-{index % 50}",
+                "order_link_id": "",
+                "side": "Buy" if index % 5 else "Sell",
+                "price": str(50000 + index % 50),
+                "qty": str(qty),
+                "order_status": status,
+            }
+        ]
+
+
+def bench_round_point() -> Iterator[Callable[[], object]]:
+    yield lambda: bot.round_point(60827.25060827)
+
+
+def bench_allocate_longs() -> Iterator[Callable[[], object]]:
+    yield lambda: list(bot.allocate_longs(60000.0, 2))
+
+
+def bench_orders_setter() -> Iterator[Callable[[], object]]:
+    """ A burst of 1000 order feedback dispatched to the exchange """
+    os.environ.setdefault("BYBIT_MAINNET_API_KEY", "")
+    os.environ.setdefault("BYBIT_MAINNET_API_SECRET", "")
+    with patch("crypto_bot.bot.bybit"), patch("crypto_bot.bot.BybitWebsocket"):
+        exchange = bot.BybitExchange()
+    burst = list(feedback_burst(1000))
+
+    def run() -> None:
+        for feedback in burst:
+            exchange.feedback.dispatch(feedback)
+
+    yield run
+
+
+def orderbook_burst(messages: int) -> Iterator[dict]:
+    """ orderBookL2_25 deltas updating and replacing a few levels """
+    for index in range(messages):
+        level = {"symbol": "BTCUSD", "side": "Buy" if index % 2 else "Sell"}
+        price = 50000 + index % 25
+        yield {
+            "delete": [dict(level, id=price * 10000, price=str(price))]
+            if index % 4 == 0
+            else [],
+            "update": [dict(level, id=price * 10000 + 5000, size=index)],
+            "insert": [dict(level, id=price * 10000, price=str(price), size=index)]
+            if index % 4 == 0
+            else [],
+        }
+
+
+def bench_record_orderbook() -> Iterator[Callable[[], object]]:
+    """ A burst of 1000 orderBookL2_25 deltas buffered by the recorder """
+    burst = list(orderbook_burst(1000))
+    with tempfile.TemporaryDirectory() as directory:
+        writer = recorder.ChunkWriter(directory, recorder.BOOK)
+
+        def run() -> None:
+            # rewind the buffer, the chunks written to the disk would time its
+            # writeback rather than the recorder
+            writer.length = 0
+            writer.append(
+                [row for delta in burst for row in recorder.book_rows(0, delta)]
+            )
+
+        yield run
+
+
+def bench_start_cycle_steady() -> Iterator[Callable[[], object]]:
+    """ An iteration of start_cycle where nothing has to change """
+    position = bot.Position(60000.0, 60000.0, 1, 120, "", 120, 0, 30000.0)
+    charlie = bot.CharlieBot(
+        250, 25, 1, "fake", FakeExchange(position, ladder_orders(60000.0, 1))
+    )
+    yield charlie.start_cycle
+
+
+def bench_start_cycle_reladder() -> Iterator[Callable[[], object]]:
+    """ An iteration of start_cycle after a long has been filled """
+    position = bot.Position(59909.0, 59909.0, 3, 120, "", 120, 0, 30000.0)
+    charlie = bot.CharlieBot(
+        250, 25, 1, "fake", FakeExchange(position, ladder_orders(60000.0, 1))
+    )
+    yield charlie.start_cycle
+
+
+def bench_log_record() -> Iterator[Callable[[], object]]:
+    """ An INFO record of the trading loop handed to the logs thread """
+    logger = logging.getLogger("crypto_bot.bench")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    handler = logs.AsyncHandler([logging.NullHandler()])
+    handler.addFilter(logs.Sampler())
+    logger.addHandler(handler)
+    handler.start()
+    position = bot.Position(60000.0, 60000.0, 1, 120, "", 120, 0, 30000.0)
+    try:
+        yield lambda: logger.info("Position: %s", position)
+    finally:
+        handler.stop()
+        logger.removeHandler(handler)
+
+
+BENCHMARKS = {
+    name[len("bench_") :]: function
+    for name, function in list(globals().items())
+    if name.startswith("bench_")
+}
+
+
+def calibration() -> Callable[[], object]:
+    """ Pure Python work, its time tells the speed of the machine """
+    return lambda: sorted(str(number) for number in range(500))
+
+
+def measure(function: Callable[[], object]) -> float:
+    """ Median time per call of `function`, in seconds """
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return statistics.median(timer.repeat(REPEAT, number)) / number
+
+
+def timed(setup: Callable[[], Iterator[Callable[[], object]]]) -> float:
+    """ Median time per call of the benchmark, then tear it down """
+    with contextmanager(setup)() as function:
+        return measure(function)
+
+
+def speed(results: Dict[str, float], baseline: Dict[str, float]) -> float:
+    """How much slower this machine runs the calibration than the baseline, a
+    faster one keeps the baseline as it is"""
+    if CALIBRATION in results and CALIBRATION in baseline:
+        return max(results[CALIBRATION] / baseline[CALIBRATION], 1.0)
+    return 1.0
+
+
+def compare(
+    results: Dict[str, float], baseline: Dict[str, float], threshold: float
+) -> Dict[str, float]:
+    """Return the benchmarks slower than the baseline by more than threshold,
+    once the baseline is scaled by the speed of the machine"""
+    scale = speed(results, baseline)
+    return {
+        name: seconds / (baseline[name] * scale) - 1
+        for name, seconds in results.items()
+        if name != CALIBRATION
+        and name in baseline
+        and seconds > baseline[name] * scale * (1 + threshold)
+    }
+
+
+def main() -> int:
+    parser = ArgumentParser(description="Benchmark the hot paths of the bot")
+    parser.add_argument("--save", action="store_true", help="update the baseline")
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    args = parser.parse_args()
+
+    bot.LOGGER.setLevel(logging.WARNING)
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    # the calibration is timed before and after, as the load of the machine
+    # may change while the benchmarks run
+    before = measure(calibration())
+    results = {name: timed(setup) for name, setup in BENCHMARKS.items()}
+    results[CALIBRATION] = (before + measure(calibration())) / 2
+    scale = speed(results, baseline)
+    for name, seconds in results.items():
+        reference = baseline.get(name)
+        if name != CALIBRATION and reference:
+            reference *= scale
+        change = f"{seconds / reference - 1:+.1%}" if reference else "new"
+        print(f"{name:<24} {seconds * 1e6:12.2f} us  {change}")
+
+    if args.save:
+        args.baseline.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    for name, slower in regressions.items():
+        print(f"REGRESSION {name}: {slower:+.1%} (threshold {args.threshold:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,6 +16,10 @@ setup(
     packages=find_packages("src"),
     include_package_data=True,
     tests_require=['nose2'],
+    extras_require={
+        'backtest': ['numpy'],
+        'record': ['numpy'],
+    },
     test_suite='nose2.collector.collector',
     entry_points={
         "console_scripts": [
@@ -0,0 +1,354 @@
+# Standard Library
+import csv
+import logging
+from argparse import ArgumentParser
+from itertools import count
+from random import Random
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np  # type: ignore
+
+from crypto_bot.bot import (
+    LOGGER,
+    CharlieBot,
+    Clock,
+    Exchange,
+    Ladder,
+    NotInCycle,
+    Order,
+    OrderCancelled,
+    Orders,
+    Position,
+    liquidation_price,
+    round_point,
+)
+
+TICK = 0.5
+# Bybit pays a rebate to the PostOnly orders
+MAKER_FEE = -0.00025
+MAINTENANCE_MARGIN = 0.005
+# the seed of the random choices of a simulated bot, so a run replays the same
+SEED = 0
+
+
+class EndOfData(Exception):
+    """ The recorded market data is exhausted """
+
+
+class Cycle(NamedTuple):
+    """ A cycle from the first long filled to the position closed """
+
+    start: float
+    end: float
+    pnl: float
+    max_quantity: int
+    min_liquidation_distance: float
+
+
+class Report(NamedTuple):
+    """ The outcome of a backtest, the pnl are in BTC """
+
+    cycles: List[Cycle]
+    pnl: float
+    max_drawdown: float
+    max_quantity: int
+    min_liquidation_distance: float
+    end: float
+
+
+class SimulatedClock(Clock):
+    """ Sleeping moves the simulated exchange forward in the recorded data """
+
+    def __init__(self, exchange: "SimulatedExchange") -> None:
+        self.exchange = exchange
+
+    def time(self) -> float:
+        return self.exchange.now
+
+    def sleep(self, seconds: float) -> None:
+        self.exchange.advance(seconds)
+
+
+class SimulatedExchange(Exchange):
+    """Match our orders against recorded trades or klines
+
+    The `lows` and `highs` of klines default to the trade prices.  A long is
+    filled once the market trades at or below its price and a short at or
+    above it.  A PostOnly order that would cross the book is cancelled, the
+    same way Bybit does.  The bid is the last price and the ask is one tick
+    above.  CharlieBot only holds longs, so the shorts only reduce the
+    position, and the position is closed at the liquidation price when the
+    market reaches it.
+    """
+
+    supports_amend = True
+
+    def __init__(
+        self,
+        timestamps: np.ndarray,
+        prices: np.ndarray,
+        lows: Optional[np.ndarray] = None,
+        highs: Optional[np.ndarray] = None,
+        balance: float = 0.01,
+        maker_fee: float = MAKER_FEE,
+        maintenance_margin: float = MAINTENANCE_MARGIN,
+    ) -> None:
+        self.timestamps = np.asarray(timestamps, dtype=float)
+        self.prices = np.asarray(prices, dtype=float)
+        self.lows = self.prices if lows is None else np.asarray(lows, dtype=float)
+        self.highs = self.prices if highs is None else np.asarray(highs, dtype=float)
+        self.balance = balance
+        self.maker_fee = maker_fee
+        self.maintenance_margin = maintenance_margin
+        self.clock = SimulatedClock(self)
+        self.random = Random(SEED)
+
+        self.cursor = 0
+        self.now = float(self.timestamps[0])
+        self.quantity = 0
+        self.entry_price = 0.0
+        self._resting: Dict[str, Order] = {}
+        self._orders = Orders()
+        self._ids = count(1)
+
+        self.cycles: List[Cycle] = []
+        self._cycle_start = 0.0
+        self._cycle_pnl = 0.0
+        self._cycle_quantity = 0
+        self._cycle_distance = np.inf
+        self._peak = balance
+        self.max_drawdown = 0.0
+
+    @property
+    def price(self) -> float:
+        return float(self.prices[self.cursor])
+
+    @property
+    def bid(self) -> float:
+        return self.price
+
+    @property
+    def ask(self) -> float:
+        return self.price + TICK
+
+    @property
+    def orders(self) -> Orders:
+        return self._orders.copy()
+
+    @property
+    def liquidation(self) -> float:
+        return liquidation_price(
+            self.quantity, self.entry_price, self.balance, 0, 0, self.maintenance_margin
+        )
+
+    @property
+    def position(self) -> Position:
+        if self.quantity == 0:
+            raise NotInCycle
+        return Position(
+            round_point(self.entry_price),
+            self.entry_price,
+            self.quantity,
+            120,
+            "",
+            120,
+            self.unrealised_pnl(self.price),
+            self.liquidation,
+        )
+
+    def unrealised_pnl(self, price: float) -> float:
+        if self.quantity == 0:
+            return 0.0
+        return self.quantity * (1 / self.entry_price - 1 / price)
+
+    def _new(self, side: str, price: float, quantity: int) -> str:
+        order = Order(f"sim-{next(self._ids)}", side, price, quantity, "New")
+        if (side == "Buy" and price >= self.ask) or (
+            side == "Sell" and price <= self.bid
+        ):
+            self._orders.update(order._replace(order_status="Cancelled"))
+            raise OrderCancelled
+        self._resting[order.order_id] = order
+        self._orders.update(order)
+        return order.order_id
+
+    def long(self, price: float, quantity: int) -> None:
+        self._new("Buy", price, quantity)
+
+    def short(self, price: float, quantity: int) -> None:
+        self._new("Sell", price, quantity)
+
+    def cancel(self, order_id: str) -> None:
+        order = self._resting.pop(order_id, None)
+        if order is not None:
+            self._orders.update(order._replace(order_status="Cancelled"))
+
+    def cancel_all(self) -> None:
+        for order_id in list(self._resting):
+            self.cancel(order_id)
+
+    def amend(self, order_id: str, price: float, quantity: int) -> None:
+        order = self._resting[order_id]
+        self.cancel(order_id)
+        self._new(order.side, price, quantity)
+
+    def _fill(self, order: Order) -> None:
+        del self._resting[order.order_id]
+        self._orders.update(order._replace(order_status="Filled"))
+        self.balance -= order.quantity / order.price * self.maker_fee
+        if order.side == "Buy":
+            if self.quantity == 0:
+                self._cycle_start, self._cycle_pnl = self.now, 0.0
+                self._cycle_quantity, self._cycle_distance = 0, np.inf
+            quantity = self.quantity + order.quantity
+            self.entry_price = quantity / (
+                self.quantity / (self.entry_price or 1) + order.quantity / order.price
+            )
+            self.quantity = quantity
+            self._cycle_quantity = max(self._cycle_quantity, quantity)
+        elif self.quantity:
+            self._close(min(order.quantity, self.quantity), order.price)
+
+    def _close(self, quantity: int, price: float) -> None:
+        pnl = quantity * (1 / self.entry_price - 1 / price)
+        self.balance += pnl
+        self._cycle_pnl += pnl
+        self.quantity -= quantity
+        if self.quantity == 0:
+            self.cycles.append(
+                Cycle(
+                    self._cycle_start,
+                    self.now,
+                    self._cycle_pnl,
+                    self._cycle_quantity,
+                    float(self._cycle_distance),
+                )
+            )
+            self.entry_price = 0.0
+
+    def advance(self, seconds: float) -> None:
+        """Move the time forward and match the resting orders against the
+        prices traded meanwhile"""
+        end = int(np.searchsorted(self.timestamps, self.now + seconds, "right"))
+        if end >= len(self.timestamps):
+            raise EndOfData
+        window = slice(self.cursor + 1, end)
+        self.now += seconds
+        if window.start >= window.stop:
+            return
+
+        # first index of the window where each order is crossed
+        running_low = np.minimum.accumulate(self.lows[window])
+        running_high = np.maximum.accumulate(self.highs[window])
+        orders = list(self._resting.values())
+        prices = np.array([order.price for order in orders])
+        buys = np.array([order.side == "Buy" for order in orders], dtype=bool)
+        hits = np.where(
+            buys,
+            np.searchsorted(-running_low, -prices, "left"),
+            np.searchsorted(running_high, prices, "left"),
+        )
+        for index in np.argsort(hits, kind="stable"):
+            if hits[index] < len(running_low):
+                self._fill(orders[index])
+
+        if self.quantity:
+            low = float(running_low[-1])
+            liquidation = self.liquidation
+            self._cycle_distance = min(
+                self._cycle_distance, (low - liquidation) / low
+            )
+            if low <= liquidation:
+                LOGGER.warning(f"Liquidated at {liquidation}")
+                self._close(self.quantity, liquidation)
+                self.cancel_all()
+        self.cursor = end - 1
+        equity = self.balance + self.unrealised_pnl(self.price)
+        self._peak = max(self._peak, equity)
+        self.max_drawdown = max(self.max_drawdown, (self._peak - equity) / self._peak)
+
+    def report(self) -> Report:
+        return Report(
+            self.cycles,
+            sum(cycle.pnl for cycle in self.cycles),
+            self.max_drawdown,
+            max((cycle.max_quantity for cycle in self.cycles), default=0),
+            min((cycle.min_liquidation_distance for cycle in self.cycles), default=0),
+            self.now,
+        )
+
+
+def load_prices(path: str) -> np.ndarray:
+    """Load a CSV of trades (timestamp, price) or klines (open_time, low,
+    high, close) as a structured array"""
+    with open(path) as f:
+        header = next(csv.reader(f))
+    if "close" in header:
+        names = {"open_time": "timestamp", "close": "price", "low": "low", "high": "high"}
+    else:
+        names = {"timestamp": "timestamp", "price": "price"}
+    columns = [header.index(name) for name in names]
+    data = np.loadtxt(path, delimiter=",", skiprows=1, usecols=columns, ndmin=2)
+    prices = np.empty(len(data), dtype=[(name, float) for name in names.values()])
+    for index, name in enumerate(names.values()):
+        prices[name] = data[:, index]
+    return prices
+
+
+def backtest(
+    prices: np.ndarray,
+    short_big_spread: int,
+    short_small_spread: int,
+    init_quantity: int,
+    balance: float = 0.01,
+    ladder: Ladder = Ladder(),
+) -> Report:
+    """ Run CharlieBot on the prices until they are exhausted """
+    names = prices.dtype.names or ()
+    exchange = SimulatedExchange(
+        prices["timestamp"],
+        prices["price"],
+        prices["low"] if "low" in names else None,
+        prices["high"] if "high" in names else None,
+        balance=balance,
+    )
+    bot = CharlieBot(
+        short_big_spread,
+        short_small_spread,
+        init_quantity,
+        "simulated",
+        exchange,
+        ladder,
+    )
+    try:
+        bot.trade()
+    except EndOfData:
+        pass
+    return exchange.report()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """ Entry point of cbot backtest """
+    parser = ArgumentParser(description="Backtest CharlieBot on recorded prices")
+    parser.add_argument("prices", help="CSV of trades or klines")
+    parser.add_argument("short_big_spread", type=int)
+    parser.add_argument("short_small_spread", type=int)
+    parser.add_argument("initial_quantity", type=int)
+    parser.add_argument("--balance", type=float, default=0.01, help="in BTC")
+    args = parser.parse_args(argv)
+
+    LOGGER.setLevel(logging.WARNING)
+    report = backtest(
+        load_prices(args.prices),
+        args.short_big_spread,
+        args.short_small_spread,
+        args.initial_quantity,
+        args.balance,
+    )
+    for cycle in report.cycles:
+        print(cycle)
+    print(
+        f"cycles: {len(report.cycles)} pnl: {report.pnl:.8f} BTC "
+        f"max drawdown: {report.max_drawdown:.2%} max quantity: {report.max_quantity} "
+        f"closest to liquidation: {report.min_liquidation_distance:.2%}"
+    )
@@ -1,23 +1,106 @@
 # Standard Library
 import logging
+import sys
 from argparse import ArgumentParser
+from bisect import bisect_left, insort
+from collections import Counter, OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from datetime import datetime
-from itertools import count, zip_longest
-from os import environ
-from time import sleep
-from typing import Dict, NamedTuple, Iterator, Tuple, List
+from importlib import import_module
+from itertools import count
+from os import environ, path
+from random import Random
+from threading import Condition, Event, Lock, Thread
+from time import perf_counter, sleep, time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping as MappingType,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+from uuid import uuid4
 
 import bybit  # type: ignore
 import BybitWebsocket  # type: ignore
 
+from crypto_bot import logs, metrics
+from crypto_bot.client import Lazy, cached_client
+from crypto_bot.journal import Journal
+from crypto_bot.metrics import METRICS
+from crypto_bot.scheduler import PRIORITIES, RequestScheduler
+
 LOGGER = logging.getLogger("crypto_bot")
 logging.basicConfig(format="%(asctime)s - %(levelname)s - %(funcName)s: %(message)s")
 LOGGER.setLevel(logging.INFO)
 
 
+# the longest trigger_long waits for an event before checking again
 SLEEP_REST = 5
 TRESHOLD_REST = 5
 SLEEP_WS = 1
+FEEDBACK_TIMEOUT = 30
+FEEDBACK_POLL = 0.01
+FEEDBACK_BACKLOG = 1024
+# BybitWebsocket keeps at most 200 messages per topic
+FEEDBACK_DRAIN = 200
+PLACE_WORKERS = 4
+# a rejected PostOnly order is sent again until it is accepted, after a
+# backoff doubling from PLACE_BACKOFF_MIN to PLACE_BACKOFF_MAX seconds
+PLACE_BACKOFF_MIN = 0.05
+PLACE_BACKOFF_MAX = 2.0
+# the PostOnly orders keep the nearest distance from the touch, in ticks, at
+# which at most PLACE_REJECTIONS of them were rejected, up to PLACE_OFFSETS
+PLACE_REJECTIONS = 0.2
+PLACE_OFFSETS = 20
+PRICE_TICK = 0.5
+# Order_getOrders returns at most 50 orders per page
+ORDERS_PAGE = 50
+BOOK_MAX_AGE = 1.0
+POSITION_CHECK = 60
+# the live orders are checked over REST every RECONCILE_EVERY seconds
+RECONCILE_EVERY = 30
+LIVE_STATUSES = ("New", "PartiallyFilled")
+# the ret_codes of a cancel of an order filled or cancelled meanwhile: order
+# not exists or too late to cancel, order filled or cancelled, already cancelled
+CANCEL_FINISHED = (20001, 30032, 30037)
+# the websocket is pinged every HEARTBEAT seconds in the background, and
+# reconnected once nothing was received for HEARTBEAT_TIMEOUT seconds
+HEARTBEAT = 5
+HEARTBEAT_TIMEOUT = 20
+# a failed reconnection is retried after a backoff doubling up to the max
+RECONNECT_MIN = 1
+RECONNECT_MAX = 60
+WS_URL = "wss://stream-testnet.bybit.com/realtime"
+# where the API spec is cached, None to always download it
+SPEC_CACHE: Optional[str] = path.join(
+    environ.get("XDG_CACHE_HOME", path.join(path.expanduser("~"), ".cache")),
+    "crypto_bot",
+)
+# where the journals of the bots are kept
+JOURNAL_DIR = path.join(
+    environ.get("XDG_STATE_HOME", path.join(path.expanduser("~"), ".local", "state")),
+    "crypto_bot",
+)
+# the phases of a cycle, in the order CharlieBot goes through them
+PHASES = ("trigger_long", "trigger_complete", "start_cycle")
+
+# sub-commands of cbot and the module that implements them
+COMMANDS = {
+    "backtest": "crypto_bot.backtest",
+    "loadtest": "crypto_bot.standin",
+    "record": "crypto_bot.recorder",
+    "replay": "crypto_bot.replay",
+    "run": "crypto_bot.runner",
+    "risk": "crypto_bot.risk",
+    "sweep": "crypto_bot.sweep",
+}
 
 
 class NotInCycle(Exception):
@@ -28,6 +111,18 @@ class OrderCancelled(Exception):
     """ We are not yet in a cycle """
 
 
+class FeedbackTimeout(Exception):
+    """ The exchange did not acknowledge our request in time """
+
+
+class OrderRejected(OrderCancelled):
+    """ The exchange refused our request, with a non-zero ret_code """
+
+    def __init__(self, ret_code: int, ret_msg: str) -> None:
+        super().__init__(f"{ret_code}: {ret_msg}")
+        self.ret_code = ret_code
+
+
 class Position(NamedTuple):
     """ The order that has been executed and added to the portfolio """
 
@@ -49,20 +144,191 @@ class Order(NamedTuple):
     order_status: str
 
 
-class Orders(NamedTuple):
-    longs: Dict[str, Order]
-    shorts: Dict[str, Order]
+class Request(NamedTuple):
+    """An order request sent without waiting for its ack, the future
+    resolves with the ack"""
+
+    key: str
+    operation: str
+    sent: float
+    future: Future
+
+
+class Placement(NamedTuple):
+    """ The outcome of an order sent with Exchange.place_many """
+
+    side: str
+    price: float
+    quantity: int
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class OrderIndex(Mapping):
+    """The orders of one side by order_id, sorted by quantity and by price
+
+    The quantity and price indexes are sorted lists maintained with bisect,
+    so an order update moves one entry instead of resorting the side.  The
+    iteration follows the quantity, the older order first for a same
+    quantity, and `quantity` is the running total of the side.
+    """
+
+    __slots__ = ("_orders", "_keys", "_by_quantity", "_by_price", "_seq", "quantity")
+
+    def __init__(self, orders: Iterable[Order] = ()) -> None:
+        self._orders: Dict[str, Order] = {}
+        self._keys: Dict[str, Tuple[Tuple[int, int, str], Tuple[float, int, str]]] = {}
+        self._by_quantity: List[Tuple[int, int, str]] = []
+        self._by_price: List[Tuple[float, int, str]] = []
+        self._seq = 0
+        self.quantity = 0
+        for order in orders:
+            self._insert(order)
+
+    def __getitem__(self, order_id: str) -> Order:
+        return self._orders[order_id]
+
+    def __iter__(self) -> Iterator[str]:
+        return (order_id for _, _, order_id in self._by_quantity)
+
+    def __len__(self) -> int:
+        return len(self._orders)
+
+    def __repr__(self) -> str:
+        return repr(dict(self.items()))
+
+    def _insert(self, order: Order) -> None:
+        self._seq += 1
+        keys = (
+            (order.quantity, self._seq, order.order_id),
+            (order.price, self._seq, order.order_id),
+        )
+        self._orders[order.order_id] = order
+        self._keys[order.order_id] = keys
+        insort(self._by_quantity, keys[0])
+        insort(self._by_price, keys[1])
+        self.quantity += order.quantity
+
+    def remove(self, order_id: str) -> Optional[Order]:
+        """ Remove the order from the indexes """
+        order = self._orders.pop(order_id, None)
+        if order is None:
+            return None
+        by_quantity, by_price = self._keys.pop(order_id)
+        del self._by_quantity[bisect_left(self._by_quantity, by_quantity)]
+        del self._by_price[bisect_left(self._by_price, by_price)]
+        self.quantity -= order.quantity
+        return order
+
+    def update(self, order: Order) -> None:
+        """ Insert or update the order, drop it once it is no longer live """
+        current = self._orders.get(order.order_id)
+        if current is not None and order.order_status in LIVE_STATUSES:
+            if (current.price, current.quantity) == (order.price, order.quantity):
+                self._orders[order.order_id] = order
+                return
+        self.remove(order.order_id)
+        if order.order_status in LIVE_STATUSES:
+            self._insert(order)
+
+    def head(self) -> Order:
+        """ The order with the smallest quantity """
+        return self._orders[self._by_quantity[0][2]]
+
+    def by_price(self) -> Iterator[Order]:
+        """ The orders from the lowest to the highest price """
+        return (self._orders[order_id] for _, _, order_id in self._by_price)
+
+    def copy(self) -> "OrderIndex":
+        index = OrderIndex.__new__(OrderIndex)
+        index._orders = dict(self._orders)
+        index._keys = dict(self._keys)
+        index._by_quantity = list(self._by_quantity)
+        index._by_price = list(self._by_price)
+        index._seq = self._seq
+        index.quantity = self.quantity
+        return index
+
+
+class Orders:
+    """ The live longs and shorts orders """
+
+    __slots__ = ("longs", "shorts")
+
+    def __init__(
+        self,
+        longs: Optional[MappingType[str, Order]] = None,
+        shorts: Optional[MappingType[str, Order]] = None,
+    ) -> None:
+        self.longs = OrderIndex((longs or {}).values())
+        self.shorts = OrderIndex((shorts or {}).values())
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Orders):
+            return NotImplemented
+        return (self.longs, self.shorts) == (other.longs, other.shorts)
+
+    def __repr__(self) -> str:
+        return f"Orders(longs={self.longs!r}, shorts={self.shorts!r})"
+
+    def update(self, order: Order) -> None:
+        """ Apply an order feedback """
+        (self.longs if order.side == "Buy" else self.shorts).update(order)
+
+    def copy(self) -> "Orders":
+        orders = Orders.__new__(Orders)
+        orders.longs, orders.shorts = self.longs.copy(), self.shorts.copy()
+        return orders
 
     def head_longs(self) -> Order:
         """ head of the longs orders """
-        return list(self.longs.values())[0]
+        return self.longs.head()
 
     def shorts_qty(self) -> int:
         """ Provide the sum of quantity """
-        return sum([short.quantity for short in self.shorts.values()])
+        return self.shorts.quantity
+
+
+class LadderDiff(NamedTuple):
+    """ The changes that turn the live orders into the desired ladder """
+
+    keep: List[Order]
+    amend: List[Tuple[Order, float, int]]
+    cancel: List[Order]
+    create: List[Tuple[float, int]]
+
+
+class Clock:
+    """ The time seen by the bot, simulated exchanges bring their own """
+
+    def time(self) -> float:
+        return time()
+
+    def sleep(self, seconds: float) -> None:
+        sleep(seconds)
 
 
 class Exchange:  # pragma: no cover
+    # the exchange can replace the price and quantity of a live order
+    supports_amend = False
+    clock = Clock()
+    # the random choices of the bot, the simulated exchanges seed theirs so
+    # that a run always takes the same path
+    random = Random()
+    # the orders and phase of the bot are recorded to recover from a crash
+    journal: Optional[Journal] = None
+
+    def start(self) -> None:
+        """ Start the background services of the exchange """
+        ...
+
+    def keep_alive(self) -> None:
+        """ Keep the connection alive, unless it is done in the background """
+        ...
+
     @property
     def bid(self) -> float:
         ...
@@ -75,6 +341,11 @@ class Exchange:  # pragma: no cover
     def orders(self) -> Orders:
         ...
 
+    @property
+    def fills(self) -> int:
+        """ The number of trades of our orders, it changes on each fill """
+        return 0
+
     @property
     def position(self) -> Position:
         ...
@@ -91,6 +362,433 @@ class Exchange:  # pragma: no cover
     def cancel(self, order_id: str) -> None:
         ...
 
+    def resync(self) -> Orders:
+        """ Align the orders with the exchange after a restart """
+        return self.orders
+
+    def amend(self, order_id: str, price: float, quantity: int) -> None:
+        raise NotImplementedError("Exchange cannot amend an order")
+
+    def wait_until(self, predicate: Callable[[], bool], timeout: float) -> bool:
+        """Wait until `predicate` is true or for `timeout` seconds, and return
+        the predicate.  Without a stream to wake up on, sleep the timeout."""
+        self.clock.sleep(timeout)
+        return predicate()
+
+    def place(self, side: str, price: float, quantity: int) -> Placement:
+        """ Put a Buy or Sell order and report if it has been rejected """
+        try:
+            if side == "Buy":
+                self.long(price, quantity)
+            else:
+                self.short(price, quantity)
+        except (OrderCancelled, FeedbackTimeout) as error:
+            return Placement(side, price, quantity, error)
+        return Placement(side, price, quantity)
+
+    def place_many(self, orders: Iterable[Tuple[str, float, int]]) -> List[Placement]:
+        """ Put a batch of (side, price, quantity) orders """
+        return [self.place(side, price, quantity) for side, price, quantity in orders]
+
+    def cancel_many(self, order_ids: Iterable[str]) -> List[Optional[BaseException]]:
+        """ Cancel a batch of orders and report the error of each one """
+        errors: List[Optional[BaseException]] = []
+        for order_id in order_ids:
+            try:
+                self.cancel(order_id)
+                errors.append(None)
+            except FeedbackTimeout as error:
+                errors.append(error)
+        return errors
+
+
+def to_order(order: Dict[str, Any]) -> Order:
+    """Convert an order message of the exchange into an Order, its quantity
+    is the part that is not filled yet"""
+    return Order(
+        order["order_id"],
+        order["side"],
+        float(order["price"]),
+        int(order["qty"]) - int(order.get("cum_exec_qty") or 0),
+        order["order_status"],
+    )
+
+
+def drain(ws: Any, topic: str, limit: int = FEEDBACK_DRAIN) -> List[Any]:
+    """ Pop the pending messages of the websocket `topic`, oldest first """
+    messages = []
+    for _ in range(limit):
+        message = ws.get_data(topic)
+        if not message:
+            break
+        messages.append(message)
+    # get_data pops the most recent message first
+    return messages[::-1]
+
+
+def checked(output: Any) -> Any:
+    """The result of a REST response, OrderRejected with the ret_msg of the
+    exchange if its ret_code is an error"""
+    body = output[0]
+    if body.get("ret_code", 0):
+        raise OrderRejected(int(body["ret_code"]), body.get("ret_msg", ""))
+    return body["result"]
+
+
+def new_link_id() -> str:
+    """ A unique order_link_id, Bybit accepts up to 36 characters """
+    return f"cb-{uuid4().hex}"
+
+
+class InFlight:
+    """The order requests sent and not acknowledged yet
+
+    A new order is known by the order_link_id the bot gives it, and also by
+    its order_id once the REST response returns it, a cancel by the order_id.
+    The order feedback resolves the future of the request it acknowledges:
+    with the order for a new one, or OrderCancelled if it was rejected, and
+    with the order once it is closed for a cancel.
+    """
+
+    def __init__(self) -> None:
+        self._requests: Dict[str, Request] = {}
+        self._aliases: Dict[str, str] = {}
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._requests)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._requests
+
+    def add(self, key: str, operation: str) -> Request:
+        request = Request(key, operation, perf_counter(), Future())
+        with self._lock:
+            self._requests[key] = request
+        return request
+
+    def alias(self, key: str, order_id: str) -> None:
+        """ Find the request `key` by the order_id of the exchange too """
+        with self._lock:
+            if key in self._requests:
+                self._aliases[order_id] = key
+
+    def _pop(self, key: str) -> Optional[Request]:
+        request = self._requests.pop(key, None)
+        if request is not None:
+            for order_id, alias in list(self._aliases.items()):
+                if alias == key:
+                    del self._aliases[order_id]
+        return request
+
+    def _match(self, order: Dict[str, Any]) -> Optional[Request]:
+        for key in (order.get("order_link_id"), order["order_id"]):
+            key = self._aliases.get(key, key) if key else None
+            request = self._requests.get(key) if key else None
+            if request is None:
+                continue
+            if request.operation == "Order_cancel" and (
+                order["order_status"] in LIVE_STATUSES
+            ):
+                continue
+            return self._pop(request.key)
+        return None
+
+    def resolve(self, feedback: List[Dict[str, Any]]) -> None:
+        """ Resolve the requests the order feedback acknowledges """
+        for order in feedback:
+            with self._lock:
+                request = self._match(order)
+            if request is None:
+                continue
+            METRICS.record("ws.ack", perf_counter() - request.sent)
+            if request.operation == "Order_new" and (
+                order["order_status"] == "Cancelled"
+            ):
+                LOGGER.warning(f"Order Cancel: {order}")
+                request.future.set_exception(OrderCancelled(order["order_id"]))
+            else:
+                request.future.set_result(order)
+
+    def done(self, key: str) -> None:
+        """ Resolve the request `key` without its ack, if it is still waiting """
+        with self._lock:
+            request = self._pop(key)
+        if request is not None:
+            request.future.set_result(None)
+
+    def fail(self, key: str, error: Exception) -> None:
+        """ Fail the request `key` if it is still waiting for its ack """
+        with self._lock:
+            request = self._pop(key)
+        if request is not None:
+            request.future.set_exception(error)
+
+
+class FeedbackDispatcher:
+    """Route the websocket order feedback to the callers waiting for it
+
+    The acks are indexed by order_id and order_link_id so a caller only wakes
+    up for the order it sent.  BybitWebsocket has no callback, so the socket is
+    drained by a background thread once `start` is called, and by the waiting
+    caller itself otherwise.  The other topics are drained the same way and
+    handed to the handler registered with `route`.
+    """
+
+    def __init__(
+        self,
+        ws: Any,
+        on_orders: Callable[[List[Order]], None],
+        poll: float = FEEDBACK_POLL,
+        backlog: int = FEEDBACK_BACKLOG,
+        clock: Clock = Clock(),
+        in_flight: Optional[InFlight] = None,
+    ) -> None:
+        self.ws = ws
+        self.on_orders = on_orders
+        self.in_flight = in_flight
+        self.poll = poll
+        self.backlog = backlog
+        self.clock = clock
+        self.seq = 0
+        self.updates = 0
+        # when the last message was received, to detect a dead connection
+        self.received = clock.time()
+        self.routes: Dict[str, Callable[[Any], None]] = {}
+        self._acks: "OrderedDict[str, Tuple[int, Dict[str, Any]]]" = OrderedDict()
+        self._last: Optional[Dict[str, Any]] = None
+        self._cond = Condition()
+        self._pump_lock = Lock()
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def route(self, topic: str, handler: Callable[[Any], None]) -> None:
+        """ Hand the messages of the websocket `topic` to `handler` """
+        self.routes[topic] = handler
+
+    def start(self) -> None:
+        """ Pump the websocket in a background thread """
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name="feedback", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if not self.pump():
+                self._stop.wait(self.poll)
+
+    def _drain(self, topic: str) -> List[Any]:
+        return drain(self.ws, topic)
+
+    def pump(self) -> bool:
+        """ Dispatch the pending feedback, return False if there was none """
+        received = False
+        with self._pump_lock:
+            for feedback in self._drain("order"):
+                self.dispatch(feedback)
+                received = True
+            for topic, handler in list(self.routes.items()):
+                for message in self._drain(topic):
+                    handler(message)
+                    received = True
+            if received:
+                self.received = self.clock.time()
+                with self._cond:
+                    self.updates += 1
+                    self._cond.notify_all()
+        return received
+
+    def dispatch(self, feedback: List[Dict[str, Any]]) -> None:
+        """ Update the orders and wake up the callers waiting for an ack """
+        LOGGER.debug("Feedback received: %s", feedback, extra=logs.SAMPLED)
+        orders = [to_order(order) for order in feedback]
+        with self._cond:
+            self.on_orders(orders)
+            for order in feedback:
+                self.seq += 1
+                self._last = order
+                for key in (order["order_id"], order.get("order_link_id")):
+                    if key:
+                        self._acks.pop(key, None)
+                        self._acks[key] = (self.seq, order)
+            while len(self._acks) > self.backlog:
+                self._acks.popitem(last=False)
+            self._cond.notify_all()
+        if self.in_flight is not None:
+            self.in_flight.resolve(feedback)
+
+    def correct(self, orders: List[Order], since: int) -> List[Order]:
+        """Apply the orders of a REST query sent at `since`, but the ones
+        acked since that are more recent, and return the ones applied"""
+        with self._cond:
+            orders = [
+                order
+                for order in orders
+                if self._acks.get(order.order_id, (0, None))[0] <= since
+            ]
+            if orders:
+                self.on_orders(orders)
+        return orders
+
+    def _find(self, key: Optional[str], since: int) -> Optional[Dict[str, Any]]:
+        if key is None:
+            return self._last if self.seq > since else None
+        seq, order = self._acks.get(key, (0, None))
+        return order if seq > since else None
+
+    def acked(self, key: str, since: int) -> Optional[Dict[str, Any]]:
+        """ The last ack received after `since` for the order `key` """
+        with self._cond:
+            return self._find(key, since)
+
+    def watch(self, predicate: Callable[[], bool], timeout: float) -> bool:
+        """Wait until `predicate` is true, checked again after each batch of
+        messages, or for `timeout` seconds, and return the predicate"""
+        deadline = self.clock.time() + timeout
+        while True:
+            updates = self.updates
+            if predicate():
+                return True
+            remaining = deadline - self.clock.time()
+            if remaining <= 0:
+                return False
+            if self.running:
+                with self._cond:
+                    self._cond.wait_for(lambda: self.updates != updates, remaining)
+            elif not self.pump():
+                self.clock.sleep(min(self.poll, remaining))
+
+    def wait(
+        self,
+        key: Optional[str] = None,
+        since: int = 0,
+        timeout: float = FEEDBACK_TIMEOUT,
+    ) -> Dict[str, Any]:
+        """Wait the first ack received after `since` for the order_id or
+        order_link_id `key`, or for any order when `key` is None"""
+        deadline = self.clock.time() + timeout
+        while True:
+            with self._cond:
+                ack = self._find(key, since)
+                if ack is not None:
+                    return ack
+                remaining = deadline - self.clock.time()
+                if remaining <= 0:
+                    raise FeedbackTimeout(f"No feedback received for: {key}")
+                if self.running:
+                    self._cond.wait(remaining)
+                    continue
+            if not self.pump():
+                self.clock.sleep(min(self.poll, remaining))
+
+
+class OrderReconciler:
+    """Check the orders of the exchange against a REST query in the
+    background, every `interval` seconds
+
+    A failed check is logged and retried at the next interval, the trading
+    loop never waits for it.
+    """
+
+    def __init__(self, exchange: "BybitExchange", interval: float) -> None:
+        self.exchange = exchange
+        self.interval = interval
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name="reconcile", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.exchange.reconcile()
+            except Exception:
+                LOGGER.exception("Orders reconciliation failed")
+
+
+class TopOfBook:
+    """Best bid and ask of the symbol kept current from the websocket
+
+    Fed by the orderBookL2_25 snapshots and deltas, and by the bid1/ask1
+    fields of instrument_info.  `updated` is the epoch of the last update.
+    """
+
+    def __init__(self, clock: Clock = Clock()) -> None:
+        self.bid: Optional[float] = None
+        self.ask: Optional[float] = None
+        self.updated = 0.0
+        self.clock = clock
+        self._levels: Dict[str, Dict[int, float]] = {"Buy": {}, "Sell": {}}
+        self._lock = Lock()
+
+    @property
+    def age(self) -> float:
+        """ Number of seconds since the last update """
+        return self.clock.time() - self.updated
+
+    def quote(self, bid: float, ask: float) -> None:
+        """ Set the top of book, used for the REST fallback """
+        with self._lock:
+            self.bid, self.ask, self.updated = bid, ask, self.clock.time()
+
+    def on_orderbook(self, data: Any) -> None:
+        """ Apply an orderBookL2_25 snapshot (list) or delta (dict) """
+        with self._lock:
+            if isinstance(data, list):
+                for levels in self._levels.values():
+                    levels.clear()
+                inserts, deletes = data, []
+            elif isinstance(data, dict):
+                inserts = data.get("update", []) + data.get("insert", [])
+                deletes = data.get("delete", [])
+            else:
+                return
+            for level in deletes:
+                self._levels[level["side"]].pop(level["id"], None)
+            for level in inserts:
+                self._levels[level["side"]][level["id"]] = float(level["price"])
+            bids, asks = self._levels["Buy"], self._levels["Sell"]
+            if bids and asks:
+                self.bid, self.ask = max(bids.values()), min(asks.values())
+                self.updated = self.clock.time()
+
+    def on_instrument(self, data: Any) -> None:
+        """ Apply an instrument_info snapshot (dict) or its update deltas """
+        if not isinstance(data, dict):
+            return
+        with self._lock:
+            for info in data.get("update", [data]):
+                if "bid1_price" in info:
+                    self.bid = float(info["bid1_price"])
+                    self.updated = self.clock.time()
+                if "ask1_price" in info:
+                    self.ask = float(info["ask1_price"])
+                    self.updated = self.clock.time()
+
 
 def convert_epoch(epoch_ms: int) -> str:
     """ Convert a ms epoch to a human readable format """
@@ -145,6 +843,153 @@ def liquidation_price(
     return -1 / Y
 
 
+class PositionStore:
+    """Position of the symbol kept current from the websocket
+
+    A REST snapshot seeds every field of the Position.  Then the position
+    topic sets the size and the entry price.  The execution topic only
+    counts the trades to wake the bot up: it cannot tell whether a position
+    message already included a trade, so it never moves the size.  The size
+    is signed: negative for a short position.
+    """
+
+    def __init__(self, symbol: str, clock: Clock = Clock()) -> None:
+        self.symbol = symbol
+        self.clock = clock
+        self.size = 0
+        self.real_entry_price = 0.0
+        self.trades = 0
+        # the position messages that moved the size
+        self.updates = 0
+        self.snapshot: Optional[Position] = None
+        self.synced = 0.0
+        self._lock = Lock()
+
+    def on_rest(self, my_position: Dict[str, Any]) -> None:
+        """ Reset the position from the Positions_myPosition response """
+        result = my_position["result"]
+        size = int(result["size"]) * (-1 if result["side"] == "Sell" else 1)
+        entry_price = float(result["entry_price"])
+        with self._lock:
+            if self.snapshot and (self.size, self.real_entry_price) != (
+                size,
+                entry_price,
+            ):
+                LOGGER.warning(
+                    f"Position drift: {self.size}@{self.real_entry_price} != {size}@{entry_price}"
+                )
+            self.size, self.real_entry_price = size, entry_price
+            self.snapshot = Position(
+                round_point(entry_price),
+                entry_price,
+                result["size"],
+                my_position["rate_limit_status"],
+                convert_epoch(my_position["rate_limit_reset_ms"]),
+                my_position["rate_limit"],
+                result["unrealised_pnl"],
+                float(result["liq_price"]),
+            )
+            self.synced = self.clock.time()
+
+    def on_position(self, data: Any) -> None:
+        """ Apply the position topic """
+        if not isinstance(data, list):
+            return
+        with self._lock:
+            for update in data:
+                if update.get("symbol") != self.symbol or self.snapshot is None:
+                    continue
+                size = int(update["size"])
+                size = -size if update["side"] == "Sell" else size
+                if size != self.size:
+                    self.updates += 1
+                self.size = size
+                self.real_entry_price = float(update["entry_price"])
+                self.snapshot = self.snapshot._replace(
+                    liq_price=float(update["liq_price"])
+                )
+
+    def on_execution(self, data: Any) -> None:
+        """Count the trades of the execution topic, so the bot can wake up on
+        a fill"""
+        if not isinstance(data, list):
+            return
+        with self._lock:
+            for execution in data:
+                if (
+                    execution.get("symbol") != self.symbol
+                    or execution.get("exec_type", "Trade") != "Trade"
+                ):
+                    continue
+                if int(execution.get("leaves_qty") or 0):
+                    LOGGER.info(
+                        f"Partial fill: {execution.get('order_id')}"
+                        f" {execution['exec_qty']} @ {execution['price']},"
+                        f" {execution['leaves_qty']} left"
+                    )
+                self.trades += 1
+
+    @property
+    def position(self) -> Position:
+        """ Return the position, raise NotInCycle when it is empty """
+        with self._lock:
+            if self.snapshot is None or self.size == 0:
+                raise NotInCycle
+            return self.snapshot._replace(
+                entry_price=round_point(self.real_entry_price),
+                real_entry_price=self.real_entry_price,
+                quantity=abs(self.size),
+            )
+
+
+def diff_ladder(
+    live: Iterable[Order], desired: Iterable[Tuple[float, int]], amend: bool = True
+) -> LadderDiff:
+    """Compute the minimal changes from the live orders to the desired
+    (price, quantity) ladder
+
+    The orders already at a desired rung are kept.  The others are amended
+    in place rung for rung, same quantity first, and only the rest is
+    cancelled or created.
+    """
+    wanted = list(desired)
+    keep, stale = [], []
+    for order in live:
+        if (order.price, order.quantity) in wanted:
+            wanted.remove((order.price, order.quantity))
+            keep.append(order)
+        else:
+            stale.append(order)
+
+    amends = []
+    if amend:
+        # the quantity of an amend includes the part already filled, so a
+        # partly filled order is cancelled and created again instead
+        partial = [o for o in stale if o.order_status == "PartiallyFilled"]
+        stale = [o for o in stale if o.order_status != "PartiallyFilled"]
+        for order in list(stale):
+            rung = next((r for r in wanted if r[1] == order.quantity), None)
+            if rung is not None:
+                wanted.remove(rung)
+                stale.remove(order)
+                amends.append((order, rung[0], rung[1]))
+        stale.sort(key=lambda o: -o.price)
+        wanted.sort(key=lambda r: -r[0])
+        amends += [(order, price, qty) for order, (price, qty) in zip(stale, wanted)]
+        stale, wanted = stale[len(wanted) :] + partial, wanted[len(stale) :]
+
+    return LadderDiff(keep, amends, stale, wanted)
+
+
+class Ladder(NamedTuple):
+    """ The shape of the longs computed by allocate_longs """
+
+    multiplicator: int = 10
+    intercept: int = 7
+    growth_factor: float = 1.3
+    max_quantity: int = 2048
+
+
 def allocate_longs(
     price: float,
     qty: int,
@@ -152,217 +997,597 @@ def allocate_longs(
     multiplicator: int = 10,
     intercept: int = 7,
     growth_factor: float = 1.3,
+    max_quantity: int = 2048,
 ) -> Iterator[Tuple[float, int, float]]:
     """ compute the series of long orders """
-    if qty > 2048:
+    if qty > max_quantity:
         return
     new_price = round_point(
         round_point(price) - multiplicator * intercept * (growth_factor ** idx)
     )
     yield new_price, qty, round(new_price - price)
-    yield from allocate_longs(new_price, qty * 2, idx + 1)
+    yield from allocate_longs(
+        new_price,
+        qty * 2,
+        idx + 1,
+        multiplicator,
+        intercept,
+        growth_factor,
+        max_quantity,
+    )
+
+
+def bybit_client(api_key: str, api_secret: str) -> Any:
+    """ The bybit REST client, built from the cached API spec if possible """
+    rest = None
+    if SPEC_CACHE:
+        rest = cached_client(SPEC_CACHE, True, api_key, api_secret)
+    if rest is None:
+        rest = bybit.bybit(test=True, api_key=api_key, api_secret=api_secret)
+    return rest
+
+
+class Heartbeat:
+    """Ping the websocket of the exchange in the background every `every`
+    seconds, and reconnect it once the ping fails or nothing was received
+    for `timeout` seconds
+
+    A failed reconnection is retried after a backoff doubling from
+    RECONNECT_MIN to RECONNECT_MAX seconds.
+    """
+
+    def __init__(self, exchange: "BybitExchange", every: float, timeout: float):
+        self.exchange = exchange
+        self.every = every
+        self.timeout = timeout
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name="heartbeat", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def beat(self) -> bool:
+        """ Ping the websocket, return False if the connection is dead """
+        feedback = self.exchange.feedback
+        if not feedback.running:
+            feedback.pump()
+        try:
+            self.exchange.ws.ping()
+        except Exception:
+            LOGGER.warning("Websocket ping failed", exc_info=True)
+            return False
+        silence = self.exchange.clock.time() - feedback.received
+        if silence > self.timeout:
+            LOGGER.warning("Websocket silent for %.1fs", silence)
+            return False
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.every):
+            if not self.beat():
+                self.reconnect()
+
+    def reconnect(self) -> None:
+        """ Reconnect the websocket until it succeeds or the thread stops """
+        METRICS.count("ws.disconnected")
+        backoff = RECONNECT_MIN
+        while not self._stop.is_set():
+            try:
+                self.exchange.reconnect()
+                return
+            except Exception:
+                LOGGER.exception("Websocket reconnection failed, retry in %ss", backoff)
+            if self._stop.wait(backoff):
+                return
+            backoff = min(backoff * 2, RECONNECT_MAX)
 
 
 class BybitExchange(Exchange):
-    def __init__(self, symbol: str = "BTCUSD"):
+    def __init__(
+        self,
+        symbol: str = "BTCUSD",
+        book_max_age: float = BOOK_MAX_AGE,
+        position_check: float = POSITION_CHECK,
+        reconcile_every: Optional[float] = RECONCILE_EVERY,
+        heartbeat: Optional[float] = HEARTBEAT,
+        rest: Any = None,
+        ws: Any = None,
+        clock: Optional[Clock] = None,
+        scheduler: Optional[RequestScheduler] = None,
+        journal: Optional[Journal] = None,
+        seed: Optional[int] = None,
+    ):
         self.symbol = symbol
-        self.rest = bybit.bybit(
-            test=True,
-            api_key=environ["BYBIT_MAINNET_API_KEY"],
-            api_secret=environ["BYBIT_MAINNET_API_SECRET"],
+        self.journal = journal
+        self.book_max_age = book_max_age
+        self.position_check = position_check
+        if clock is not None:
+            self.clock = clock
+        if seed is not None:
+            self.random = Random(seed)
+        if scheduler is None:
+            scheduler = RequestScheduler(clock=self.clock.time)
+        self.scheduler = scheduler
+        # the clients are built on their first use, so the commands that do
+        # not trade never touch the network
+        if rest is None:
+            rest = Lazy(self._connect_rest)
+        # only a websocket built here is replaced on a reconnection
+        self._own_ws = ws is None
+        if ws is None:
+            ws = Lazy(self._connect_ws)
+        else:
+            self._subscribe(ws)
+        self.rest = rest
+        self.ws = ws
+        self._orders = Orders(longs={}, shorts={})
+        if journal is not None:
+            for order in journal.orders.values():
+                self._orders.update(Order(**order))
+        self._orders_lock = Lock()
+        self.book = TopOfBook(self.clock)
+        self.positions = PositionStore(symbol, self.clock)
+        self.in_flight = InFlight()
+        # the order requests are sent from these threads, not waiting for the acks
+        self._pipeline = ThreadPoolExecutor(PLACE_WORKERS, thread_name_prefix="send")
+        self.feedback = FeedbackDispatcher(
+            self.ws, self._on_orders, clock=self.clock, in_flight=self.in_flight
+        )
+        self.feedback.route(f"orderBookL2_25.{symbol}", self.book.on_orderbook)
+        self.feedback.route(f"instrument_info.100ms.{symbol}", self.book.on_instrument)
+        # the trades wake the bot up, the position topic then sets the size
+        self.feedback.route("execution", self.positions.on_execution)
+        self.feedback.route("position", self.positions.on_position)
+        # the pongs only tell that the connection is alive
+        self.feedback.route("pong", lambda message: None)
+        self.reconciler = (
+            OrderReconciler(self, reconcile_every) if reconcile_every else None
         )
-        self.ws = BybitWebsocket.BybitWebsocket(
-            wsURL="wss://stream-testnet.bybit.com/realtime",
+        self.heartbeat = (
+            Heartbeat(self, heartbeat, HEARTBEAT_TIMEOUT) if heartbeat else None
+        )
+
+    def _connect_rest(self) -> Any:
+        return bybit_client(
+            environ["BYBIT_MAINNET_API_KEY"], environ["BYBIT_MAINNET_API_SECRET"]
+        )
+
+    def _connect_ws(self) -> Any:
+        ws = BybitWebsocket.BybitWebsocket(
+            wsURL=WS_URL,
             api_key=environ["BYBIT_MAINNET_API_KEY"],
             api_secret=environ["BYBIT_MAINNET_API_SECRET"],
         )
-        self.ws.subscribe_order()
-        self._orders = Orders(longs={}, shorts={})
-
-    def keep_alive(self):
-        """ keep connection alive """
+        self._subscribe(ws)
+        return ws
+
+    def _subscribe(self, ws: Any) -> None:
+        ws.subscribe_order()
+        ws.subscribe_orderBookL2(self.symbol)
+        ws.subscribe_instrument_info(self.symbol)
+        ws.subscribe_execution()
+        ws.subscribe_position()
+
+    def start(self) -> None:
+        """Dispatch the feedback, check the orders and keep the websocket
+        alive in the background"""
+        self.feedback.start()
+        if self.reconciler is not None:
+            self.reconciler.start()
+        if self.heartbeat is not None:
+            self.heartbeat.start()
+
+    def _on_orders(self, orders: List[Order]) -> None:
+        if self.journal is not None:
+            self.journal.ack(order._asdict() for order in orders)
+        self.orders = orders
+
+    def keep_alive(self) -> None:
+        """ Ping the websocket, unless the heartbeat does it in the background """
+        if self.heartbeat is not None and self.heartbeat.running:
+            return
         self.ws.ping()
-        self.ws.get_data("pong")
-
-    def _wait_feedback(self) -> None:
-        """ Wait Bybit feedback and update states """
-        LOGGER.info("Wait for feedback")
-        for _ in range(30):
-            feedback = self.ws.get_data("order")
-            if feedback:
-                if feedback[0]["order_status"] == "Cancelled":
-                    LOGGER.warning(f"Order Cancel: {feedback}")
-                    raise OrderCancelled
-
-                LOGGER.info(f"Feedback Received: {feedback}")
-                self.orders = [
-                    Order(  # type: ignore
-                        order["order_id"],
-                        order["side"],
-                        float(order["price"]),
-                        int(order["qty"]),
-                        order["order_status"],
-                    )
-                    for order in feedback
-                ]
-                return
-            sleep(SLEEP_WS)
-        else:
-            LOGGER.info("No feedback received!")
-            raise NotImplementedError("In case no feedback are received")
+
+    def reconnect(self) -> None:
+        """Replace the dead websocket, or reconnect the feed given, or else
+        subscribe again the websocket given, then repair over REST the orders
+        and the position missed meanwhile"""
+        with METRICS.timer("ws.reconnect"):
+            if self._own_ws:
+                dead, self.ws = self.ws, self._connect_ws()
+                self.feedback.ws = self.ws
+                try:
+                    dead.exit()
+                except Exception:
+                    LOGGER.debug("Closing the dead websocket failed", exc_info=True)
+            elif hasattr(self.ws, "reconnect"):
+                self.ws.reconnect()
+            else:
+                self._subscribe(self.ws)
+            self.feedback.received = self.clock.time()
+            self.reconcile()
+            self.sync_position()
+        LOGGER.warning("Websocket reconnected")
+
+    def _wait_feedback(
+        self,
+        key: Optional[str] = None,
+        since: int = 0,
+        timeout: float = FEEDBACK_TIMEOUT,
+        cancelling: bool = False,
+        sent: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """Wait Bybit feedback for the order `key`, and record the latency
+        from the request `sent` (perf_counter) to the ack"""
+        LOGGER.debug("Wait for feedback: %s", key)
+        feedback = self.feedback.wait(key, since, timeout)
+        if sent is not None:
+            METRICS.record("ws.ack", perf_counter() - sent)
+        if feedback["order_status"] == "Cancelled" and not cancelling:
+            LOGGER.warning(f"Order Cancel: {feedback}")
+            raise OrderCancelled
+        return feedback
+
+    def _call(
+        self, group: str, operation: str, request: Optional[str] = None, **params: Any
+    ) -> Any:
+        """Call the REST operation through the scheduler, and record its
+        latency, unless the `request` in flight was given up meanwhile"""
+        if self.journal is not None and operation in PRIORITIES:
+            self.journal.intent(operation, params)
+
+        def send() -> Any:
+            # the scheduler can hold an order until the rate limit resets
+            if request is not None and request not in self.in_flight:
+                raise FeedbackTimeout(f"Given up before it was sent: {request}")
+            with METRICS.timer(f"rest.{operation}"):
+                return getattr(getattr(self.rest, group), operation)(**params).result()
+
+        return self.scheduler.call(group, operation, params, send, self.symbol)
+
+    def wait_until(self, predicate: Callable[[], bool], timeout: float) -> bool:
+        """ Check `predicate` again on each message of the websocket """
+        return self.feedback.watch(predicate, timeout)
+
+    @property
+    def fills(self) -> int:
+        """ The trades, and the position updates that follow them """
+        return self.positions.trades + self.positions.updates
+
+    def _top_of_book(self) -> TopOfBook:
+        """ Return the book, refreshed over REST if it is older than book_max_age """
+        if not self.feedback.running:
+            self.feedback.pump()
+        if self.book.age > self.book_max_age or self.book.bid is None:
+            LOGGER.debug("Stale top of book: %.3fs", self.book.age, extra=logs.SAMPLED)
+            ticker = self._call("Market", "Market_symbolInfo")[0]["result"][0]
+            self.book.quote(float(ticker["bid_price"]), float(ticker["ask_price"]))
+        return self.book
 
     @property
     def bid(self) -> float:
         """ return the bid price """
-        return float(
-            self.rest.Market.Market_symbolInfo().result()[0]["result"][0]["bid_price"]
-        )
+        return self._top_of_book().bid  # type: ignore
 
     @property
     def ask(self) -> float:
         """ return the bid price """
-        return float(
-            self.rest.Market.Market_symbolInfo().result()[0]["result"][0]["ask_price"]
-        )
+        return self._top_of_book().ask  # type: ignore
 
-    # @property
-    # def rest_orders(self) -> Orders:
-    #     """Return the active orders"""
-    #     return self._orders
-    #     all_orders = self.rest.Order.Order_getOrders(
-    #         symbol=self.symbol, order_status="New"
-    #     ).result()[0]["result"]["data"]
-
-    #     return Orders(
-    #         longs=[
-    #             Order(order["order_id"], float(order["price"]), int(order["qty"]))
-    #             for order in all_orders
-    #             if order["side"] == "Buy"
-    #         ],
-    #         shorts=[
-    #             Order(order["order_id"], float(order["price"]), int(order["qty"]))
-    #             for order in all_orders
-    #             if order["side"] == "Sell"
-    #         ],
-    #     )
+    @property
+    def rest_orders(self) -> Orders:
+        """ Query the live orders over REST """
+        orders, page = Orders(), 1
+        while True:
+            data = self._call(
+                "Order",
+                "Order_getOrders",
+                symbol=self.symbol,
+                order_status=",".join(LIVE_STATUSES),
+                limit=ORDERS_PAGE,
+                page=page,
+            )[0]["result"]["data"]
+            for order in data or ():
+                orders.update(to_order(order))
+            if not data or len(data) < ORDERS_PAGE:
+                return orders
+            page += 1
+
+    def resync(self) -> Orders:
+        """Replace the orders recovered from the journal by the live orders
+        of the exchange, the orders sent or closed while the bot was down are
+        only known there"""
+        live = self.rest_orders
+        with self._orders_lock:
+            recovered, self._orders = self._orders, live.copy()
+        for side in ("longs", "shorts"):
+            known, actual = getattr(recovered, side), getattr(live, side)
+            for order_id in known.keys() - actual.keys():
+                LOGGER.info(f"Order closed while down: {known[order_id]}")
+            for order_id in actual.keys() - known.keys():
+                LOGGER.warning(f"Order unknown to the journal: {actual[order_id]}")
+        if self.journal is not None:
+            self.journal.reset(
+                order._asdict()
+                for side in (live.longs, live.shorts)
+                for order in side.values()
+            )
+        return live
+
+    def reconcile(self) -> List[Order]:
+        """Repair the orders that drifted from the exchange, as a websocket
+        message was lost, and return the corrections
+
+        The orders missing from the query are closed, with a "Missing"
+        status as it is unknown if they were filled or cancelled.
+        """
+        with METRICS.timer("orders.reconcile"):
+            since = self.feedback.seq
+            live = self.rest_orders
+            with self._orders_lock:
+                known = self._orders.copy()
+            corrections = []
+            for side in ("longs", "shorts"):
+                mine, theirs = getattr(known, side), getattr(live, side)
+                for order_id in mine.keys() - theirs.keys():
+                    corrections.append(mine[order_id]._replace(order_status="Missing"))
+                for order_id, order in theirs.items():
+                    current = mine.get(order_id)
+                    # the order as of the query, but for its status
+                    if current is None or current[:4] != order[:4]:
+                        corrections.append(order)
+            corrections = self.feedback.correct(corrections, since)
+        for order in corrections:
+            current = known.longs.get(order.order_id) or known.shorts.get(
+                order.order_id
+            )
+            if current is None:
+                drift = "unacked"
+            elif order.order_status == "Missing":
+                drift = "closed"
+            else:
+                drift = "changed"
+            LOGGER.warning(f"Order drifted ({drift}): {current} -> {order}")
+            METRICS.count(f"orders.drift.{drift}")
+        return corrections
 
     @property
     def orders(self) -> Orders:
-        feedback = self.ws.get_data("order")
-        if feedback:
-            self.orders = [
-                Order(  # type: ignore
-                    order["order_id"],
-                    order["side"],
-                    float(order["price"]),
-                    int(order["qty"]),
-                    order["order_status"],
-                )
-                for order in feedback
-            ]
-        return self._orders
+        """ Return a copy of the live orders """
+        if not self.feedback.running:
+            self.feedback.pump()
+        with self._orders_lock:
+            return self._orders.copy()
 
     @orders.setter
     def orders(self, new_orders: List[Order]) -> None:
-        # 1. Update all the orders
-        for new_order in new_orders:
-            if new_order.side == "Buy":
-                self._orders.longs[new_order.order_id] = new_order
-            else:
-                self._orders.shorts[new_order.order_id] = new_order
-
-        # 2. Remove all none New order
-        # 3. Make sure that the orders are sorted by quantity
-        self._orders = Orders(
-            {
-                order.order_id: order
-                for order in sorted(
-                    self._orders.longs.values(), key=lambda o: o.quantity
-                )
-                if order.order_status == "New"
-            },
-            {
-                order.order_id: order
-                for order in sorted(
-                    self._orders.shorts.values(), key=lambda o: o.quantity
-                )
-                if order.order_status == "New"
-            },
+        with self._orders_lock:
+            for new_order in new_orders:
+                self._orders.update(new_order)
+            longs, shorts = len(self._orders.longs), len(self._orders.shorts)
+            shorts_qty = self._orders.shorts_qty()
+            # the records are formatted later, by the logs thread
+            snapshot = (
+                self._orders.copy() if LOGGER.isEnabledFor(logging.DEBUG) else None
+            )
+        LOGGER.info(
+            "Orders status: %d longs, %d shorts (%d)",
+            longs,
+            shorts,
+            shorts_qty,
+            extra=logs.SAMPLED,
         )
-        LOGGER.info(f"Orders status: {self._orders}")
+        if snapshot is not None:
+            LOGGER.debug("Orders: %s", snapshot, extra=logs.SAMPLED)
 
     @property
     def position(self) -> Position:
-        """ Return the position """
-        my_position = self.rest.Positions.Positions_myPosition(
-            symbol=self.symbol
-        ).result()[0]
-
-        LOGGER.debug(f"Position: {my_position}")
-
-        if my_position["result"]["size"] == 0:
-            raise NotInCycle
-
-        position = Position(
-            round_point(float(my_position["result"]["entry_price"])),
-            float(my_position["result"]["entry_price"]),
-            my_position["result"]["size"],
-            my_position["rate_limit_status"],
-            convert_epoch(my_position["rate_limit_reset_ms"]),
-            my_position["rate_limit"],
-            my_position["result"]["unrealised_pnl"],
-            float(my_position["result"]["liq_price"]),
-        )
-        LOGGER.info(position)
+        """Return the position streamed from the websocket
+
+        It is checked over REST every `position_check` seconds.
+        """
+        if not self.feedback.running:
+            self.feedback.pump()
+        if self.clock.time() - self.positions.synced > self.position_check:
+            self.sync_position()
+
+        position = self.positions.position
+        LOGGER.debug("Position: %s", position, extra=logs.SAMPLED)
         return position
 
-    def cancel_all(self) -> None:
-        output = self.rest.Order.Order_cancelAll(symbol=self.symbol).result()
+    def sync_position(self) -> None:
+        """ Take a REST snapshot of the position """
+        my_position = self._call(
+            "Positions", "Positions_myPosition", symbol=self.symbol
+        )[0]
 
-        LOGGER.debug(output)
-        self._wait_feedback()
-        return
+        LOGGER.debug("Position: %s", my_position)
+        self.positions.on_rest(my_position)
 
-    def cancel(self, order_id: str) -> None:
-        output = self.rest.Order.Order_cancel(
-            symbol=self.symbol, order_id=order_id
-        ).result()
+    def cancel_all(self, timeout: float = FEEDBACK_TIMEOUT) -> None:
+        since, sent = self.feedback.seq, perf_counter()
+        output = self._call("Order", "Order_cancelAll", symbol=self.symbol)
 
         LOGGER.debug(output)
-        self._wait_feedback()
+        self._wait_feedback(None, since, timeout, True, sent)
         return
 
-    def long(self, price: float, quantity: int) -> None:
-        """ Put a buy order to on the exchange """
-        LOGGER.info(f"Long({price}, {quantity})")
-        output = self.rest.Order.Order_new(
-            side="Buy",
+    def cancel(self, order_id: str, timeout: float = FEEDBACK_TIMEOUT) -> None:
+        request = self.submit_cancel(order_id)
+        self.collect([request], timeout)
+        request.future.result()
+
+    def cancel_many(self, order_ids: Iterable[str]) -> List[Optional[BaseException]]:
+        """ Send the cancels without waiting for each ack, then collect them """
+        requests = [self.submit_cancel(order_id) for order_id in order_ids]
+        self.collect(requests, FEEDBACK_TIMEOUT)
+        return [request.future.exception() for request in requests]
+
+    supports_amend = True
+
+    def amend(
+        self,
+        order_id: str,
+        price: float,
+        quantity: int,
+        timeout: float = FEEDBACK_TIMEOUT,
+    ) -> None:
+        """ Replace the price and quantity of a live order """
+        LOGGER.info("Amend(%s, %s, %s)", order_id, price, quantity)
+        since, sent = self.feedback.seq, perf_counter()
+        output = self._call(
+            "Order",
+            "Order_replace",
             symbol=self.symbol,
-            order_type="Limit",
-            qty=quantity,
-            price=price,
-            time_in_force="PostOnly",
-        ).result()
+            order_id=order_id,
+            p_r_price=price,
+            p_r_qty=quantity,
+        )
 
         LOGGER.debug(output)
-        self._wait_feedback()
+        # a refused replace is never acknowledged, do not wait for it
+        checked(output)
+        self._wait_feedback(order_id, since, timeout, sent=sent)
         return
 
-    def short(self, price: float, quantity: int) -> None:
+    def _send_now(self, key: str, send: Callable[[], None]) -> None:
+        """Send the request `key`, a failure fails it, unless it already
+        failed while it waited in the pipeline"""
+        if key not in self.in_flight:
+            LOGGER.warning(f"Request given up before it was sent: {key}")
+            return
+        try:
+            send()
+        except Exception as error:
+            self.in_flight.fail(key, error)
+
+    def _send(self, key: str, send: Callable[[], None]) -> None:
+        """ Send the request `key` from the pipeline """
+        self._pipeline.submit(self._send_now, key, send)
+
+    def submit(self, side: str, price: float, quantity: int) -> Request:
+        """Send a PostOnly order without waiting for its ack, it is known by
+        the order_link_id of the request until the exchange returns its id"""
+        LOGGER.info("%s(%s, %s)", "Long" if side == "Buy" else "Short", price, quantity)
+        link_id = new_link_id()
+        request = self.in_flight.add(link_id, "Order_new")
+        since = self.feedback.seq
+
+        def send() -> None:
+            output = self._call(
+                "Order",
+                "Order_new",
+                link_id,
+                side=side,
+                symbol=self.symbol,
+                order_type="Limit",
+                qty=quantity,
+                price=price,
+                time_in_force="PostOnly",
+                order_link_id=link_id,
+            )
+            LOGGER.debug(output)
+            order_id = checked(output)["order_id"]
+            self.in_flight.alias(link_id, order_id)
+            # the ack can arrive before the response, without the order_link_id
+            ack = self.feedback.acked(order_id, since)
+            if ack is not None:
+                self.in_flight.resolve([ack])
+
+        self._send(link_id, send)
+        return request
+
+    def submit_cancel(self, order_id: str) -> Request:
+        """ Send a cancel without waiting for its ack """
+        request = self.in_flight.add(order_id, "Order_cancel")
+        since = self.feedback.seq
+
+        def send() -> None:
+            output = self._call(
+                "Order",
+                "Order_cancel",
+                order_id,
+                symbol=self.symbol,
+                order_id=order_id,
+            )
+            LOGGER.debug(output)
+            try:
+                checked(output)
+            except OrderRejected as error:
+                if error.ret_code not in CANCEL_FINISHED:
+                    raise
+                # the order was filled or closed meanwhile, nothing to cancel
+                LOGGER.info(f"Cancel of a finished order: {order_id}: {error}")
+                self.in_flight.done(order_id)
+                return
+            ack = self.feedback.acked(order_id, since)
+            if ack is not None:
+                self.in_flight.resolve([ack])
+
+        self._send(order_id, send)
+        return request
+
+    def collect(self, requests: List[Request], timeout: float) -> None:
+        """Wait the acks of the requests, the ones not acknowledged within
+        `timeout` fail with FeedbackTimeout"""
+        futures = [request.future for request in requests]
+        deadline = self.clock.time() + timeout
+        while not all(future.done() for future in futures):
+            remaining = deadline - self.clock.time()
+            if remaining <= 0:
+                break
+            if self.feedback.running:
+                wait(futures, remaining)
+            elif not self.feedback.pump():
+                self.clock.sleep(min(self.feedback.poll, remaining))
+        for request in requests:
+            self.in_flight.fail(
+                request.key, FeedbackTimeout(f"No feedback received for: {request.key}")
+            )
+
+    def place_many(self, orders: Iterable[Tuple[str, float, int]]) -> List[Placement]:
+        """Send the batch without waiting for each ack, then collect the acks
+        together
+
+        The placements are returned in the order of the batch.
+        """
+        orders = list(orders)
+        requests = [self.submit(*order) for order in orders]
+        self.collect(requests, FEEDBACK_TIMEOUT)
+        return [
+            Placement(*order, request.future.exception())
+            for order, request in zip(orders, requests)
+        ]
+
+    def long(
+        self, price: float, quantity: int, timeout: float = FEEDBACK_TIMEOUT
+    ) -> None:
         """ Put a buy order to on the exchange """
-        LOGGER.info(f"Short({price}, {quantity})")
-        output = self.rest.Order.Order_new(
-            side="Sell",
-            symbol=self.symbol,
-            order_type="Limit",
-            qty=quantity,
-            price=price,
-            time_in_force="PostOnly",
-        ).result()
-
-        LOGGER.info(output)
-        self._wait_feedback()
-        return
+        request = self.submit("Buy", price, quantity)
+        self.collect([request], timeout)
+        request.future.result()
+
+    def short(
+        self, price: float, quantity: int, timeout: float = FEEDBACK_TIMEOUT
+    ) -> None:
+        """ Put a buy order to on the exchange """
+        request = self.submit("Sell", price, quantity)
+        self.collect([request], timeout)
+        request.future.result()
 
 
 def exchange_factory(exchange_name: str) -> Exchange:
@@ -372,6 +1597,114 @@ def exchange_factory(exchange_name: str) -> Exchange:
     raise NotImplementedError("Exchange not implemented: {exchange_name}")
 
 
+class PostOnlyPlacer:
+    """Put the PostOnly orders at a price that does not cross the book, and
+    send them again when they are rejected
+
+    The price is kept at least `offset` ticks away from the touch, the bid
+    for a Buy and the ask for a Sell, read from the book of the exchange.
+    The rejections are counted by side and distance from the touch, and the
+    offset is the nearest distance whose rejection rate is at most
+    PLACE_REJECTIONS, so it learns how far from the touch an order survives.
+    The backoff is jittered with the random choices of the exchange, unless
+    a `seed` is given.
+    """
+
+    def __init__(
+        self,
+        exchange: Exchange,
+        attempts: Optional[int] = None,
+        backoff_min: float = PLACE_BACKOFF_MIN,
+        backoff_max: float = PLACE_BACKOFF_MAX,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.exchange = exchange
+        self.attempts = attempts
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.random = exchange.random if seed is None else Random(seed)
+        self.sent: Counter = Counter()
+        self.rejected: Counter = Counter()
+
+    def rejection_rate(self, side: str, offset: int) -> float:
+        sent = self.sent[side, offset]
+        return self.rejected[side, offset] / sent if sent else 0.0
+
+    def offset(self, side: str) -> int:
+        """ The nearest distance from the touch an order of `side` survives """
+        for offset in range(PLACE_OFFSETS):
+            if self.rejection_rate(side, offset) <= PLACE_REJECTIONS:
+                return offset
+        return PLACE_OFFSETS
+
+    def backoff(self, attempt: int) -> float:
+        """ The wait before the attempt, from half to all of the backoff """
+        # the doublings are capped, the backoff reached its max long before
+        backoff = min(self.backoff_min * 2 ** min(attempt - 1, 32), self.backoff_max)
+        return backoff * self.random.uniform(0.5, 1)
+
+    def resynced(self, side: str, price: float, quantity: int) -> bool:
+        """ Resync the orders and tell if the order without an ack is live """
+        LOGGER.warning("No ack for %s %s@%s, resync the orders", side, quantity, price)
+        orders = self.exchange.resync()
+        live = orders.shorts if side == "Sell" else orders.longs
+        return any(
+            (order.price, order.quantity) == (price, quantity)
+            for order in live.values()
+        )
+
+    def place(self, side: str, price: float, quantity: int, spread: float) -> float:
+        """Put the order at `price`, or nearer the touch than it if it would
+        cross the book, and return the price it was accepted at
+
+        An order cancelled as it would have crossed the book is sent again
+        `spread` away from the touch after the backoff, until it is accepted,
+        or else OrderCancelled is raised after `attempts` of them.  An order
+        without an ack is looked for in the orders of the exchange, and sent
+        again if it is not there.  OrderRejected, a request the exchange
+        refuses, is raised at once.
+        """
+        sell = side == "Sell"
+        attempts = count() if self.attempts is None else range(self.attempts)
+        for attempt in attempts:
+            if attempt:
+                self.exchange.clock.sleep(self.backoff(attempt))
+            touch = self.exchange.ask if sell else self.exchange.bid
+            if attempt:
+                price = touch + spread if sell else touch - spread
+            limit = self.offset(side) * PRICE_TICK
+            price = max(price, touch + limit) if sell else min(price, touch - limit)
+            offset = min(int(abs(price - touch) / PRICE_TICK), PLACE_OFFSETS)
+            if self.send(side, price, quantity, offset):
+                return price
+        raise OrderCancelled(f"{side} {quantity} rejected {self.attempts} times")
+
+    def send(self, side: str, price: float, quantity: int, offset: int) -> bool:
+        """ Send the order `offset` ticks from the touch, tell if it is live """
+        self.sent[side, offset] += 1
+        try:
+            if side == "Sell":
+                self.exchange.short(price, quantity)
+            else:
+                self.exchange.long(price, quantity)
+            return True
+        except OrderRejected:
+            raise
+        except FeedbackTimeout:
+            return self.resynced(side, price, quantity)
+        except OrderCancelled:
+            self.rejected[side, offset] += 1
+            METRICS.count("orders.rejected")
+            LOGGER.warning(
+                "PostOnly rejected: %s %s@%s, %d ticks from the touch",
+                side,
+                quantity,
+                price,
+                offset,
+            )
+            return False
+
+
 class CharlieBot:
     """The CharlieBot is an algorithme that follow Charlie strategy
     of trading on future BCDUSD"""
@@ -382,21 +1715,55 @@ class CharlieBot:
         short_small_spread: int,
         init_quantity: int,
         exchange_name: str,
+        exchange: Optional[Exchange] = None,
+        ladder: Ladder = Ladder(),
     ) -> None:
         self.short_small_spread = short_small_spread
         self.short_big_spread = short_big_spread
         self.init_quantity = init_quantity
+        self.ladder = ladder
 
         self.exchange_name = exchange_name
-        self.exchange = exchange_factory(exchange_name)
+        if exchange is None:
+            exchange = exchange_factory(exchange_name)
+        self.exchange = exchange
+        self.placer = PostOnlyPlacer(exchange)
+
+    def _entry_moved(self, current_bid: float) -> bool:
+        """ The entry long is filled or the bid left it behind """
+        try:
+            self.exchange.position
+        except NotInCycle:
+            return current_bid + TRESHOLD_REST < self.exchange.bid
+        return True
+
+    def chase_long(self, bid: float) -> None:
+        """ Move the entry long to the bid, with one replace if possible """
+        longs = list(self.exchange.orders.longs.values())
+        if self.exchange.supports_amend and len(longs) == 1:
+            try:
+                self.exchange.amend(longs[0].order_id, bid, self.init_quantity)
+                return
+            except (OrderCancelled, FeedbackTimeout):
+                LOGGER.warning(f"Replace rejected: {longs[0]} -> {bid}")
+        for order_id in self.exchange.orders.longs:
+            LOGGER.info(f"Cancel order: {order_id}")
+            self.exchange.cancel(order_id)
+        self.exchange.long(bid, self.init_quantity)
 
     def trigger_long(self) -> None:
-        """ trigger the start of a trading with the best long """
+        """Trigger the start of a trading with the best long
+
+        The long follows the bid until it is filled.  The exchange wakes the
+        bot up on each message of its stream, at the latest after SLEEP_REST.
+        """
 
         current_bid = self.exchange.bid
         self.exchange.long(current_bid, self.init_quantity)
         for _ in count():
-            sleep(SLEEP_REST)
+            self.exchange.wait_until(
+                lambda: self._entry_moved(current_bid), SLEEP_REST
+            )
             try:
                 position = self.exchange.position
             except NotInCycle:
@@ -405,64 +1772,45 @@ class CharlieBot:
                     f"No position found. Current bid/new bid: {current_bid}/{new_bid}."
                 )
                 info_msg += f" Spread current bid/new bid: ({new_bid - current_bid})"
-                LOGGER.info(info_msg)
+                LOGGER.info(info_msg, extra=logs.SAMPLED)
                 if current_bid + TRESHOLD_REST < new_bid:
-                    for order_id in self.exchange.orders.longs:
-                        LOGGER.info(f"Cancel order: {order_id}")
-                        self.exchange.cancel(order_id)
                     current_bid = new_bid
-                    self.exchange.long(current_bid, self.init_quantity)
-                    LOGGER.info(f"Sleeping {SLEEP_REST} second.")
+                    self.chase_long(current_bid)
 
             else:
                 position_spread = float(position.real_entry_price) - current_bid
                 info_msg = f"Position found: {position}."
                 info_msg += f"Spread (V): {current_bid} - {position.real_entry_price} = {position_spread}"
                 info_msg += f"Spread (%): ({position_spread / current_bid * 100} %)"
-                LOGGER.info(info_msg)
+                LOGGER.info(info_msg, extra=logs.SAMPLED)
                 return
 
+    def hedge(self, position: Position) -> Tuple[int, int]:
+        """The quantities of the small and the big shorts of the position,
+        which can be less than init_quantity after a partial fill"""
+        return (
+            max(position.quantity - self.init_quantity, 0),
+            min(position.quantity, self.init_quantity),
+        )
+
     def trigger_complete(self) -> None:
         """ Complete the trigger with a short and a long """
         position = self.exchange.position
+        small_quantity, big_quantity = self.hedge(position)
 
         short_big_price = position.entry_price + self.short_big_spread
         short_small_price = position.entry_price + self.short_big_spread
 
-        if position.quantity != self.init_quantity:
-            for _ in range(10000):
-                try:
-                    LOGGER.info(
-                        f"Take a short order: {short_big_price}, {self.init_quantity}"
-                    )
-                    self.exchange.short(
-                        short_small_price, position.quantity - self.init_quantity
-                    )
-                    break
-                except OrderCancelled:
-                    short_small_price = self.exchange.ask + self.short_small_spread
-                    sleep(SLEEP_WS)
-            else:
-                raise NotImplementedError("There is problem to put our order")
+        if small_quantity:
+            LOGGER.info("Take a short order: %s, %s", short_small_price, small_quantity)
+            self.placer.place(
+                "Sell", short_small_price, small_quantity, self.short_small_spread
+            )
 
-        for _ in range(10000):
-            try:
-                LOGGER.info(
-                    f"Take a short order: {short_big_price}, {self.init_quantity}"
-                )
-                self.exchange.short(short_big_price, self.init_quantity)
-                break
-            except OrderCancelled:
-                short_big_price = self.exchange.ask + self.short_big_spread
-                sleep(SLEEP_WS)
-        else:
-            raise NotImplementedError("There is problem to put our order")
+        LOGGER.info("Take a short order: %s, %s", short_big_price, big_quantity)
+        self.placer.place("Sell", short_big_price, big_quantity, self.short_big_spread)
 
-        for long_price, quantity, spread in allocate_longs(
-            position.entry_price, position.quantity * 2
-        ):
-            LOGGER.info(f"Take a long order: {long_price}, {quantity}, {spread}")
-            self.exchange.long(long_price, quantity)
+        self.reconcile_longs(position, self.exchange.orders)
         return
 
     def start_cycle(self) -> None:
@@ -471,9 +1819,13 @@ class CharlieBot:
         # ----------
         # 1. The sum of the shorts quantity is equal to the quantity of the position
         # 2. The head(new_orders.qty) == position.qty * 2 and in general Qn+1 = Qn * 2
+        fills = self.exchange.fills
         for _ in count():
-            sleep(SLEEP_WS)
+            # a fill wakes the bot up at once, the rest is checked every SLEEP_WS
+            self.exchange.wait_until(lambda: self.exchange.fills != fills, SLEEP_WS)
+            tick = perf_counter()
             self.exchange.keep_alive()
+            fills = self.exchange.fills
             try:
                 position = self.exchange.position
             except NotInCycle:
@@ -482,66 +1834,142 @@ class CharlieBot:
                 return
 
             orders = self.exchange.orders
+            rehedge = orders.shorts_qty() < position.quantity
+            reladder = (
+                not orders.longs
+                or orders.head_longs().quantity != position.quantity * 2
+            )
+            METRICS.record("cycle.decision", perf_counter() - tick)
             # 1. A long order has been filled.  This increased the quantity position.
             # we need to equalize the shorts orders with two short orders.
-            if orders.shorts_qty() < position.quantity:
+            if rehedge:
                 LOGGER.info(
-                    "Shorts Quanty < Position Quantity: {orders.shorts_qty} < {position.quantity}"
+                    "Shorts quantity < position quantity: %d < %d",
+                    orders.shorts_qty(),
+                    position.quantity,
                 )
                 for short in orders.shorts.values():
                     self.exchange.cancel(short.order_id)
+                small_quantity, big_quantity = self.hedge(position)
                 # We want to reduce the exposure by putting an order close to our entry price
-                try:
-                    self.exchange.short(
+                if small_quantity:
+                    self.placer.place(
+                        "Sell",
                         position.entry_price + self.short_small_spread,
-                        position.quantity - self.init_quantity,
-                    )
-                except OrderCancelled:
-                    self.exchange.short(
-                        self.exchange.ask + self.short_small_spread,
-                        position.quantity - self.init_quantity,
+                        small_quantity,
+                        self.short_small_spread,
                     )
 
                 # We put a second orders in order to make a profit on our trade which correspond to the
                 # initital quantity
-                try:
-                    self.exchange.short(
-                        position.entry_price + self.short_big_spread, self.init_quantity
-                    )
-                except OrderCancelled:
-                    self.exchange.short(
-                        self.exchange.ask + self.short_big_spread, self.init_quantity
-                    )
+                self.placer.place(
+                    "Sell",
+                    position.entry_price + self.short_big_spread,
+                    big_quantity,
+                    self.short_big_spread,
+                )
 
-            if orders.head_longs().quantity != position.quantity * 2:
+            if reladder:
                 LOGGER.info(
-                    "Head long quantity != Position Quantity: {orders.head_longs()} < {position.quantity}"
+                    "Head long quantity != 2 * position quantity: %s != 2 * %d",
+                    orders.head_longs().quantity if orders.longs else None,
+                    position.quantity,
                 )
-                for _long, long_settings in zip_longest(
-                    orders.longs.values(),
-                    allocate_longs(position.entry_price, position.quantity * 2),
-                ):
-                    LOGGER.info(f"longs orders : {_long}")
-                    LOGGER.info(f"longs settings : {long_settings}")
-                    if _long:
-                        self.exchange.cancel(_long.order_id)
-                    if long_settings:
-                        long_price, quantity, spread = long_settings
-                        self.exchange.long(long_price, quantity)
+                self.reconcile_longs(position, orders)
+
+    def reconcile_longs(self, position: Position, orders: Orders) -> None:
+        """ Move the live longs to the ladder of the position with the fewest orders """
+        diff = diff_ladder(
+            orders.longs.values(),
+            (
+                (long_price, quantity)
+                for long_price, quantity, _ in allocate_longs(
+                    position.entry_price, position.quantity * 2, 1, *self.ladder
+                )
+            ),
+            amend=self.exchange.supports_amend,
+        )
+        LOGGER.info(
+            "Longs: keep %d, amend %d, cancel %d, create %d",
+            len(diff.keep),
+            len(diff.amend),
+            len(diff.cancel),
+            len(diff.create),
+        )
+        for long_price, quantity in diff.create:
+            LOGGER.debug("Take a long order: %s, %s", long_price, quantity)
+        self.apply_ladder(diff)
+
+    def apply_ladder(self, diff: LadderDiff) -> None:
+        """ Cancel, amend then create the longs of the diff """
+        cancels = [_long.order_id for _long in diff.cancel]
+        for order_id, error in zip(cancels, self.exchange.cancel_many(cancels)):
+            if error is not None:
+                LOGGER.warning(f"Cancel failed: {order_id}: {error!r}")
+        for _long, long_price, quantity in diff.amend:
+            try:
+                self.exchange.amend(_long.order_id, long_price, quantity)
+            except (OrderCancelled, FeedbackTimeout):
+                LOGGER.warning(f"Amend rejected: {_long} -> {long_price}, {quantity}")
+        placements = self.exchange.place_many(
+            ("Buy", long_price, quantity) for long_price, quantity in diff.create
+        )
+        for placement in placements:
+            if not placement.ok:
+                LOGGER.warning(f"Long order rejected: {placement}")
+
+    def recover(self) -> str:
+        """Return the phase to resume from the journal of the exchange
+
+        The orders recovered are first replaced by the ones of the exchange.
+        A bot stopped in trigger_long has its longs cancelled, they follow a
+        bid that is gone.  A bot stopped once its shorts are placed resumes
+        in start_cycle, that rebuilds the hedge and the ladder as needed.
+        """
+        journal = self.exchange.journal
+        if journal is None or journal.phase is None:
+            return PHASES[0]
+        phase = journal.phase
+        LOGGER.info(f"Recover in {phase}: {journal.intents} requests since")
+        orders = self.exchange.resync()
+        if phase == "trigger_long":
+            for order_id in orders.longs:
+                self.exchange.cancel(order_id)
+            try:
+                self.exchange.position
+            except NotInCycle:
+                return phase
+            return "trigger_complete"
+        if phase == "trigger_complete" and orders.shorts:
+            return "start_cycle"
+        return phase
+
+    def enter(self, phase: str) -> None:
+        """ Record the phase the bot starts """
+        LOGGER.info(f"Enter {phase}")
+        if self.exchange.journal is not None:
+            self.exchange.journal.enter(phase)
 
     def trade(self) -> None:
         """ start the trading in an infinite loop """
+        self.exchange.start()
+        start = PHASES.index(self.recover())
         for _ in count():
-            self.trigger_long()
-            self.trigger_complete()
-            self.start_cycle()
+            for phase in PHASES[start:]:
+                self.enter(phase)
+                getattr(self, phase)()
+            start = 0
 
     def __repr__(self):
         return "{}({!r})".format(self.__class__.__name__, self.dict__)
 
 
-def main():
+def main(argv: Optional[List[str]] = None):
     """ Entry point to the script """
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in COMMANDS:
+        return import_module(COMMANDS[argv[0]]).main(argv[1:])  # type: ignore
+
     parser = ArgumentParser(description="CharlieBot")
 
     default_short_big_spread = 250
@@ -577,13 +2005,30 @@ def main():
         default=default_ex,
         help=f"The exchange on which CharlieBot should run, default: {default_ex}",
     )
+    parser.add_argument(
+        "--metrics-file", help="write the latency histograms to this file"
+    )
+    parser.add_argument(
+        "--metrics-port", type=int, help="serve the latency histograms on localhost"
+    )
+    parser.add_argument(
+        "--journal",
+        default=JOURNAL_DIR,
+        help=f"directory of the crash recovery journal, default: {JOURNAL_DIR}",
+    )
+    parser.add_argument(
+        "--log-json", action="store_true", help="write the logs as JSON lines"
+    )
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+    logs.start(args.log_json)
+    metrics.start(args.metrics_file, args.metrics_port)
     bot = CharlieBot(
         args.short_big_spread,
         args.short_small_spread,
         args.initial_quantity,
         args.exchange_name,
+        BybitExchange(journal=Journal(args.journal, "BTCUSD", LIVE_STATUSES)),
     )
 
     try:
@@ -0,0 +1,105 @@
+# Standard Library
+import json
+import logging
+import os
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+
+try:
+    from bravado.client import SwaggerClient  # type: ignore
+    from bravado.requests_client import RequestsClient  # type: ignore
+    from bravado.swagger_model import load_url  # type: ignore
+    from bybit.APIKeyAuthenticator import APIKeyAuthenticator  # type: ignore
+except ImportError:  # pragma: no cover
+    SwaggerClient = None
+
+LOGGER = logging.getLogger("crypto_bot")
+
+TESTNET = "https://api-testnet.bybit.com"
+MAINNET = "https://api.bybit.com"
+# the spec the bybit package is written for, a new one is downloaded again
+SPEC_PATH = "/doc/swagger/v_0_2_12.txt"
+# the configuration bybit.bybit gives to bravado
+CONFIG = {
+    "use_models": False,
+    "validate_responses": False,
+    "also_return_response": True,
+}
+
+
+class Lazy:
+    """ Build the object with `factory` on the first use of an attribute """
+
+    def __init__(self, factory: Callable[[], Any]) -> None:
+        self._factory = factory
+        self._object: Any = None
+        self._lock = Lock()
+
+    @property
+    def built(self) -> bool:
+        return self._object is not None
+
+    def __getattr__(self, name: str) -> Any:
+        if self._object is None:
+            with self._lock:
+                if self._object is None:
+                    self._object = self._factory()
+        return getattr(self._object, name)
+
+
+def spec_path(cache: str, spec_uri: str) -> str:
+    host = spec_uri.split("//", 1)[-1].split("/", 1)[0]
+    return os.path.join(cache, f"{host}-{os.path.basename(spec_uri)}.json")
+
+
+def read_spec(cache: str, spec_uri: str) -> Optional[Dict[str, Any]]:
+    """ The cached spec, None if it is missing or for another version """
+    try:
+        with open(spec_path(cache, spec_uri)) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cached.get("uri") != spec_uri:
+        return None
+    return cached["spec"]
+
+
+def write_spec(cache: str, spec_uri: str, spec: Dict[str, Any]) -> None:
+    path = spec_path(cache, spec_uri)
+    os.makedirs(cache, exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"uri": spec_uri, "spec": spec}, f)
+    os.replace(path + ".tmp", path)
+
+
+def cached_client(
+    cache: str, test: bool = True, api_key: str = "", api_secret: str = ""
+) -> Any:
+    """bybit.bybit with the swagger spec read from the `cache` directory
+
+    The spec is downloaded and parsed once per host and version, afterwards
+    the client is built without the network.  Return None when it cannot be
+    built this way, bybit.bybit is then the fallback.
+    """
+    if SwaggerClient is None:
+        return None
+    host = TESTNET if test else MAINNET
+    spec_uri = host + SPEC_PATH
+    try:
+        http_client = RequestsClient()
+        if api_key and api_secret:
+            http_client.authenticator = APIKeyAuthenticator(host, api_key, api_secret)
+        spec = read_spec(cache, spec_uri)
+        if spec is None:
+            LOGGER.info(f"Download the API spec: {spec_uri}")
+            spec = load_url(spec_uri, http_client=http_client)
+            write_spec(cache, spec_uri, spec)
+        return SwaggerClient.from_spec(
+            spec,
+            origin_url=spec_uri,
+            http_client=http_client,
+            config=dict(CONFIG, host=host),
+        )
+    except Exception as error:
+        LOGGER.warning(f"Cannot use the cached API spec: {error}")
+        return None
@@ -0,0 +1,167 @@
+# Standard Library
+import json
+import logging
+import os
+from threading import Event, Lock, Thread
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+LOGGER = logging.getLogger("crypto_bot")
+
+# the records written are synced to the disk every JOURNAL_SYNC seconds
+JOURNAL_SYNC = 0.05
+# the journal is compacted into a snapshot every JOURNAL_SNAPSHOT records
+JOURNAL_SNAPSHOT = 10000
+
+
+class Journal:
+    """The orders and the phase of a bot, kept on the disk to recover a crash
+
+    Each order intent, order ack and phase transition is appended as a JSON
+    line to `<name>.jsonl`.  The records are flushed at once, so they survive
+    a crash of the bot, and synced by batch every `sync_every` seconds by a
+    background thread, except for the phase transitions that are synced
+    before the bot goes on.  Every `snapshot_every` records the
+    state is written to `<name>.snapshot.json` and the journal restarts
+    empty.  Opening the journal replays the snapshot then the records past
+    it, so a crash between the two steps, or in the middle of a line, loses
+    nothing that was synced.
+
+    The orders are the ack messages of the live ones by order_id, with the
+    fields of bot.Order.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        name: str,
+        live: Sequence[str] = ("New",),
+        sync_every: float = JOURNAL_SYNC,
+        snapshot_every: int = JOURNAL_SNAPSHOT,
+    ) -> None:
+        self.path = os.path.join(directory, f"{name}.jsonl")
+        self.snapshot_path = os.path.join(directory, f"{name}.snapshot.json")
+        self.live = tuple(live)
+        self.sync_every = sync_every
+        self.snapshot_every = snapshot_every
+        self.seq = 0
+        self.phase: Optional[str] = None
+        self.orders: Dict[str, Dict[str, Any]] = {}
+        self.intents = 0
+        self._records = 0
+        self._dirty = False
+        self._lock = Lock()
+        self._stop = Event()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+        self._file = open(self.path, "a")
+        self._thread = Thread(target=self._run, name="journal", daemon=True)
+        self._thread.start()
+
+    def _load(self) -> None:
+        try:
+            with open(self.snapshot_path) as f:
+                snapshot = json.load(f)
+            self.seq, self.phase = snapshot["seq"], snapshot["phase"]
+            self.orders = {order["order_id"]: order for order in snapshot["orders"]}
+        except FileNotFoundError:
+            pass
+        self._replay(self._lines())
+
+    def _lines(self) -> List[str]:
+        try:
+            with open(self.path) as f:
+                return f.readlines()
+        except FileNotFoundError:
+            return []
+
+    def _replay(self, lines: Iterable[str]) -> None:
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                LOGGER.warning(f"Journal truncated after the record {self.seq}")
+                break
+            if record["seq"] > self.seq:
+                self.seq = record["seq"]
+                self._apply(record)
+                self._records += 1
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        if record["kind"] == "phase":
+            self.phase = record["phase"]
+            self.intents = 0
+        elif record["kind"] == "intent":
+            self.intents += 1
+        elif record["kind"] == "ack":
+            for order in record["orders"]:
+                if order["order_status"] in self.live:
+                    self.orders[order["order_id"]] = order
+                else:
+                    self.orders.pop(order["order_id"], None)
+
+    def _append(self, kind: str, sync: bool = False, **fields: Any) -> None:
+        with self._lock:
+            self.seq += 1
+            record = dict(seq=self.seq, kind=kind, **fields)
+            self._apply(record)
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            self._dirty = True
+            self._records += 1
+            if self._records >= self.snapshot_every:
+                self._snapshot()
+            elif sync:
+                self._sync()
+
+    def _sync(self) -> None:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._dirty = False
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.sync_every):
+            with self._lock:
+                if self._dirty and not self._file.closed:
+                    self._sync()
+
+    def _snapshot(self) -> None:
+        snapshot = {
+            "seq": self.seq,
+            "phase": self.phase,
+            "orders": list(self.orders.values()),
+        }
+        with open(self.snapshot_path + ".tmp", "w") as f:
+            json.dump(snapshot, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.snapshot_path + ".tmp", self.snapshot_path)
+        self._file.close()
+        self._file = open(self.path, "w")
+        self._records = 0
+        self._dirty = False
+
+    def intent(self, operation: str, params: Dict[str, Any]) -> None:
+        """ Record a request about to be sent to the exchange """
+        self._append("intent", operation=operation, params=params)
+
+    def ack(self, orders: Iterable[Dict[str, Any]]) -> None:
+        """ Record the order updates acknowledged by the exchange """
+        self._append("ack", orders=list(orders))
+
+    def enter(self, phase: str) -> None:
+        """ Record the phase the bot starts, synced before returning """
+        self._append("phase", sync=True, phase=phase)
+
+    def reset(self, orders: Iterable[Dict[str, Any]]) -> None:
+        """ Replace the live orders, after a resync with the exchange """
+        with self._lock:
+            self.orders = {order["order_id"]: order for order in orders}
+            self.intents = 0
+            self._snapshot()
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        with self._lock:
+            self._sync()
+            self._file.close()
@@ -0,0 +1,231 @@
+# Standard Library
+import atexit
+import json
+import logging
+from collections import deque
+from heapq import merge
+from itertools import count
+from math import inf
+from threading import Condition, Event, Thread
+from time import monotonic
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+LOGGER = logging.getLogger("crypto_bot")
+
+FORMAT = "%(asctime)s - %(levelname)s - %(funcName)s: %(message)s"
+# the records waiting for the writer, the DEBUG ones are dropped first
+LOG_BUFFER = 10000
+# a sampled call site logs at INFO or below at most once per LOG_SAMPLE seconds
+LOG_SAMPLE = 1.0
+# the `extra` of the hot call sites to sample, never the orders or the phases
+SAMPLED = {"sample": True}
+# the writer reports the records dropped at most every LOG_DROPS seconds
+LOG_DROPS = 10.0
+
+# the attributes of every LogRecord, the others come from `extra`
+RESERVED = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message",
+    "asctime",
+    "suppressed",
+    "sample",
+}
+
+
+class Sampler(logging.Filter):
+    """Let each call site marked with SAMPLED log at most once every
+    `interval` seconds, for the records up to `level`
+
+    The other call sites always log.  The record that goes through carries in
+    `suppressed` the number of the ones dropped at its call site since the
+    previous one.
+    """
+
+    def __init__(
+        self,
+        interval: float = LOG_SAMPLE,
+        level: int = logging.INFO,
+        clock: Callable[[], float] = monotonic,
+    ) -> None:
+        super().__init__()
+        self.interval = interval
+        self.level = level
+        self.clock = clock
+        self._sites: Dict[Tuple[str, int], Tuple[float, int]] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.level or not getattr(record, "sample", False):
+            return True
+        site = (record.pathname, record.lineno)
+        now = self.clock()
+        last, suppressed = self._sites.get(site, (-inf, 0))
+        if now - last < self.interval:
+            self._sites[site] = (last, suppressed + 1)
+            return False
+        self._sites[site] = (now, 0)
+        record.suppressed = suppressed
+        return True
+
+
+class LogBuffer:
+    """The records between the bot and the writer thread, at most `size`
+
+    Once it is full, an incoming DEBUG record is dropped, and another one
+    takes the place of the oldest DEBUG record, or else of the oldest one.
+    """
+
+    def __init__(self, size: int = LOG_BUFFER) -> None:
+        self.size = size
+        self.dropped: Dict[str, int] = {}
+        self._debug: Deque[Tuple[int, logging.LogRecord]] = deque()
+        self._others: Deque[Tuple[int, logging.LogRecord]] = deque()
+        self._seq = count()
+        self._cond = Condition()
+
+    def __len__(self) -> int:
+        return len(self._debug) + len(self._others)
+
+    def _drop(self, record: logging.LogRecord) -> None:
+        self.dropped[record.levelname] = self.dropped.get(record.levelname, 0) + 1
+
+    def put(self, record: logging.LogRecord) -> None:
+        debug = record.levelno <= logging.DEBUG
+        with self._cond:
+            if len(self) >= self.size:
+                if debug:
+                    self._drop(record)
+                    return
+                self._drop((self._debug or self._others).popleft()[1])
+            (self._debug if debug else self._others).append((next(self._seq), record))
+            self._cond.notify()
+
+    def get(self, timeout: Optional[float] = None) -> List[logging.LogRecord]:
+        """ Take the records in the order they were logged, wait for one first """
+        with self._cond:
+            self._cond.wait_for(lambda: len(self) > 0, timeout)
+            records = [record for _, record in merge(self._debug, self._others)]
+            self._debug.clear()
+            self._others.clear()
+        return records
+
+
+class AsyncHandler(logging.Handler):
+    """Write the records with `handlers` from a background thread
+
+    The bot only appends its records to a LogBuffer, they are formatted and
+    written by the thread.  The arguments of a record are formatted there
+    too, so they must not change once logged.
+    """
+
+    def __init__(
+        self,
+        handlers: List[logging.Handler],
+        buffer: Optional[LogBuffer] = None,
+        drops_every: float = LOG_DROPS,
+    ) -> None:
+        super().__init__()
+        self.handlers = handlers
+        self.buffer = buffer if buffer is not None else LogBuffer()
+        self.drops_every = drops_every
+        self._reported: Dict[str, int] = {}
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.buffer.put(record)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name="logs", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """ Write the pending records and stop the thread """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.write(self.buffer.get(0))
+
+    def write(self, records: List[logging.LogRecord]) -> None:
+        for record in records:
+            suppressed = getattr(record, "suppressed", 0)
+            if suppressed:
+                record.msg = f"{record.msg} (+{suppressed} similar)"
+            for handler in self.handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+    def _report_drops(self) -> None:
+        dropped = dict(self.buffer.dropped)
+        if dropped == self._reported:
+            return
+        counts = ", ".join(
+            f"{dropped[level] - self._reported.get(level, 0)} {level}"
+            for level in sorted(dropped)
+            if dropped[level] != self._reported.get(level, 0)
+        )
+        self._reported = dropped
+        self.write(
+            [
+                LOGGER.makeRecord(
+                    LOGGER.name,
+                    logging.WARNING,
+                    __file__,
+                    0,
+                    f"Log buffer full, dropped: {counts}",
+                    (),
+                    None,
+                    "logs",
+                )
+            ]
+        )
+
+    def _run(self) -> None:
+        reported = monotonic()
+        while not self._stop.is_set():
+            self.write(self.buffer.get(0.1))
+            if monotonic() - reported >= self.drops_every:
+                self._report_drops()
+                reported = monotonic()
+        self._report_drops()
+
+
+class JsonFormatter(logging.Formatter):
+    """ One JSON object per record, with its arguments and `extra` fields """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": record.created,
+            "level": record.levelname,
+            "function": record.funcName,
+            "message": record.getMessage(),
+        }
+        if isinstance(record.args, tuple) and record.args:
+            entry["args"] = record.args
+        entry.update(
+            (key, value) for key, value in vars(record).items() if key not in RESERVED
+        )
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=repr)
+
+
+def start(json_format: bool = False, sample: float = LOG_SAMPLE) -> AsyncHandler:
+    """Move the logs of the bot off its threads, to a background writer
+
+    The records of the call sites marked with SAMPLED are sampled every
+    `sample` seconds up to INFO, and the records are written as text or as
+    JSON lines on stderr.
+    """
+    stream = logging.StreamHandler()
+    stream.setFormatter(JsonFormatter() if json_format else logging.Formatter(FORMAT))
+    handler = AsyncHandler([stream])
+    if sample:
+        handler.addFilter(Sampler(sample))
+    LOGGER.addHandler(handler)
+    LOGGER.propagate = False
+    handler.start()
+    atexit.register(handler.stop)
+    return handler
@@ -0,0 +1,184 @@
+# Standard Library
+import logging
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from math import log
+from threading import Event, Lock, Thread
+from time import perf_counter
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+LOGGER = logging.getLogger("crypto_bot")
+
+# buckets from 1 us to about 100 s, each 10% wider than the previous one
+LOWEST = 1e-6
+GROWTH = 1.1
+BUCKETS = 200
+WRITE_EVERY = 10
+
+
+class Histogram:
+    """Latency histogram on logarithmic buckets
+
+    Recording is a log and an increment, the percentiles are read from the
+    buckets so they are precise to 10%.  The maximum is exact.
+    """
+
+    __slots__ = ("counts", "count", "total", "max", "_lock")
+
+    def __init__(self) -> None:
+        self.counts: List[int] = [0] * BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = Lock()
+
+    def record(self, seconds: float) -> None:
+        if seconds <= LOWEST:
+            bucket = 0
+        else:
+            bucket = min(int(log(seconds / LOWEST, GROWTH)) + 1, BUCKETS - 1)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, percent: float) -> float:
+        """ Upper bound of the bucket holding the percentile """
+        with self._lock:
+            rank = self.count * percent / 100
+            seen = 0
+            for bucket, count in enumerate(self.counts):
+                seen += count
+                if count and seen >= rank:
+                    return min(LOWEST * GROWTH ** bucket, self.max)
+        return 0.0
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+            "max": self.max,
+        }
+
+
+class Metrics:
+    """ The histograms and the counters of the bot by name """
+
+    def __init__(self) -> None:
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+        self._lock = Lock()
+
+    def histogram(self, name: str) -> Histogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.histograms.setdefault(name, Histogram())
+        return histogram
+
+    def record(self, name: str, seconds: float) -> None:
+        self.histogram(name).record(seconds)
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    @contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """ Record the time spent in the block """
+        histogram = self.histogram(name)
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            histogram.record(perf_counter() - start)
+
+    def timed(self, name: str) -> Callable:
+        """ Decorator recording the time spent in the function """
+
+        def decorator(function: Callable) -> Callable:
+            @wraps(function)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                with self.timer(name):
+                    return function(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def render(self) -> str:
+        """One line per histogram, the times in milliseconds, then one line
+        per counter"""
+        lines = ["name count p50_ms p99_ms max_ms"]
+        for name, histogram in sorted(self.histograms.items()):
+            summary = histogram.summary()
+            lines.append(
+                f"{name} {summary['count']} {summary['p50'] * 1e3:.3f} "
+                f"{summary['p99'] * 1e3:.3f} {summary['max'] * 1e3:.3f}"
+            )
+        if self.counters:
+            lines.append("name total")
+            for name, total in sorted(self.counters.items()):
+                lines.append(f"{name} {total}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+
+
+class MetricsWriter(Thread):
+    """ Write the metrics to a text file every `every` seconds """
+
+    def __init__(
+        self, path: str, metrics: Metrics = METRICS, every: float = WRITE_EVERY
+    ) -> None:
+        super().__init__(name="metrics", daemon=True)
+        self.path = path
+        self.metrics = metrics
+        self.every = every
+        self.stopped = Event()
+
+    def write(self) -> None:
+        with open(self.path, "w") as f:
+            f.write(self.metrics.render())
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.every):
+            try:
+                self.write()
+            except OSError as error:
+                LOGGER.warning(f"Cannot write the metrics: {error}")
+
+
+def serve(
+    port: int, metrics: Metrics = METRICS, host: str = "127.0.0.1"
+) -> ThreadingHTTPServer:
+    """ Serve the metrics as text on http://host:port/ in a background thread """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args: Any) -> None:
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
+
+
+def start(file: Optional[str] = None, port: Optional[int] = None) -> None:
+    """ Expose METRICS to a file and/or a local HTTP endpoint """
+    if file:
+        MetricsWriter(file).start()
+    if port:
+        serve(port)
@@ -0,0 +1,455 @@
+# Standard Library
+import os
+from argparse import ArgumentParser
+from math import nan
+from os import environ
+from time import monotonic, sleep, time_ns
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import BybitWebsocket  # type: ignore
+import numpy as np  # type: ignore
+
+from crypto_bot.bot import FEEDBACK_POLL, LOGGER, WS_URL, drain
+
+CHUNK_ROWS = 1 << 16
+FLUSH_EVERY = 60
+INDEX_FILE = "index.bin"
+
+SIDES = {"Buy": 1, "Sell": -1, "None": 0, "": 0}
+ORDER_STATUSES = (
+    "Created",
+    "New",
+    "Rejected",
+    "PartiallyFilled",
+    "Filled",
+    "Cancelled",
+    "PendingCancel",
+    "Untriggered",
+    "Triggered",
+    "Deactivated",
+    "Unknown",
+)
+# the code of statuses missing from ORDER_STATUSES, so they still get recorded
+UNKNOWN_STATUS = ORDER_STATUSES.index("Unknown")
+STATUS_CODES = {status: code for code, status in enumerate(ORDER_STATUSES)}
+# the action of a row of the order book
+SNAPSHOT, DELETE, UPDATE, INSERT = range(4)
+
+# every record starts with the local receive time, in ns since the epoch
+BOOK = np.dtype(
+    [
+        ("ts", "<i8"),
+        ("id", "<i8"),
+        ("price", "<f8"),
+        ("size", "<i8"),
+        ("side", "i1"),
+        ("action", "i1"),
+    ]
+)
+KLINE = np.dtype(
+    [
+        ("ts", "<i8"),
+        ("start", "<i8"),
+        ("open", "<f8"),
+        ("high", "<f8"),
+        ("low", "<f8"),
+        ("close", "<f8"),
+        ("volume", "<i8"),
+        ("confirm", "i1"),
+    ]
+)
+INSTRUMENT = np.dtype(
+    [
+        ("ts", "<i8"),
+        ("last_price", "<f8"),
+        ("bid", "<f8"),
+        ("ask", "<f8"),
+        ("mark_price", "<f8"),
+    ]
+)
+EXECUTION = np.dtype(
+    [
+        ("ts", "<i8"),
+        ("order_id", "S36"),
+        ("order_link_id", "S36"),
+        ("side", "i1"),
+        ("price", "<f8"),
+        ("exec_qty", "<i8"),
+        ("leaves_qty", "<i8"),
+        ("exec_fee", "<f8"),
+        ("is_maker", "i1"),
+    ]
+)
+ORDER = np.dtype(
+    [
+        ("ts", "<i8"),
+        ("order_id", "S36"),
+        ("order_link_id", "S36"),
+        ("side", "i1"),
+        ("price", "<f8"),
+        ("qty", "<i8"),
+        ("cum_exec_qty", "<i8"),
+        ("status", "i1"),
+    ]
+)
+POSITION = np.dtype(
+    [
+        ("ts", "<i8"),
+        ("side", "i1"),
+        ("size", "<i8"),
+        ("entry_price", "<f8"),
+        ("liq_price", "<f8"),
+    ]
+)
+INDEX = np.dtype([("start", "<i8"), ("end", "<i8"), ("rows", "<i8")])
+
+Rows = List[Tuple[Any, ...]]
+
+
+def book_rows(ts: int, data: Any) -> Rows:
+    """ Rows of an orderBookL2_25 snapshot (list) or delta (dict) """
+    if isinstance(data, list):
+        changes = [(SNAPSHOT, data)]
+    elif isinstance(data, dict):
+        changes = [
+            (DELETE, data.get("delete", ())),
+            (UPDATE, data.get("update", ())),
+            (INSERT, data.get("insert", ())),
+        ]
+    else:
+        return []
+    return [
+        (
+            ts,
+            int(level["id"]),
+            float(level.get("price", nan)),
+            int(level.get("size", 0)),
+            SIDES[level["side"]],
+            action,
+        )
+        for action, levels in changes
+        for level in levels
+    ]
+
+
+def kline_rows(ts: int, data: Any) -> Rows:
+    """ Rows of a kline message, the start is in seconds """
+    return [
+        (
+            ts,
+            int(kline.get("start", kline.get("open_time", 0))),
+            float(kline["open"]),
+            float(kline["high"]),
+            float(kline["low"]),
+            float(kline["close"]),
+            int(float(kline["volume"])),
+            bool(kline.get("confirm", False)),
+        )
+        for kline in (data if isinstance(data, list) else [data])
+    ]
+
+
+def instrument_rows(ts: int, data: Any) -> Rows:
+    """ Rows of an instrument_info snapshot or of its update deltas """
+    if not isinstance(data, dict):
+        return []
+    return [
+        (
+            ts,
+            float(info.get("last_price", nan)),
+            float(info.get("bid1_price", nan)),
+            float(info.get("ask1_price", nan)),
+            float(info.get("mark_price", nan)),
+        )
+        for info in data.get("update", [data])
+    ]
+
+
+def execution_rows(ts: int, data: Any) -> Rows:
+    return [
+        (
+            ts,
+            execution["order_id"],
+            execution.get("order_link_id", ""),
+            SIDES[execution["side"]],
+            float(execution["price"]),
+            int(execution["exec_qty"]),
+            int(execution.get("leaves_qty", 0)),
+            float(execution.get("exec_fee", 0)),
+            bool(execution.get("is_maker", False)),
+        )
+        for execution in data
+    ]
+
+
+def order_rows(ts: int, data: Any) -> Rows:
+    return [
+        (
+            ts,
+            order["order_id"],
+            order.get("order_link_id", ""),
+            SIDES[order["side"]],
+            float(order["price"]),
+            int(order["qty"]),
+            int(order.get("cum_exec_qty", 0)),
+            STATUS_CODES.get(order["order_status"], UNKNOWN_STATUS),
+        )
+        for order in data
+    ]
+
+
+def position_rows(ts: int, data: Any) -> Rows:
+    return [
+        (
+            ts,
+            SIDES[position["side"]],
+            int(position["size"]),
+            float(position["entry_price"]),
+            float(position["liq_price"]),
+        )
+        for position in data
+    ]
+
+
+# the kind of a topic is the part before the first dot
+KINDS: Dict[str, Tuple[np.dtype, Callable[[int, Any], Rows]]] = {
+    "orderBookL2_25": (BOOK, book_rows),
+    "kline": (KLINE, kline_rows),
+    "instrument_info": (INSTRUMENT, instrument_rows),
+    "execution": (EXECUTION, execution_rows),
+    "order": (ORDER, order_rows),
+    "position": (POSITION, position_rows),
+}
+
+
+def topics(symbol: str = "BTCUSD", interval: str = "1m") -> List[str]:
+    """ The topics of BybitWebsocket once everything is subscribed """
+    return [
+        f"orderBookL2_25.{symbol}",
+        f"kline.{symbol}.{interval}",
+        f"instrument_info.100ms.{symbol}",
+        "execution",
+        "order",
+        "position",
+    ]
+
+
+def kind(topic: str) -> str:
+    return topic.split(".")[0]
+
+
+class ChunkWriter:
+    """Append fixed-width records to `directory`, one chunk file at a time
+
+    The records are buffered in a preallocated array and written as a .npy
+    file, or a deflated .npz one when `compress` is set, once the buffer is
+    full or flushed.  index.bin gets the first and last timestamp and the
+    number of rows of each chunk after the chunk is on disk, so the readers
+    only ever see complete chunks.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        dtype: np.dtype,
+        rows: int = CHUNK_ROWS,
+        compress: bool = False,
+    ) -> None:
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.compress = compress
+        self.buffer = np.empty(rows, dtype)
+        self.length = 0
+        self.chunk = len(read_index(directory))
+
+    def append(self, rows: Rows) -> None:
+        records: np.ndarray = np.array(rows, dtype=self.buffer.dtype)
+        while len(records):
+            space = len(self.buffer) - self.length
+            part, records = records[:space], records[space:]
+            self.buffer[self.length : self.length + len(part)] = part
+            self.length += len(part)
+            if self.length == len(self.buffer):
+                self.flush()
+
+    def flush(self) -> None:
+        if not self.length:
+            return
+        records = self.buffer[: self.length]
+        name = os.path.join(self.directory, f"{self.chunk:08d}")
+        extension = ".npz" if self.compress else ".npy"
+        with open(name + ".tmp", "wb") as f:
+            if self.compress:
+                np.savez_compressed(f, records=records)
+            else:
+                np.save(f, records)
+        os.replace(name + ".tmp", name + extension)
+        entry = np.array([(records["ts"][0], records["ts"][-1], self.length)], INDEX)
+        with open(os.path.join(self.directory, INDEX_FILE), "ab") as f:
+            f.write(entry.tobytes())
+        self.chunk += 1
+        self.length = 0
+
+
+def read_index(directory: str) -> np.ndarray:
+    """ The (start, end, rows) of the chunks of a topic directory """
+    path = os.path.join(directory, INDEX_FILE)
+    if not os.path.exists(path):
+        return np.empty(0, INDEX)
+    return np.fromfile(path, INDEX)
+
+
+class Recording:
+    """A directory written by the Recorder
+
+    The .npy chunks are memory mapped, so reading a topic costs nothing until
+    the records are used.  The compressed chunks are inflated in memory.  The
+    `start` and `end` of a range are epochs in seconds, the end is excluded.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+
+    @property
+    def topics(self) -> List[str]:
+        return sorted(
+            topic
+            for topic in os.listdir(self.directory)
+            if os.path.exists(os.path.join(self.directory, topic, INDEX_FILE))
+        )
+
+    def index(self, topic: str) -> np.ndarray:
+        return read_index(os.path.join(self.directory, topic))
+
+    def _load(self, topic: str, chunk: int) -> np.ndarray:
+        name = os.path.join(self.directory, topic, f"{chunk:08d}")
+        if os.path.exists(name + ".npy"):
+            return np.load(name + ".npy", mmap_mode="r")
+        with np.load(name + ".npz") as archive:
+            return archive["records"]
+
+    def chunks(
+        self, topic: str, start: Optional[float] = None, end: Optional[float] = None
+    ) -> Iterator[np.ndarray]:
+        """ The records of the topic in [start, end) chunk by chunk """
+        low = None if start is None else int(start * 1e9)
+        high = None if end is None else int(end * 1e9)
+        for chunk, entry in enumerate(self.index(topic)):
+            if low is not None and entry["end"] < low:
+                continue
+            if high is not None and entry["start"] >= high:
+                break
+            records = self._load(topic, chunk)
+            stamps = records["ts"]
+            first = 0 if low is None else np.searchsorted(stamps, low)
+            last = len(records) if high is None else np.searchsorted(stamps, high)
+            if last > first:
+                yield records[first:last]
+
+    def read(
+        self, topic: str, start: Optional[float] = None, end: Optional[float] = None
+    ) -> np.ndarray:
+        """ The records of the topic in [start, end) as a single array """
+        parts = list(self.chunks(topic, start, end))
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return np.empty(0, KINDS[kind(topic)][0])
+        return np.concatenate(parts)
+
+
+class Recorder:
+    """Drain the websocket topics into a Recording
+
+    The messages drained together share the same receive time.  The chunks
+    are flushed when they are full and at least every `flush_every` seconds,
+    so a crash loses at most that much data.
+    """
+
+    def __init__(
+        self,
+        ws: Any,
+        directory: str,
+        topics: List[str],
+        compress: bool = False,
+        rows: int = CHUNK_ROWS,
+        flush_every: float = FLUSH_EVERY,
+    ) -> None:
+        self.ws = ws
+        self.flush_every = flush_every
+        self.streams: Dict[str, Tuple[Callable[[int, Any], Rows], ChunkWriter]] = {}
+        for topic in topics:
+            dtype, parser = KINDS[kind(topic)]
+            writer = ChunkWriter(os.path.join(directory, topic), dtype, rows, compress)
+            self.streams[topic] = (parser, writer)
+        self.received = 0
+
+    def pump(self) -> int:
+        """ Record the pending messages, return how many there were """
+        received = 0
+        for topic, (parser, writer) in self.streams.items():
+            messages = drain(self.ws, topic)
+            if not messages:
+                continue
+            ts = time_ns()
+            rows = [row for message in messages for row in parser(ts, message)]
+            if rows:
+                writer.append(rows)
+            received += len(messages)
+        self.received += received
+        return received
+
+    def flush(self) -> None:
+        for _, writer in self.streams.values():
+            writer.flush()
+
+    def run(self, duration: Optional[float] = None, poll: float = FEEDBACK_POLL) -> None:
+        """ Record until `duration` seconds have passed, or forever """
+        started = flushed = monotonic()
+        try:
+            while duration is None or monotonic() - started < duration:
+                if not self.pump():
+                    sleep(poll)
+                if monotonic() - flushed >= self.flush_every:
+                    self.flush()
+                    flushed = monotonic()
+                    LOGGER.info(f"Recorded {self.received} messages")
+        finally:
+            self.flush()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """ Entry point of cbot record """
+    parser = ArgumentParser(description="Record the Bybit websocket topics")
+    parser.add_argument("directory")
+    parser.add_argument("--symbol", default="BTCUSD")
+    parser.add_argument("--interval", default="1m", help="of the klines")
+    parser.add_argument("--duration", type=float, help="in seconds, default: forever")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument(
+        "--compress", action="store_true", help="deflate the chunks, no memory map"
+    )
+    args = parser.parse_args(argv)
+
+    ws = BybitWebsocket.BybitWebsocket(
+        wsURL=WS_URL,
+        api_key=environ["BYBIT_MAINNET_API_KEY"],
+        api_secret=environ["BYBIT_MAINNET_API_SECRET"],
+    )
+    ws.subscribe_orderBookL2(args.symbol)
+    ws.subscribe_kline(args.symbol, args.interval)
+    ws.subscribe_instrument_info(args.symbol)
+    ws.subscribe_execution()
+    ws.subscribe_order()
+    ws.subscribe_position()
+    recorder = Recorder(
+        ws,
+        args.directory,
+        topics(args.symbol, args.interval),
+        args.compress,
+        args.chunk_rows,
+    )
+    try:
+        recorder.run(args.duration)
+    except KeyboardInterrupt:
+        LOGGER.info(f"End of recording: {recorder.received} messages")
@@ -0,0 +1,568 @@
+# Standard Library
+from argparse import ArgumentParser
+from bisect import bisect_left
+from collections import defaultdict
+from heapq import merge
+from itertools import count, groupby
+from math import inf, isnan
+from time import sleep
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from crypto_bot.backtest import SEED, EndOfData
+from crypto_bot.bot import (
+    FEEDBACK_DRAIN,
+    LOGGER,
+    BybitExchange,
+    CharlieBot,
+    Clock,
+    Exchange,
+    Ladder,
+    Placement,
+)
+from crypto_bot.recorder import (
+    DELETE,
+    INSERT,
+    ORDER_STATUSES,
+    SNAPSHOT,
+    UPDATE,
+    Recording,
+    kind,
+)
+
+SIDE_NAMES = {1: "Buy", -1: "Sell", 0: "None"}
+ACTIONS = {DELETE: "delete", UPDATE: "update", INSERT: "insert"}
+# how far from the replay time a request looks for its recorded ack, in ns
+MATCH_WINDOW = 5 * 10 ** 9
+
+Event = Tuple[int, str, Any]
+
+
+class Divergence(NamedTuple):
+    """ A request of the replayed bot that the recording cannot answer """
+
+    time: float
+    request: str
+    detail: str
+
+
+class ReplayReport(NamedTuple):
+    start: float
+    end: float
+    requests: int
+    divergences: List[Divergence]
+
+
+class ReplayClock(Clock):
+    """Time of the replay, moved forward by the sleeps of the bot
+
+    At a finite `speed` each sleep also waits seconds / speed for real.  The
+    replay ends with EndOfData once the clock goes past `end`.
+    """
+
+    def __init__(self, start: float, end: float = inf, speed: float = inf) -> None:
+        self.now = start
+        self.end = end
+        self.speed = speed
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        if self.now > self.end:
+            raise EndOfData
+        self.now += seconds
+        if self.speed != inf:
+            sleep(seconds / self.speed)
+
+
+def book_level(level_id: int, price: float, size: int, side: int, action: int) -> Any:
+    level = {"id": level_id, "side": SIDE_NAMES[side]}
+    if not isnan(price):
+        level["price"] = price
+    if action != DELETE:
+        level["size"] = size
+    return level
+
+
+def starts_message(ts: int, action: int, last_ts: int, last_action: int) -> bool:
+    """ Whether a row of the order book belongs to a new message """
+    return (
+        ts != last_ts
+        or action < last_action
+        or (action == SNAPSHOT) != (last_action == SNAPSHOT)
+    )
+
+
+def book_messages(rows: Iterable[Tuple[Any, ...]]) -> Iterator[Tuple[int, Any]]:
+    """Rebuild the orderBookL2_25 snapshots and deltas from the rows
+
+    A delta lists its deletes, then its updates, then its inserts, so a new
+    message starts when the action of the rows goes back.
+    """
+    message: Any = None
+    last_ts = last_action = 0
+    for ts, level_id, price, size, side, action in rows:
+        if message is None or starts_message(ts, action, last_ts, last_action):
+            if message is not None:
+                yield last_ts, message
+            if action == SNAPSHOT:
+                message = []
+            else:
+                message = {name: [] for name in ACTIONS.values()}
+        level = book_level(level_id, price, size, side, action)
+        if action == SNAPSHOT:
+            message.append(level)
+        else:
+            message[ACTIONS[action]].append(level)
+        last_ts, last_action = ts, action
+    if message is not None:
+        yield last_ts, message
+
+
+def order_message(symbol: str, row: Tuple[Any, ...]) -> Dict[str, Any]:
+    _, order_id, order_link_id, side, price, qty, cum_exec_qty, status = row
+    return {
+        "order_id": order_id.decode(),
+        "order_link_id": order_link_id.decode(),
+        "symbol": symbol,
+        "side": SIDE_NAMES[side],
+        "price": price,
+        "qty": qty,
+        "cum_exec_qty": cum_exec_qty,
+        "order_status": ORDER_STATUSES[status],
+    }
+
+
+def execution_message(symbol: str, row: Tuple[Any, ...]) -> Dict[str, Any]:
+    _, order_id, order_link_id, side, price, exec_qty, leaves_qty, fee, maker = row
+    return {
+        "symbol": symbol,
+        "order_id": order_id.decode(),
+        "order_link_id": order_link_id.decode(),
+        "side": SIDE_NAMES[side],
+        "price": price,
+        "exec_type": "Trade",
+        "exec_qty": exec_qty,
+        "leaves_qty": leaves_qty,
+        "exec_fee": fee,
+        "is_maker": bool(maker),
+    }
+
+
+def position_message(symbol: str, row: Tuple[Any, ...]) -> Dict[str, Any]:
+    _, side, size, entry_price, liq_price = row
+    return {
+        "symbol": symbol,
+        "side": SIDE_NAMES[side],
+        "size": size,
+        "entry_price": entry_price,
+        "liq_price": liq_price,
+    }
+
+
+def instrument_message(symbol: str, row: Tuple[Any, ...]) -> Dict[str, Any]:
+    fields = ("last_price", "bid1_price", "ask1_price", "mark_price")
+    return {
+        name: value for name, value in zip(fields, row[1:]) if not isnan(value)
+    }
+
+
+def grouped_messages(
+    rows: Iterable[Tuple[Any, ...]], to_message: Callable[[Tuple[Any, ...]], Any]
+) -> Iterator[Tuple[int, List[Any]]]:
+    """ One list message per receive time """
+    for ts, group in groupby(rows, key=lambda row: row[0]):
+        yield ts, [to_message(row) for row in group]
+
+
+def topic_messages(
+    recording: Recording,
+    topic: str,
+    symbol: str,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+) -> Iterator[Event]:
+    """ The messages of a recorded topic as BybitWebsocket returned them """
+    topic_kind = kind(topic)
+    for records in recording.chunks(topic, start, end):
+        rows = records.tolist()
+        if topic_kind == "orderBookL2_25":
+            messages = book_messages(rows)
+        elif topic_kind == "instrument_info":
+            messages = (
+                (ts, {"update": updates})
+                for ts, updates in grouped_messages(
+                    rows, lambda row: instrument_message(symbol, row)
+                )
+            )
+        else:
+            to_message = {
+                "order": order_message,
+                "execution": execution_message,
+                "position": position_message,
+            }[topic_kind]
+            messages = grouped_messages(rows, lambda row: to_message(symbol, row))
+        for ts, message in messages:
+            yield ts, topic, message
+
+
+class ReplayWebsocket:
+    """BybitWebsocket answering from a Recording
+
+    The recorded messages are released once the replay clock reaches their
+    receive time.  Like BybitWebsocket, get_data pops the most recent message
+    first and only the last FEEDBACK_DRAIN ones of a topic are kept.  The last
+    quote and position released are kept for the REST stand-in.
+    """
+
+    def __init__(self, events: Iterator[Event], clock: ReplayClock) -> None:
+        self.events = events
+        self.clock = clock
+        self.pending: Dict[str, List[Any]] = defaultdict(list)
+        self.ticker: Dict[str, float] = {}
+        self.position: Dict[str, Any] = {"side": "None", "size": 0}
+        self._next = next(self.events, None)
+
+    def inject(self, topic: str, message: Any) -> None:
+        """ Deliver a message that is not in the recording """
+        self.release()
+        self.pending[topic].append(message)
+
+    def release(self) -> None:
+        now = int(self.clock.time() * 1e9)
+        while self._next is not None and self._next[0] <= now:
+            _, topic, message = self._next
+            stack = self.pending[topic]
+            stack.append(message)
+            if len(stack) > FEEDBACK_DRAIN:
+                del stack[0]
+            if topic.startswith("instrument_info"):
+                for update in message["update"]:
+                    self.ticker.update(update)
+            elif topic == "position" and message:
+                self.position = message[-1]
+            self._next = next(self.events, None)
+
+    def get_data(self, topic: str) -> Any:
+        self.release()
+        stack = self.pending.get(topic)
+        return stack.pop() if stack else []
+
+    def ping(self) -> None:
+        pass
+
+    def _subscribe(self, *args: Any) -> None:
+        pass
+
+    subscribe_order = subscribe_execution = subscribe_position = _subscribe
+    subscribe_orderBookL2 = subscribe_instrument_info = subscribe_kline = _subscribe
+
+
+class Response:
+    """ The future returned by the bybit client """
+
+    def __init__(self, body: Dict[str, Any]) -> None:
+        self.body = body
+
+    def result(self) -> Tuple[Dict[str, Any], None]:
+        return self.body, None
+
+
+class ReplayRest:
+    """The bybit REST client answering from a Recording
+
+    An order request is matched with the first recorded ack of the same order
+    around the replay time.  The ack then arrives through the replayed order
+    topic.  A request without a recorded ack is a Divergence: it is answered
+    with a made up ack, so the bot goes on, and it is reported.
+    """
+
+    def __init__(
+        self, ws: ReplayWebsocket, orders: List[Dict[str, Any]], symbol: str
+    ) -> None:
+        self.ws = ws
+        self.symbol = symbol
+        # the recorded order messages, with their receive time
+        self.orders = orders
+        self.times = [order["ts"] for order in orders]
+        self.requests = 0
+        self.divergences: List[Divergence] = []
+        self._claimed: Set[int] = set()
+        # the first message of each recorded order, and the orders placed
+        self._firsts: Set[int] = set()
+        seen: Set[str] = set()
+        for index, order in enumerate(orders):
+            if order["order_id"] not in seen:
+                seen.add(order["order_id"])
+                self._firsts.add(index)
+        self._placed: Set[str] = set()
+        self._made_up: Dict[str, Dict[str, Any]] = {}
+        self._ids = count(1)
+        self.Order = self.Positions = self.Market = self
+
+    def _now(self) -> int:
+        return int(self.ws.clock.time() * 1e9)
+
+    def _match(
+        self, predicate: Callable[[int, Dict[str, Any]], bool]
+    ) -> Optional[Dict[str, Any]]:
+        """ Claim the first recorded ack around now that satisfies predicate """
+        self.requests += 1
+        now = self._now()
+        first = bisect_left(self.times, now - MATCH_WINDOW)
+        for index in range(first, len(self.orders)):
+            order = self.orders[index]
+            if order["ts"] > now + MATCH_WINDOW:
+                break
+            if index in self._claimed or not predicate(index, order):
+                continue
+            self._claimed.add(index)
+            if order["ts"] <= now:
+                # already delivered before the request, deliver it again
+                self.ws.inject("order", [self._message(order)])
+            return order
+        return None
+
+    def _message(self, order: Dict[str, Any]) -> Dict[str, Any]:
+        return {name: value for name, value in order.items() if name != "ts"}
+
+    def _diverge(self, request: str, order: Dict[str, Any]) -> None:
+        divergence = Divergence(self.ws.clock.time(), request, str(order))
+        LOGGER.warning(f"Replay diverged: {divergence}")
+        self.divergences.append(divergence)
+        self.ws.inject("order", [order])
+
+    def Order_new(
+        self, side: str, symbol: str, qty: int, price: float, **params: Any
+    ) -> Response:
+        matched = self._match(
+            lambda index, order: index in self._firsts
+            and order["order_id"] not in self._placed
+            and (order["side"], order["price"], order["qty"]) == (side, price, qty)
+        )
+        if matched is not None:
+            order_id = matched["order_id"]
+            self._placed.add(order_id)
+        else:
+            order_id = f"replay-{next(self._ids)}"
+            order = {
+                "order_id": order_id,
+                "order_link_id": "",
+                "symbol": symbol,
+                "side": side,
+                "price": price,
+                "qty": qty,
+                "cum_exec_qty": 0,
+                "order_status": "New",
+            }
+            self._made_up[order_id] = order
+            self._diverge("Order_new", order)
+        return Response({"ret_code": 0, "result": {"order_id": order_id}})
+
+    def Order_replace(
+        self, symbol: str, order_id: str, p_r_price: float, p_r_qty: int
+    ) -> Response:
+        if not self._match(
+            lambda _, order: order["order_id"] == order_id
+            and (order["price"], order["qty"]) == (p_r_price, p_r_qty)
+        ):
+            order = dict(
+                self._made_up.get(order_id, {"order_id": order_id, "side": "Buy"}),
+                price=p_r_price,
+                qty=p_r_qty,
+                order_status="New",
+            )
+            self._diverge("Order_replace", order)
+        return Response({"ret_code": 0, "result": {"order_id": order_id}})
+
+    def Order_cancel(self, symbol: str, order_id: str) -> Response:
+        if not self._match(
+            lambda _, order: order["order_id"] == order_id
+            and order["order_status"] == "Cancelled"
+        ):
+            self._cancel(order_id, "Order_cancel")
+        return Response({"ret_code": 0, "result": {"order_id": order_id}})
+
+    def Order_cancelAll(self, symbol: str) -> Response:
+        if not self._match(lambda _, order: order["order_status"] == "Cancelled"):
+            for order_id in list(self._made_up):
+                self._cancel(order_id, "Order_cancelAll")
+        return Response({"ret_code": 0, "result": []})
+
+    def _cancel(self, order_id: str, request: str) -> None:
+        order = self._made_up.pop(order_id, {"order_id": order_id, "side": "Buy"})
+        self._diverge(request, dict(order, order_status="Cancelled"))
+
+    def Positions_myPosition(self, symbol: str) -> Response:
+        position = self.ws.position
+        return Response(
+            {
+                "result": {
+                    "side": position["side"],
+                    "size": int(position["size"]),
+                    "entry_price": position.get("entry_price", 0),
+                    "liq_price": position.get("liq_price", 0),
+                    "unrealised_pnl": 0,
+                },
+                "rate_limit_status": 120,
+                "rate_limit_reset_ms": int(self.ws.clock.time() * 1000),
+                "rate_limit": 120,
+            }
+        )
+
+    def Market_symbolInfo(self) -> Response:
+        ticker = self.ws.ticker
+        last_price = ticker.get("last_price", 0)
+        return Response(
+            {
+                "result": [
+                    {
+                        "symbol": self.symbol,
+                        "bid_price": ticker.get("bid1_price", last_price),
+                        "ask_price": ticker.get("ask1_price", last_price),
+                        "last_price": last_price,
+                    }
+                ]
+            }
+        )
+
+
+class ReplayExchange(BybitExchange):
+    """BybitExchange on a replayed session
+
+    The feedback is dispatched and the requests are sent on the thread of
+    the bot, and the orders are placed and cancelled one after the other, so
+    a replay always takes the same path.
+    """
+
+    def start(self) -> None:
+        pass
+
+    def _send(self, key: str, send: Callable[[], None]) -> None:
+        self._send_now(key, send)
+
+    def place_many(self, orders: Iterable[Tuple[str, float, int]]) -> List[Placement]:
+        return Exchange.place_many(self, orders)
+
+    def cancel_many(self, order_ids: Iterable[str]) -> List[Optional[BaseException]]:
+        return Exchange.cancel_many(self, order_ids)
+
+
+def replay_exchange(
+    recording: Recording,
+    symbol: str = "BTCUSD",
+    speed: float = inf,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+) -> ReplayExchange:
+    """ A ReplayExchange on the topics of the recording the bot listens to """
+    topics = [
+        topic
+        for topic in (
+            "order",
+            f"orderBookL2_25.{symbol}",
+            f"instrument_info.100ms.{symbol}",
+            "execution",
+            "position",
+        )
+        if topic in recording.topics
+    ]
+    indexes = [recording.index(topic) for topic in topics]
+    first = float(min(index["start"][0] for index in indexes if len(index))) / 1e9
+    last = float(max(index["end"][-1] for index in indexes if len(index))) / 1e9
+    start = first if start is None else start
+    end = last if end is None else min(end, last)
+    clock = ReplayClock(start, end, speed)
+
+    events = merge(
+        *(topic_messages(recording, topic, symbol, start, end) for topic in topics),
+        key=lambda event: event[0],
+    )
+    ws = ReplayWebsocket(events, clock)
+    orders = [
+        dict(message, ts=ts)
+        for ts, _, messages in topic_messages(recording, "order", symbol, start, end)
+        for message in messages
+    ]
+    rest = ReplayRest(ws, orders, symbol)
+    return ReplayExchange(symbol, rest=rest, ws=ws, clock=clock, seed=SEED)
+
+
+def replay(
+    directory: str,
+    short_big_spread: int,
+    short_small_spread: int,
+    init_quantity: int,
+    speed: float = inf,
+    symbol: str = "BTCUSD",
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    ladder: Ladder = Ladder(),
+) -> ReplayReport:
+    """ Run CharlieBot on a recorded session until it is exhausted """
+    exchange = replay_exchange(Recording(directory), symbol, speed, start, end)
+    clock = exchange.clock
+    first = clock.time()
+    bot = CharlieBot(
+        short_big_spread,
+        short_small_spread,
+        init_quantity,
+        "replay",
+        exchange,
+        ladder,
+    )
+    try:
+        bot.trade()
+    except EndOfData:
+        pass
+    return ReplayReport(
+        first, clock.time(), exchange.rest.requests, exchange.rest.divergences
+    )
+
+
+def parse_speed(speed: str) -> float:
+    return inf if speed == "max" else float(speed)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """ Entry point of cbot replay """
+    parser = ArgumentParser(description="Replay a recorded session on CharlieBot")
+    parser.add_argument("directory", help="written by cbot record")
+    parser.add_argument("short_big_spread", type=int)
+    parser.add_argument("short_small_spread", type=int)
+    parser.add_argument("initial_quantity", type=int)
+    parser.add_argument("--symbol", default="BTCUSD")
+    parser.add_argument(
+        "--speed", type=parse_speed, default=inf, help="1, 10, ... or max (default)"
+    )
+    parser.add_argument("--start", type=float, help="epoch in seconds")
+    parser.add_argument("--end", type=float, help="epoch in seconds")
+    args = parser.parse_args(argv)
+
+    report = replay(
+        args.directory,
+        args.short_big_spread,
+        args.short_small_spread,
+        args.initial_quantity,
+        args.speed,
+        args.symbol,
+        args.start,
+        args.end,
+    )
+    for divergence in report.divergences:
+        print(divergence)
+    print(
+        f"replayed {report.end - report.start:.1f}s: {report.requests} requests, "
+        f"{len(report.divergences)} divergences"
+    )
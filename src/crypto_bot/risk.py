@@ -0,0 +1,96 @@
+# Standard Library
+from argparse import ArgumentParser
+from typing import Callable, List, NamedTuple, Optional, Tuple, cast
+
+import numpy as np  # type: ignore
+
+from crypto_bot.bot import Ladder, liquidation_price
+
+MAINTENANCE_MARGIN = 0.005
+# liquidation_price is plain arithmetic, it broadcasts over numpy arrays too
+broadcast_liquidation_price = cast(Callable[..., np.ndarray], liquidation_price)
+
+
+class LadderRisk(NamedTuple):
+    """The ladder below each entry price and the risk once rungs 1..k are filled
+
+    The axes are (entry prices, balances, rungs).
+    """
+
+    prices: np.ndarray  # (E, K)
+    quantities: np.ndarray  # (K,)
+    positions: np.ndarray  # (K,)
+    entry_prices: np.ndarray  # (E, K)
+    liquidation_prices: np.ndarray  # (E, B, K)
+
+
+def round_points(entries: np.ndarray) -> np.ndarray:
+    """ round_point on an array of positive prices """
+    return np.floor(np.round(entries, 1) * 2) / 2
+
+
+def ladder_prices(
+    entry_prices: np.ndarray, quantity: int, ladder: Ladder = Ladder()
+) -> Tuple[np.ndarray, np.ndarray]:
+    """allocate_longs(entry_price, quantity) for every entry price, return the
+    (E, K) prices and the (K,) quantities of the rungs"""
+    multiplicator, intercept, growth_factor, max_quantity = ladder
+    rungs = max(int(np.floor(np.log2(max_quantity / quantity))) + 1, 0)
+    quantities = quantity * 2 ** np.arange(rungs)
+    steps = multiplicator * intercept * growth_factor ** np.arange(1, rungs + 1)
+    prices = np.empty((len(entry_prices), rungs))
+    price = np.asarray(entry_prices, dtype=float)
+    for rung in range(rungs):
+        # the rounding makes each rung depend on the previous one
+        price = round_points(round_points(price) - steps[rung])
+        prices[:, rung] = price
+    return prices, quantities
+
+
+def ladder_risk(
+    entry_prices: np.ndarray,
+    balances: np.ndarray,
+    quantity: int,
+    ladder: Ladder = Ladder(),
+    order_margin: float = 0,
+    fee_to_open: float = 0,
+    maintenance_margin: float = MAINTENANCE_MARGIN,
+) -> LadderRisk:
+    """Compute the ladder CharlieBot puts below a position of `quantity`
+    contracts, and the position, average entry and liquidation prices if the
+    rungs 1..k are filled, for every entry price and every balance"""
+    entry_prices = np.atleast_1d(np.asarray(entry_prices, dtype=float))
+    balances = np.atleast_1d(np.asarray(balances, dtype=float))
+    prices, quantities = ladder_prices(entry_prices, quantity * 2, ladder)
+
+    positions = quantity + np.cumsum(quantities)
+    # inverse contracts average the entry price on 1 / price
+    cost = quantity / entry_prices[:, None] + np.cumsum(quantities / prices, axis=1)
+    average = positions / cost
+    liquidations = broadcast_liquidation_price(
+        positions,
+        average[:, None, :],
+        balances[None, :, None],
+        order_margin,
+        fee_to_open,
+        maintenance_margin,
+    )
+    return LadderRisk(prices, quantities, positions, average, liquidations)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """ Entry point of cbot risk """
+    parser = ArgumentParser(description="Liquidation risk of the long ladder")
+    parser.add_argument("entry_price", type=float)
+    parser.add_argument("balance", type=float, help="in BTC")
+    parser.add_argument("quantity", type=int, help="size of the position")
+    args = parser.parse_args(argv)
+
+    risk = ladder_risk(args.entry_price, args.balance, args.quantity)
+    print("rung\tprice\tquantity\tposition\tentry\tliquidation")
+    for rung in range(len(risk.quantities)):
+        print(
+            f"{rung + 1}\t{risk.prices[0, rung]}\t{risk.quantities[rung]}\t"
+            f"{risk.positions[rung]}\t{risk.entry_prices[0, rung]:.1f}\t"
+            f"{risk.liquidation_prices[0, 0, rung]:.1f}"
+        )
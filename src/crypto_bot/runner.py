@@ -0,0 +1,331 @@
+# Standard Library
+from argparse import ArgumentParser
+from collections import defaultdict
+from os import environ
+from threading import Lock, Thread
+from time import monotonic
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+import BybitWebsocket  # type: ignore
+
+from crypto_bot import logs
+from crypto_bot.bot import (
+    FEEDBACK_DRAIN,
+    FEEDBACK_POLL,
+    JOURNAL_DIR,
+    LIVE_STATUSES,
+    LOGGER,
+    RECONNECT_MIN,
+    SLEEP_WS,
+    WS_URL,
+    BybitExchange,
+    CharlieBot,
+    Ladder,
+    bybit_client,
+    drain,
+)
+from crypto_bot.client import Lazy
+from crypto_bot.journal import Journal
+from crypto_bot.scheduler import RATE_LIMIT, RATE_WINDOW, RequestScheduler
+
+# the topics of the account, their messages carry the symbol
+PRIVATE_TOPICS = ("order", "execution", "position")
+
+
+class BotSpec(NamedTuple):
+    """ The symbol and the parameters of one CharlieBot """
+
+    symbol: str
+    short_big_spread: int
+    short_small_spread: int
+    init_quantity: int
+    ladder: Ladder = Ladder()
+
+
+def parse_bot(spec: str) -> BotSpec:
+    """Parse SYMBOL:BIG:SMALL:QTY, optionally followed by the ladder
+    :MULTIPLICATOR:INTERCEPT:GROWTH_FACTOR:MAX_QUANTITY"""
+    symbol, *values = spec.split(":")
+    if len(values) not in (3, 7):
+        raise ValueError(f"Expected SYMBOL:BIG:SMALL:QTY[:LADDER], got: {spec}")
+    big, small, quantity = (int(value) for value in values[:3])
+    ladder = Ladder()
+    if len(values) == 7:
+        multiplicator, intercept, growth_factor, max_quantity = values[3:]
+        ladder = Ladder(
+            int(multiplicator), int(intercept), float(growth_factor), int(max_quantity)
+        )
+    return BotSpec(symbol, big, small, quantity, ladder)
+
+
+class SymbolFeed:
+    """The part of a SharedWebsocket a BybitExchange sees
+
+    It behaves like BybitWebsocket restricted to one symbol: get_data pops
+    the most recent message of the topic first, and keeps the last
+    FEEDBACK_DRAIN ones.
+    """
+
+    def __init__(self, hub: "SharedWebsocket", symbol: str) -> None:
+        self.hub = hub
+        self.symbol = symbol
+        self.pending: Dict[str, List[Any]] = defaultdict(list)
+        self._lock = Lock()
+
+    def push(self, topic: str, message: Any) -> None:
+        with self._lock:
+            stack = self.pending[topic]
+            stack.append(message)
+            if len(stack) > FEEDBACK_DRAIN:
+                del stack[0]
+
+    def get_data(self, topic: str) -> Any:
+        self.hub.pump()
+        with self._lock:
+            stack = self.pending.get(topic)
+            return stack.pop() if stack else []
+
+    def ping(self) -> None:
+        self.hub.ping()
+
+    def reconnect(self) -> None:
+        self.hub.reconnect()
+
+    def subscribe_order(self) -> None:
+        self.hub.subscribe("order", "subscribe_order")
+
+    def subscribe_execution(self) -> None:
+        self.hub.subscribe("execution", "subscribe_execution")
+
+    def subscribe_position(self) -> None:
+        self.hub.subscribe("position", "subscribe_position")
+
+    def subscribe_orderBookL2(self, symbol: str) -> None:
+        self.hub.subscribe(f"orderBookL2_25.{symbol}", "subscribe_orderBookL2", symbol)
+
+    def subscribe_instrument_info(self, symbol: str) -> None:
+        self.hub.subscribe(
+            f"instrument_info.100ms.{symbol}", "subscribe_instrument_info", symbol
+        )
+
+
+class SharedWebsocket:
+    """One BybitWebsocket multiplexed between the symbols
+
+    Each topic is subscribed once.  The messages are drained by whichever
+    feed asks first and routed to the feed of their symbol: by the topic
+    name for the market data, by the symbol of each item for the topics of
+    the account.  The pongs go to every feed, as they all share the
+    connection.  A reconnection replaces the websocket with `connect` once
+    for all the feeds and subscribes again its topics.
+    """
+
+    def __init__(
+        self,
+        ws: Any,
+        poll: float = FEEDBACK_POLL / 2,
+        connect: Optional[Callable[[], Any]] = None,
+    ) -> None:
+        self.ws = ws
+        self.poll = poll
+        self.connect = connect
+        self.feeds: Dict[str, SymbolFeed] = {}
+        self.topics: Set[str] = {"pong"}
+        self._subscribed: Set[Tuple[str, ...]] = set()
+        self._lock = Lock()
+        self._pumped = 0.0
+        self._pinged = 0.0
+        self._connected = monotonic()
+
+    def feed(self, symbol: str) -> SymbolFeed:
+        if symbol in self.feeds:
+            raise ValueError(f"A bot already trades {symbol}")
+        self.feeds[symbol] = SymbolFeed(self, symbol)
+        return self.feeds[symbol]
+
+    def subscribe(self, topic: str, method: str, *args: str) -> None:
+        with self._lock:
+            self.topics.add(topic)
+            if (method, *args) not in self._subscribed:
+                self._subscribed.add((method, *args))
+                getattr(self.ws, method)(*args)
+
+    def ping(self) -> None:
+        """ Ping once for all the feeds every SLEEP_WS """
+        with self._lock:
+            if monotonic() - self._pinged >= SLEEP_WS:
+                self._pinged = monotonic()
+                self.ws.ping()
+
+    def reconnect(self) -> None:
+        """Replace the websocket, unless another feed did it less than
+        RECONNECT_MIN ago, and subscribe again the topics"""
+        with self._lock:
+            if monotonic() - self._connected < RECONNECT_MIN:
+                return
+            dead = self.ws
+            if self.connect is not None:
+                self.ws = self.connect()
+            for method, *args in sorted(self._subscribed):
+                getattr(self.ws, method)(*args)
+            self._connected = monotonic()
+        if dead is not self.ws:
+            try:
+                dead.exit()
+            except Exception:
+                LOGGER.debug("Closing the dead websocket failed", exc_info=True)
+
+    def pump(self) -> None:
+        """ Route the pending messages, unless it was done less than poll ago """
+        if monotonic() - self._pumped < self.poll:
+            return
+        # the feeds asking while another one pumps get the messages next time
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._pumped = monotonic()
+            for topic in self.topics:
+                for message in drain(self.ws, topic):
+                    self._route(topic, message)
+        finally:
+            self._lock.release()
+
+    def _route(self, topic: str, message: Any) -> None:
+        if topic == "pong":
+            for each in self.feeds.values():
+                each.push(topic, message)
+            return
+        if topic not in PRIVATE_TOPICS:
+            feed = self.feeds.get(topic.split(".")[-1])
+            if feed is not None:
+                feed.push(topic, message)
+            return
+        by_symbol: Dict[str, List[Any]] = defaultdict(list)
+        for item in message:
+            by_symbol[item.get("symbol", "")].append(item)
+        for symbol, items in by_symbol.items():
+            feed = self.feeds.get(symbol)
+            if feed is None:
+                LOGGER.debug(
+                    f"No bot for the {topic} of {symbol}: {items}", extra=logs.SAMPLED
+                )
+                continue
+            feed.push(topic, items)
+
+
+def pool_connections(rest: Any, size: int) -> None:
+    """ Let `size` threads share the connections of the bravado session """
+    http_client = getattr(getattr(rest, "swagger_spec", None), "http_client", None)
+    session = getattr(http_client, "session", None)
+    for adapter in getattr(session, "adapters", {}).values():
+        adapter.init_poolmanager(size, size)
+
+
+class Runner:
+    """Run several CharlieBot in one process, one thread per bot
+
+    The bots share the REST client, the websocket and the request scheduler
+    of the account, which spends its requests budget.  A bot that fails is logged and
+    stopped, the others go on.
+    """
+
+    def __init__(
+        self,
+        specs: List[BotSpec],
+        rest: Any = None,
+        ws: Any = None,
+        rate_limit: int = RATE_LIMIT,
+        journal: Optional[str] = None,
+    ) -> None:
+        if rest is None:
+            rest = Lazy(lambda: self._connect_rest(len(specs)))
+        if ws is None:
+            ws = self._connect_ws()
+        self.rest = rest
+        self.hub = SharedWebsocket(ws, connect=self._connect_ws)
+        # Bybit reports the limits of the account, so they are tracked once
+        self.scheduler = RequestScheduler(limit=rate_limit)
+        self.bots = {
+            spec.symbol: CharlieBot(
+                spec.short_big_spread,
+                spec.short_small_spread,
+                spec.init_quantity,
+                "bybit",
+                BybitExchange(
+                    spec.symbol,
+                    rest=rest,
+                    ws=self.hub.feed(spec.symbol),
+                    scheduler=self.scheduler,
+                    journal=(
+                        Journal(journal, spec.symbol, LIVE_STATUSES)
+                        if journal is not None
+                        else None
+                    ),
+                ),
+                spec.ladder,
+            )
+            for spec in specs
+        }
+
+    def _connect_rest(self, size: int) -> Any:
+        rest = bybit_client(
+            environ["BYBIT_MAINNET_API_KEY"], environ["BYBIT_MAINNET_API_SECRET"]
+        )
+        pool_connections(rest, size)
+        return rest
+
+    def _connect_ws(self) -> Any:
+        return BybitWebsocket.BybitWebsocket(
+            wsURL=WS_URL,
+            api_key=environ["BYBIT_MAINNET_API_KEY"],
+            api_secret=environ["BYBIT_MAINNET_API_SECRET"],
+        )
+
+    def _trade(self, symbol: str) -> None:
+        try:
+            self.bots[symbol].trade()
+        except Exception:
+            LOGGER.exception(f"Bot stopped: {symbol}")
+
+    def run(self) -> None:
+        threads = [
+            Thread(target=self._trade, args=(symbol,), name=symbol, daemon=True)
+            for symbol in self.bots
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """ Entry point of cbot run """
+    parser = ArgumentParser(description="Run several CharlieBot on one account")
+    parser.add_argument(
+        "bots",
+        nargs="+",
+        type=parse_bot,
+        help="SYMBOL:BIG:SMALL:QTY[:MULTIPLICATOR:INTERCEPT:GROWTH:MAX_QUANTITY]",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=int,
+        default=RATE_LIMIT,
+        help=f"requests per {RATE_WINDOW}s of the account, default: {RATE_LIMIT}",
+    )
+    parser.add_argument(
+        "--journal",
+        default=JOURNAL_DIR,
+        help=f"directory of the crash recovery journals, default: {JOURNAL_DIR}",
+    )
+    parser.add_argument(
+        "--log-json", action="store_true", help="write the logs as JSON lines"
+    )
+    args = parser.parse_args(argv)
+    logs.start(args.log_json)
+
+    runner = Runner(args.bots, rate_limit=args.rate_limit, journal=args.journal)
+    try:
+        runner.run()
+    except KeyboardInterrupt:
+        LOGGER.info("End of trading")
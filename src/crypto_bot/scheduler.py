@@ -0,0 +1,198 @@
+# Standard Library
+import logging
+from collections import deque
+from concurrent.futures import Future
+from itertools import count
+from threading import Condition
+from time import time
+from typing import Any, Callable, Deque, Dict, Hashable, List, Optional, Tuple
+
+LOGGER = logging.getLogger("crypto_bot")
+
+# the priority of the REST operations, the lowest goes first
+ORDER, READ = 0, 1
+PRIORITIES = {
+    "Order_new": ORDER,
+    "Order_cancel": ORDER,
+    "Order_cancelAll": ORDER,
+    "Order_replace": ORDER,
+}
+# the share of the limit the reads leave to the orders
+RESERVE = 0.2
+# the requests Bybit accepts per window of seconds on an account
+RATE_LIMIT = 100
+RATE_WINDOW = 60
+
+Response = Tuple[Any, Any]
+# a call waiting for the budget: priority, ticket, operation and the bot calling
+Entry = Tuple[int, int, str, str]
+
+
+class Budget:
+    """ The rate limit of an endpoint, as last reported by Bybit """
+
+    __slots__ = ("limit", "remaining", "reset")
+
+    def __init__(self, limit: int, remaining: int, reset: float) -> None:
+        self.limit = limit
+        self.remaining = remaining
+        self.reset = reset
+
+
+def rate_limit(body: Any, headers: Any = None) -> Optional[Budget]:
+    """The budget reported by a response: the rate_limit fields of the body,
+    or else the X-Bapi-Limit headers"""
+    if isinstance(body, dict) and "rate_limit_status" in body:
+        return Budget(
+            int(body["rate_limit"]),
+            int(body["rate_limit_status"]),
+            int(body["rate_limit_reset_ms"]) / 1000,
+        )
+    if headers and "X-Bapi-Limit-Status" in headers:
+        return Budget(
+            int(headers["X-Bapi-Limit"]),
+            int(headers["X-Bapi-Limit-Status"]),
+            int(headers["X-Bapi-Limit-Reset-Timestamp"]) / 1000,
+        )
+    return None
+
+
+class RequestScheduler:
+    """Send the REST calls within the rate limits Bybit reports
+
+    Each response updates the budget of its endpoint, as Bybit counts each
+    one apart, so the reads of the orders do not spend those of Order_new or
+    Order_cancel.  The orders
+    may spend all of it, the reads stop once `reserve` of it is left and wait
+    for the reset, so the exchange never has to reject an order.  With a
+    `limit`, at most `limit` requests of the account are sent in any `window`
+    seconds too, for the bots sharing it.  The calls go by priority, then to
+    the bot served the least recently, so a bot retrying in a loop cannot
+    starve the others, then by arrival.  A read identical to one in flight
+    waits for its response instead of sending a request.
+    """
+
+    def __init__(
+        self,
+        reserve: float = RESERVE,
+        clock: Callable[[], float] = time,
+        limit: Optional[int] = None,
+        window: float = RATE_WINDOW,
+    ) -> None:
+        self.reserve = reserve
+        self.clock = clock
+        self.limit = limit
+        self.window = window
+        self.budgets: Dict[str, Budget] = {}
+        self._grants: Deque[float] = deque()
+        self._served: Dict[str, int] = {}
+        self._waiting: List[Entry] = []
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._tickets = count()
+        self._cond = Condition()
+
+    def _delay(self, operation: str, priority: int) -> Optional[float]:
+        """ Seconds to wait before calling the operation, None to call now """
+        budget = self.budgets.get(operation)
+        if budget is None:
+            return None
+        now = self.clock()
+        if now >= budget.reset:
+            budget.remaining = max(budget.remaining, budget.limit)
+            return None
+        floor = 0 if priority == ORDER else int(budget.limit * self.reserve)
+        if budget.remaining > floor:
+            return None
+        return budget.reset - now
+
+    def _account_delay(self) -> Optional[float]:
+        """ Seconds before the account can send a request, None if now """
+        if self.limit is None:
+            return None
+        now = self.clock()
+        while self._grants and self._grants[0] <= now - self.window:
+            self._grants.popleft()
+        if len(self._grants) < self.limit:
+            return None
+        return self._grants[0] + self.window - now
+
+    def _turn(self) -> Optional[Entry]:
+        """ The next call to send among those the budget of its endpoint allows """
+        ready = [
+            entry for entry in self._waiting if self._delay(entry[2], entry[0]) is None
+        ]
+        if not ready:
+            return None
+        return min(
+            ready, key=lambda entry: (entry[0], self._served.get(entry[3], -1), entry)
+        )
+
+    def _acquire(self, operation: str, priority: int, name: str) -> None:
+        with self._cond:
+            entry = (priority, next(self._tickets), operation, name)
+            self._waiting.append(entry)
+            delayed = False
+            while True:
+                delay = self._delay(operation, priority)
+                if delay is None:
+                    delay = self._account_delay()
+                if delay is None and self._turn() == entry:
+                    break
+                if delay is not None and not delayed:
+                    LOGGER.info(f"Rate limit of {operation}: wait {delay:.1f}s")
+                    delayed = True
+                self._cond.wait(delay)
+            self._waiting.remove(entry)
+            self._served[name] = entry[1]
+            if self.limit is not None:
+                self._grants.append(self.clock())
+            budget = self.budgets.get(operation)
+            if budget is not None:
+                budget.remaining -= 1
+            self._cond.notify_all()
+
+    def _update(self, operation: str, response: Response) -> None:
+        budget = rate_limit(response[0], getattr(response[1], "headers", None))
+        if budget is None:
+            return
+        with self._cond:
+            self.budgets[operation] = budget
+            self._cond.notify_all()
+
+    def call(
+        self,
+        group: str,
+        operation: str,
+        params: Dict[str, Any],
+        send: Callable[[], Response],
+        name: str = "",
+    ) -> Response:
+        """Send the request with `send` once the budget allows it, `name` is
+        the bot calling"""
+        priority = PRIORITIES.get(operation, READ)
+        if priority == ORDER:
+            self._acquire(operation, priority, name)
+            response = send()
+            self._update(operation, response)
+            return response
+
+        key = (group, operation, tuple(sorted(params.items())))
+        with self._cond:
+            future = self._in_flight.get(key)
+            sending = future is None
+            if sending:
+                future = self._in_flight[key] = Future()
+        if not sending:
+            return future.result()  # type: ignore
+        try:
+            self._acquire(operation, priority, name)
+            response = send()
+            self._update(operation, response)
+            future.set_result(response)  # type: ignore
+            return response
+        except BaseException as error:
+            future.set_exception(error)  # type: ignore
+            raise
+        finally:
+            with self._cond:
+                del self._in_flight[key]
@@ -0,0 +1,548 @@
+# Standard Library
+import random
+from argparse import ArgumentParser
+from collections import Counter, defaultdict, deque
+from itertools import count
+from math import floor, pi, sin, sqrt
+from threading import Event, Lock, Thread
+from time import sleep, time
+from typing import (
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from crypto_bot.bot import (
+    FEEDBACK_DRAIN,
+    LOGGER,
+    BybitExchange,
+    CharlieBot,
+)
+from crypto_bot.metrics import METRICS
+from crypto_bot.scheduler import RATE_LIMIT, RATE_WINDOW
+
+TICK = 0.5
+# the engine moves the price and matches the orders every STEP seconds
+STEP = 0.05
+# the messages of a topic kept for a websocket that does not read them
+BACKLOG = 10 * FEEDBACK_DRAIN
+
+PricePath = Callable[[float], float]
+
+
+class RandomWalk:
+    """ A gaussian random walk, `volatility` in points per square root second """
+
+    def __init__(self, start: float, volatility: float, seed: int = 0) -> None:
+        self.prices = [start]
+        self.scale = volatility * sqrt(STEP)
+        self.random = random.Random(seed)
+
+    def __call__(self, elapsed: float) -> float:
+        step = int(elapsed / STEP)
+        while len(self.prices) <= step:
+            self.prices.append(self.prices[-1] + self.random.gauss(0, self.scale))
+        return self.prices[step]
+
+
+class Recorded:
+    """ The prices of a file, one per line and per second, the last one held """
+
+    def __init__(self, prices: Sequence[float]) -> None:
+        self.prices = prices
+
+    def __call__(self, elapsed: float) -> float:
+        return self.prices[min(int(elapsed), len(self.prices) - 1)]
+
+
+def parse_path(spec: str) -> PricePath:
+    """Parse a price path: walk:START:VOLATILITY[:SEED], trend:START:SLOPE
+    (points per second), sine:START:AMPLITUDE:PERIOD or file:PATH"""
+    kind, _, values = spec.partition(":")
+    if kind == "file":
+        with open(values) as f:
+            return Recorded([float(line) for line in f if line.strip()])
+    numbers = [float(value) for value in values.split(":")]
+    if kind == "walk" and len(numbers) in (2, 3):
+        start, volatility, *seed = numbers
+        return RandomWalk(start, volatility, int(seed[0]) if seed else 0)
+    if kind == "trend" and len(numbers) == 2:
+        start, slope = numbers
+        return lambda elapsed: start + slope * elapsed
+    if kind == "sine" and len(numbers) == 3:
+        start, amplitude, period = numbers
+        return lambda elapsed: start + amplitude * sin(2 * pi * elapsed / period)
+    raise ValueError(f"Unknown price path: {spec}")
+
+
+class Response:
+    """ The future returned by the bybit client """
+
+    def __init__(self, body: Dict[str, Any]) -> None:
+        self.body = body
+        self.headers: Dict[str, str] = {}
+
+    def result(self) -> Tuple[Dict[str, Any], "Response"]:
+        return self.body, self
+
+
+class StandinEngine:
+    """A local Bybit for one symbol: a price path and a matching engine
+
+    The last price follows the path, the bid is the last price rounded down
+    to the tick and the ask is one tick above.  A resting long is filled once the path trades at or below
+    its price and a short at or above, a part of the order only with the
+    probability `partial_rate`.  A PostOnly order that would cross the book
+    is cancelled, and any order with the probability `reject_rate`.
+
+    Each REST call and websocket message takes `latency` seconds, give or
+    take `jitter`; the messages of a topic keep their order.
+    """
+
+    def __init__(
+        self,
+        path: PricePath,
+        symbol: str = "BTCUSD",
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        reject_rate: float = 0.0,
+        partial_rate: float = 0.0,
+        rate_limit: int = RATE_LIMIT,
+        seed: int = 0,
+        clock: Callable[[], float] = time,
+    ) -> None:
+        self.path = path
+        self.symbol = symbol
+        self.latency = latency
+        self.jitter = jitter
+        self.reject_rate = reject_rate
+        self.partial_rate = partial_rate
+        self.rate_limit = rate_limit
+        self.clock = clock
+        self.random = random.Random(seed)
+        self.started = clock()
+        self.last = path(0)
+        self.bid, self.ask = self._quote()
+        self.orders: Dict[str, Dict[str, Any]] = {}
+        self.size = 0
+        self.entry_price = 0.0
+        self.requests: Counter = Counter()
+        self.messages = 0
+        self.fills = 0
+        self.topics: Dict[str, Deque[Tuple[float, Any]]] = defaultdict(
+            lambda: deque(maxlen=BACKLOG)
+        )
+        self._calls: Deque[float] = deque()
+        self._ids = count(1)
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+
+    def _quote(self) -> Tuple[float, float]:
+        bid = floor(self.last / TICK) * TICK
+        return bid, bid + TICK
+
+    def delay(self) -> float:
+        return max(self.latency + self.random.uniform(-self.jitter, self.jitter), 0)
+
+    def publish(self, topic: str, message: Any) -> None:
+        """ Send a message that arrives after the latency, in order """
+        queue = self.topics[topic]
+        arrival = self.clock() + self.delay()
+        if queue:
+            arrival = max(arrival, queue[-1][0])
+        queue.append((arrival, message))
+        self.messages += 1
+
+    def arrived(self, topic: str) -> List[Any]:
+        """ Take the messages of the topic that arrived, oldest first """
+        now = self.clock()
+        with self._lock:
+            queue = self.topics.get(topic)
+            messages = []
+            while queue and queue[0][0] <= now:
+                messages.append(queue.popleft()[1])
+        return messages
+
+    # the matching engine
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop.is_set()
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name="standin", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(STEP):
+            self.step()
+
+    def step(self) -> None:
+        """ Move the price and fill the orders it crossed """
+        with self._lock:
+            self.last = self.path(self.clock() - self.started)
+            quote = self._quote()
+            if quote != (self.bid, self.ask):
+                self.bid, self.ask = quote
+                self.publish(
+                    f"instrument_info.100ms.{self.symbol}",
+                    {
+                        "update": [
+                            {
+                                "bid1_price": self.bid,
+                                "ask1_price": self.ask,
+                                "last_price": self.last,
+                            }
+                        ]
+                    },
+                )
+            for order in list(self.orders.values()):
+                if (order["side"] == "Buy" and self.last <= order["price"]) or (
+                    order["side"] == "Sell" and self.last >= order["price"]
+                ):
+                    self._fill(order)
+
+    def _fill(self, order: Dict[str, Any]) -> None:
+        leaves = order["qty"] - order["cum_exec_qty"]
+        quantity = leaves
+        if leaves > 1 and self.random.random() < self.partial_rate:
+            quantity = self.random.randint(1, leaves - 1)
+        order["cum_exec_qty"] += quantity
+        if quantity == leaves:
+            order["order_status"] = "Filled"
+            del self.orders[order["order_id"]]
+        else:
+            order["order_status"] = "PartiallyFilled"
+        self.fills += 1
+
+        price = order["price"]
+        delta = quantity if order["side"] == "Buy" else -quantity
+        size = self.size + delta
+        if size == 0:
+            self.entry_price = 0.0
+        elif self.size == 0 or (size > 0) != (self.size > 0):
+            self.entry_price = price
+        elif abs(size) > abs(self.size):
+            # inverse contracts average the entry price on 1 / price
+            self.entry_price = abs(size) / (
+                abs(self.size) / self.entry_price + quantity / price
+            )
+        self.size = size
+
+        self.publish(
+            "execution",
+            [
+                {
+                    "symbol": self.symbol,
+                    "order_id": order["order_id"],
+                    "order_link_id": order["order_link_id"],
+                    "side": order["side"],
+                    "price": price,
+                    "exec_type": "Trade",
+                    "exec_qty": quantity,
+                    "leaves_qty": leaves - quantity,
+                    "is_maker": True,
+                }
+            ],
+        )
+        self.publish("order", [dict(order)])
+        self.publish("position", [self._position()])
+
+    def _position(self) -> Dict[str, Any]:
+        return {
+            "symbol": self.symbol,
+            "side": "Buy" if self.size > 0 else "Sell" if self.size < 0 else "None",
+            "size": abs(self.size),
+            "entry_price": self.entry_price,
+            # the liquidation is not simulated
+            "liq_price": 0,
+            "unrealised_pnl": 0,
+        }
+
+    # the REST operations BybitExchange uses
+
+    def request(self, operation: str, handler: Callable[[], Any]) -> Response:
+        """ Handle a REST call half way through its latency """
+        if self.stopped:
+            raise ConnectionError("The stand-in exchange is stopped")
+        sleep(self.delay() / 2)
+        with self._lock:
+            self.requests[operation] += 1
+            now = self.clock()
+            self._calls.append(now)
+            while self._calls[0] <= now - RATE_WINDOW:
+                self._calls.popleft()
+            body = {
+                "ret_code": 0,
+                "ret_msg": "OK",
+                "result": handler(),
+                "rate_limit": self.rate_limit,
+                "rate_limit_status": max(self.rate_limit - len(self._calls), 0),
+                "rate_limit_reset_ms": int((self._calls[0] + RATE_WINDOW) * 1000),
+            }
+        sleep(self.delay() / 2)
+        return Response(body)
+
+    def new_order(
+        self, side: str, qty: int, price: float, order_link_id: str = ""
+    ) -> Dict[str, Any]:
+        order_id = f"standin-{next(self._ids)}"
+        order: Dict[str, Any] = {
+            "order_id": order_id,
+            "order_link_id": order_link_id,
+            "symbol": self.symbol,
+            "side": side,
+            "order_type": "Limit",
+            "price": float(price),
+            "qty": int(qty),
+            "cum_exec_qty": 0,
+            "time_in_force": "PostOnly",
+            "order_status": "New",
+        }
+        crosses = (side == "Buy" and price >= self.ask) or (
+            side == "Sell" and price <= self.bid
+        )
+        if crosses or self.random.random() < self.reject_rate:
+            order["order_status"] = "Cancelled"
+        else:
+            self.orders[order_id] = order
+        self.publish("order", [dict(order)])
+        return dict(order)
+
+    def cancel_order(self, order_id: str) -> Optional[Dict[str, Any]]:
+        order = self.orders.pop(order_id, None)
+        if order is not None:
+            order["order_status"] = "Cancelled"
+            self.publish("order", [dict(order)])
+        return order
+
+    def replace_order(
+        self, order_id: str, price: float, qty: int
+    ) -> Optional[Dict[str, Any]]:
+        order = self.orders.get(order_id)
+        if order is None:
+            return None
+        if (order["side"] == "Buy" and price >= self.ask) or (
+            order["side"] == "Sell" and price <= self.bid
+        ):
+            return self.cancel_order(order_id)
+        order.update(price=float(price), qty=int(qty))
+        self.publish("order", [dict(order)])
+        return order
+
+
+class StandinRest:
+    """ The bybit REST client of a StandinEngine """
+
+    def __init__(self, engine: StandinEngine) -> None:
+        self.engine = engine
+        self.Order = self.Positions = self.Market = self
+
+    def Order_new(
+        self,
+        side: str,
+        symbol: str,
+        qty: int,
+        price: float,
+        order_link_id: str = "",
+        **params: Any,
+    ) -> Response:
+        return self.engine.request(
+            "Order_new",
+            lambda: self.engine.new_order(side, qty, price, order_link_id),
+        )
+
+    def Order_cancel(self, symbol: str, order_id: str) -> Response:
+        return self.engine.request(
+            "Order_cancel", lambda: self.engine.cancel_order(order_id)
+        )
+
+    def Order_cancelAll(self, symbol: str) -> Response:
+        engine = self.engine
+        return engine.request(
+            "Order_cancelAll",
+            lambda: [engine.cancel_order(order_id) for order_id in list(engine.orders)],
+        )
+
+    def Order_replace(
+        self, symbol: str, order_id: str, p_r_price: float, p_r_qty: int
+    ) -> Response:
+        return self.engine.request(
+            "Order_replace",
+            lambda: self.engine.replace_order(order_id, p_r_price, p_r_qty),
+        )
+
+    def Order_getOrders(
+        self, symbol: str, order_status: str, limit: int = 20, page: int = 1
+    ) -> Response:
+        statuses = order_status.split(",")
+
+        def orders() -> Dict[str, Any]:
+            live = [
+                dict(order)
+                for order in self.engine.orders.values()
+                if order["order_status"] in statuses
+            ]
+            return {"data": live[(page - 1) * limit : page * limit]}
+
+        return self.engine.request("Order_getOrders", orders)
+
+    def Positions_myPosition(self, symbol: str) -> Response:
+        return self.engine.request("Positions_myPosition", self.engine._position)
+
+    def Market_symbolInfo(self) -> Response:
+        engine = self.engine
+        return engine.request(
+            "Market_symbolInfo",
+            lambda: [
+                {
+                    "symbol": engine.symbol,
+                    "bid_price": engine.bid,
+                    "ask_price": engine.ask,
+                }
+            ],
+        )
+
+
+class StandinWebsocket:
+    """BybitWebsocket of a StandinEngine
+
+    Like BybitWebsocket, get_data pops the most recent message first and
+    only the last FEEDBACK_DRAIN ones of a topic are kept.
+    """
+
+    def __init__(self, engine: StandinEngine) -> None:
+        self.engine = engine
+        self.pending: Dict[str, List[Any]] = defaultdict(list)
+
+    def get_data(self, topic: str) -> Any:
+        stack = self.pending[topic]
+        stack.extend(self.engine.arrived(topic))
+        del stack[:-FEEDBACK_DRAIN]
+        return stack.pop() if stack else []
+
+    def ping(self) -> None:
+        with self.engine._lock:
+            self.engine.publish("pong", {"success": True, "ret_msg": "pong"})
+
+    def _subscribe(self, *args: Any) -> None:
+        pass
+
+    subscribe_order = subscribe_execution = subscribe_position = _subscribe
+    subscribe_orderBookL2 = subscribe_instrument_info = subscribe_kline = _subscribe
+
+
+class LoadReport(NamedTuple):
+    """ The activity of a load test """
+
+    duration: float
+    requests: Dict[str, int]
+    messages: int
+    fills: int
+    error: Optional[BaseException]
+
+
+def loadtest(
+    engine: StandinEngine,
+    short_big_spread: int,
+    short_small_spread: int,
+    init_quantity: int,
+    duration: float,
+) -> LoadReport:
+    """Run CharlieBot against the engine for `duration` seconds, the bot
+    stops on its next REST call once the engine is stopped"""
+    exchange = BybitExchange(
+        engine.symbol, rest=StandinRest(engine), ws=StandinWebsocket(engine)
+    )
+    bot = CharlieBot(
+        short_big_spread, short_small_spread, init_quantity, "standin", exchange
+    )
+    errors: List[BaseException] = []
+
+    def trade() -> None:
+        try:
+            bot.trade()
+        except Exception as error:
+            if not engine.stopped:
+                LOGGER.exception("Bot stopped")
+                errors.append(error)
+
+    engine.start()
+    started = time()
+    thread = Thread(target=trade, name="loadtest", daemon=True)
+    thread.start()
+    thread.join(duration)
+    elapsed = time() - started
+    engine.stop()
+    return LoadReport(
+        elapsed,
+        dict(engine.requests),
+        engine.messages,
+        engine.fills,
+        errors[0] if errors else None,
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """ Entry point of cbot loadtest """
+    parser = ArgumentParser(description="Run CharlieBot against a local exchange")
+    parser.add_argument("short_big_spread", type=int)
+    parser.add_argument("short_small_spread", type=int)
+    parser.add_argument("initial_quantity", type=int)
+    parser.add_argument(
+        "--path",
+        default="walk:60000:10",
+        help="walk:START:VOLATILITY[:SEED], trend:START:SLOPE, "
+        "sine:START:AMPLITUDE:PERIOD or file:PATH, default: walk:60000:10",
+    )
+    parser.add_argument("--duration", type=float, default=60, help="in seconds")
+    parser.add_argument("--latency", type=float, default=0.02, help="in seconds")
+    parser.add_argument("--jitter", type=float, default=0.01, help="in seconds")
+    parser.add_argument("--reject-rate", type=float, default=0.0)
+    parser.add_argument("--partial-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=RATE_LIMIT)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    engine = StandinEngine(
+        parse_path(args.path),
+        latency=args.latency,
+        jitter=args.jitter,
+        reject_rate=args.reject_rate,
+        partial_rate=args.partial_rate,
+        rate_limit=args.rate_limit,
+        seed=args.seed,
+    )
+    report = loadtest(
+        engine,
+        args.short_big_spread,
+        args.short_small_spread,
+        args.initial_quantity,
+        args.duration,
+    )
+    print(f"ran {report.duration:.1f}s, {report.fills} fills")
+    for operation, requests in sorted(report.requests.items()):
+        print(f"{operation} {requests} requests, {requests / report.duration:.2f}/s")
+    print(
+        f"websocket {report.messages} messages, "
+        f"{report.messages / report.duration:.1f}/s"
+    )
+    print(METRICS.render(), end="")
+    if report.error is not None:
+        print(f"bot stopped: {report.error!r}")
+        return 1
+    return 0
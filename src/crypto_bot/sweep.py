@@ -0,0 +1,152 @@
+# Standard Library
+import csv
+import logging
+import random
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
+from typing import Any, Dict, Iterator, List, Mapping, NamedTuple, Optional, Sequence
+
+import numpy as np  # type: ignore
+
+from crypto_bot.backtest import backtest, load_prices
+from crypto_bot.bot import LOGGER, Ladder
+
+# the parameters of a run and their default values
+PARAMETERS = {
+    "short_big_spread": (int, "250"),
+    "short_small_spread": (int, "25"),
+    "initial_quantity": (int, "1"),
+    "multiplicator": (int, "10"),
+    "intercept": (int, "7"),
+    "growth_factor": (float, "1.3"),
+    "max_quantity": (int, "2048"),
+}
+
+# the prices of the backtest, loaded once per worker process
+PRICES: Optional[np.ndarray] = None
+
+
+class Result(NamedTuple):
+    """ The outcome of one combination of parameters """
+
+    params: Dict[str, Any]
+    cycles: int
+    pnl: float
+    max_drawdown: float
+    max_position: int
+    min_liquidation_distance: float
+
+
+def parse_values(spec: str, kind: type) -> List[Any]:
+    """Parse `a,b,c` as a list of values and `start:stop:step` as the range
+    from start to stop included"""
+    if ":" in spec:
+        start, stop, step = (float(value) for value in spec.split(":"))
+        values = np.arange(start, stop + step / 2, step)
+        return [kind(round(value, 6)) for value in values]
+    return [kind(value) for value in spec.split(",")]
+
+
+def combinations(
+    grid: Mapping[str, Sequence[Any]], samples: int = 0, seed: Optional[int] = None
+) -> Iterator[Dict[str, Any]]:
+    """ Every combination of the grid, or `samples` random ones """
+    names = list(grid)
+    if not samples:
+        for values in product(*grid.values()):
+            yield dict(zip(names, values))
+        return
+    rng = random.Random(seed)
+    for _ in range(samples):
+        yield {name: rng.choice(grid[name]) for name in names}
+
+
+def _load(path: str) -> None:
+    global PRICES
+    LOGGER.setLevel(logging.WARNING)
+    PRICES = load_prices(path)
+
+
+def run(params: Dict[str, Any]) -> Result:
+    """ Backtest one combination of parameters in a worker """
+    report = backtest(
+        PRICES,  # type: ignore
+        params["short_big_spread"],
+        params["short_small_spread"],
+        params["initial_quantity"],
+        ladder=Ladder(
+            params["multiplicator"],
+            params["intercept"],
+            params["growth_factor"],
+            params["max_quantity"],
+        ),
+    )
+    return Result(
+        params,
+        len(report.cycles),
+        report.pnl,
+        report.max_drawdown,
+        report.max_quantity,
+        report.min_liquidation_distance,
+    )
+
+
+def sweep(
+    path: str,
+    grid: Mapping[str, Sequence[Any]],
+    samples: int = 0,
+    seed: Optional[int] = None,
+    workers: Optional[int] = None,
+) -> Iterator[Result]:
+    """ Run the backtests over all the cores, yield the results as they end """
+    with ProcessPoolExecutor(workers, initializer=_load, initargs=(path,)) as pool:
+        futures = [
+            pool.submit(run, params) for params in combinations(grid, samples, seed)
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def ranking(result: Result) -> Any:
+    """ Best return first, then smallest drawdown """
+    return (-result.pnl, result.max_drawdown)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """ Entry point of cbot sweep """
+    parser = ArgumentParser(description="Sweep the parameters of CharlieBot")
+    parser.add_argument("prices", help="CSV of trades or klines")
+    for name, (_, default) in PARAMETERS.items():
+        parser.add_argument(
+            f"--{name.replace('_', '-')}",
+            default=default,
+            help=f"a,b,c or start:stop:step, default: {default}",
+        )
+    parser.add_argument("--random", type=int, default=0, help="number of samples")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--workers", type=int, help="default: all the cores")
+    parser.add_argument("--output", default="sweep.csv")
+    args = parser.parse_args(argv)
+
+    grid = {
+        name: parse_values(getattr(args, name), kind)
+        for name, (kind, _) in PARAMETERS.items()
+    }
+    fields = list(PARAMETERS) + list(Result._fields[1:])
+    results = []
+    with open(args.output, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(fields)
+        for result in sweep(args.prices, grid, args.random, args.seed, args.workers):
+            results.append(result)
+            writer.writerow(list(result.params.values()) + list(result[1:]))
+            f.flush()
+            print(f"{len(results)}: {result}", file=sys.stderr)
+
+    results.sort(key=ranking)
+    writer = csv.writer(sys.stdout, delimiter="\t")
+    writer.writerow(fields)
+    for result in results:
+        writer.writerow(list(result.params.values()) + list(result[1:]))
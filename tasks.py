@@ -26,3 +26,9 @@ def code(c):
 @task
 def mypy(c):
     run('mypy src/*/*.py')
+
+
+@task
+def bench(c, save=False, threshold=0.5):
+    options = ' --save' if save else ''
+    run(f'python benchmarks/bench_bot.py --threshold {threshold}{options}')
@@ -0,0 +1,56 @@
+# Standard Library
+import unittest
+
+import numpy as np  # type: ignore
+
+from crypto_bot import backtest, bot
+
+
+def prices(*path, step=1.0):
+    """ Trades every second going linearly through the path """
+    points = np.concatenate(
+        [np.linspace(a, b, int(abs(b - a) / step) + 1) for a, b in zip(path, path[1:])]
+    )
+    return np.array(
+        list(zip(np.arange(len(points), dtype=float), points)),
+        dtype=[("timestamp", float), ("price", float)],
+    )
+
+
+class TestSimulatedExchange(unittest.TestCase):
+    def setUp(self):
+        data = prices(60000, 59900, 60100)
+        self.exchange = backtest.SimulatedExchange(data["timestamp"], data["price"])
+
+    def test_post_only(self):
+        with self.assertRaises(bot.OrderCancelled):
+            self.exchange.long(self.exchange.ask, 1)
+        with self.assertRaises(bot.OrderCancelled):
+            self.exchange.short(self.exchange.bid, 1)
+        self.assertEqual(self.exchange.orders, bot.Orders())
+
+    def test_fill(self):
+        self.exchange.long(59950, 1)
+        self.exchange.short(60050, 1)
+        with self.assertRaises(bot.NotInCycle):
+            self.exchange.position
+        self.exchange.clock.sleep(60)
+        self.assertEqual(self.exchange.position.quantity, 1)
+        self.assertEqual(self.exchange.position.entry_price, 59950)
+        self.assertEqual(len(self.exchange.orders.shorts), 1)
+        self.exchange.clock.sleep(200)
+        self.assertEqual(len(self.exchange.cycles), 1)
+        self.assertAlmostEqual(self.exchange.cycles[0].pnl, 1 / 59950 - 1 / 60050)
+
+    def test_end_of_data(self):
+        with self.assertRaises(backtest.EndOfData):
+            self.exchange.clock.sleep(1000)
+
+
+class TestBacktest(unittest.TestCase):
+    def test_cycles(self):
+        report = backtest.backtest(prices(60000, 59800, 60400, 59000, 60500), 250, 25, 1)
+        self.assertEqual(len(report.cycles), 2)
+        self.assertGreater(report.pnl, 0)
+        self.assertGreater(report.max_quantity, 1)
+        self.assertGreater(report.min_liquidation_distance, 0)
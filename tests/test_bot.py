@@ -1,10 +1,35 @@
 # Standard Library
 import unittest
-from unittest.mock import MagicMock, patch
+from random import Random
+from threading import Event
+from unittest.mock import ANY, MagicMock, PropertyMock, patch
 
 from crypto_bot import bot
 
 
+def order_message(order_id, side="Buy", price="55600", qty="1", status="New", link=""):
+    """ An order message as pushed by the websocket """
+    return {
+        "order_status": status,
+        "symbol": "BTCUSD",
+        "side": side,
+        "order_type": "Limit",
+        "price": price,
+        "qty": qty,
+        "time_in_force": "PostOnly",
+        "order_link_id": link,
+        "order_id": order_id,
+    }
+
+
+def feed(ws, *messages, topic="order"):
+    """ Queue the messages on the websocket topic, oldest first """
+    pending = list(messages)
+    ws.get_data.side_effect = lambda name: (
+        pending.pop() if name == topic and pending else []
+    )
+
+
 class TestCommon(unittest.TestCase):
     def test_convert_epoch(self):
         epoch_ms = 1618987244277
@@ -165,6 +190,353 @@ class TestCommon(unittest.TestCase):
         )
 
 
+class TestOrders(unittest.TestCase):
+    def test_update(self):
+        orders = bot.Orders()
+        orders.update(bot.Order("a", "Buy", 100.0, 4, "New"))
+        orders.update(bot.Order("b", "Buy", 90.0, 2, "New"))
+        orders.update(bot.Order("c", "Buy", 95.0, 2, "New"))
+        orders.update(bot.Order("d", "Sell", 110.0, 3, "New"))
+        self.assertEqual(list(orders.longs), ["b", "c", "a"])
+        self.assertEqual([o.order_id for o in orders.longs.by_price()], ["b", "c", "a"])
+        self.assertEqual(orders.head_longs().order_id, "b")
+        self.assertEqual(orders.shorts_qty(), 3)
+
+        orders.update(bot.Order("b", "Buy", 90.0, 2, "Filled"))
+        orders.update(bot.Order("a", "Buy", 80.0, 1, "New"))
+        orders.update(bot.Order("d", "Sell", 110.0, 3, "Cancelled"))
+        self.assertEqual(list(orders.longs), ["a", "c"])
+        self.assertEqual([o.order_id for o in orders.longs.by_price()], ["a", "c"])
+        self.assertEqual(orders.longs.quantity, 3)
+        self.assertEqual(orders.shorts_qty(), 0)
+
+    def test_partially_filled(self):
+        orders = bot.Orders()
+        orders.update(bot.to_order(order_message("a", qty="4")))
+        partial = dict(order_message("a", qty="4"), cum_exec_qty="3")
+        partial["order_status"] = "PartiallyFilled"
+        orders.update(bot.to_order(partial))
+        self.assertEqual(orders.longs["a"].quantity, 1)
+        self.assertEqual(orders.longs.quantity, 1)
+
+    def test_copy(self):
+        orders = bot.Orders(longs={"a": bot.Order("a", "Buy", 100.0, 4, "New")})
+        copy = orders.copy()
+        orders.update(bot.Order("a", "Buy", 100.0, 4, "Filled"))
+        self.assertEqual(len(orders.longs), 0)
+        self.assertEqual(list(copy.longs), ["a"])
+        self.assertNotEqual(orders, copy)
+
+
+class TestDiffLadder(unittest.TestCase):
+    def setUp(self):
+        self.live = [
+            bot.Order("a", "Buy", 100.0, 1, "New"),
+            bot.Order("b", "Buy", 90.0, 2, "New"),
+            bot.Order("c", "Buy", 80.0, 4, "New"),
+        ]
+
+    def test_keep_and_amend(self):
+        diff = bot.diff_ladder(self.live, [(100.0, 1), (95.0, 2), (85.0, 8)])
+        self.assertEqual(diff.keep, [self.live[0]])
+        self.assertEqual(diff.amend, [(self.live[1], 95.0, 2), (self.live[2], 85.0, 8)])
+        self.assertEqual((diff.cancel, diff.create), ([], []))
+
+    def test_without_amend(self):
+        diff = bot.diff_ladder(self.live, [(100.0, 1), (70.0, 8)], amend=False)
+        self.assertEqual(diff.keep, [self.live[0]])
+        self.assertEqual(diff.cancel, self.live[1:])
+        self.assertEqual(diff.create, [(70.0, 8)])
+
+    def test_partially_filled(self):
+        live = self.live[:2] + [bot.Order("c", "Buy", 80.0, 4, "PartiallyFilled")]
+        diff = bot.diff_ladder(live, [(100.0, 1), (95.0, 2), (85.0, 4)])
+        self.assertEqual(diff.amend, [(live[1], 95.0, 2)])
+        self.assertEqual((diff.cancel, diff.create), ([live[2]], [(85.0, 4)]))
+
+    def test_cancel_extra(self):
+        diff = bot.diff_ladder(self.live, [(90.0, 2)])
+        self.assertEqual(diff.keep, [self.live[1]])
+        self.assertEqual(diff.amend, [])
+        self.assertEqual(diff.cancel, [self.live[0], self.live[2]])
+
+
+class TestFeedbackDispatcher(unittest.TestCase):
+    def setUp(self):
+        self.ws = MagicMock()
+        self.ws.get_data.return_value = []
+        self.received = []
+        self.feedback = bot.FeedbackDispatcher(self.ws, self.received.extend)
+
+    def test_wait_order_link_id(self):
+        self.feedback.dispatch([order_message("a", link="cbot-1")])
+        self.feedback.dispatch([order_message("b", link="cbot-2")])
+        self.assertEqual(self.feedback.wait("cbot-1")["order_id"], "a")
+        self.assertEqual(self.feedback.wait("b")["order_link_id"], "cbot-2")
+        self.assertEqual([order.order_id for order in self.received], ["a", "b"])
+
+    def test_wait_since(self):
+        self.feedback.dispatch([order_message("a")])
+        since = self.feedback.seq
+        with self.assertRaises(bot.FeedbackTimeout):
+            self.feedback.wait("a", since, timeout=0.01)
+        self.feedback.dispatch([order_message("a", status="Cancelled")])
+        self.assertEqual(self.feedback.wait("a", since)["order_status"], "Cancelled")
+
+    def test_pump_oldest_first(self):
+        feed(self.ws, [order_message("a")], [order_message("a", status="Filled")])
+        self.assertTrue(self.feedback.pump())
+        self.assertEqual(self.feedback.wait("a")["order_status"], "Filled")
+
+    def test_correct(self):
+        self.feedback.dispatch([order_message("a")])
+        since = self.feedback.seq
+        self.feedback.dispatch([order_message("b")])
+        stale = [
+            bot.Order("a", "Buy", 55600.0, 1, "Missing"),
+            bot.Order("b", "Buy", 55600.0, 1, "Missing"),
+        ]
+        self.assertEqual(self.feedback.correct(stale, since), stale[:1])
+        self.assertEqual(self.received[-1], stale[0])
+        self.assertEqual(self.feedback.seq, since + 1)
+
+    def test_watch(self):
+        book = []
+        self.feedback.route("orderBookL2_25.BTCUSD", book.append)
+        feed(self.ws, "snapshot", "delta", topic="orderBookL2_25.BTCUSD")
+        self.assertTrue(self.feedback.watch(lambda: bool(book), timeout=1))
+        self.assertEqual(self.feedback.updates, 1)
+        self.assertFalse(self.feedback.watch(lambda: len(book) > 2, timeout=0.01))
+
+    def test_watch_background(self):
+        messages = iter([[], [], "delta"])
+        self.ws.get_data.side_effect = lambda topic: (
+            next(messages, []) if topic.startswith("orderBook") else []
+        )
+        book = []
+        self.feedback.route("orderBookL2_25.BTCUSD", book.append)
+        self.feedback.start()
+        try:
+            self.assertTrue(self.feedback.watch(lambda: bool(book), timeout=5))
+        finally:
+            self.feedback.stop()
+
+    def test_background_wakeup(self):
+        messages = iter([[], [], [order_message("a")]])
+        self.ws.get_data.side_effect = lambda topic: next(messages, [])
+        self.feedback.start()
+        try:
+            self.assertEqual(self.feedback.wait("a", timeout=5)["order_id"], "a")
+        finally:
+            self.feedback.stop()
+
+
+class TestTopOfBook(unittest.TestCase):
+    def test_orderbook(self):
+        book = bot.TopOfBook()
+        book.on_orderbook(
+            [
+                {"price": "7767.50", "id": 77675000, "side": "Buy", "size": 10},
+                {"price": "7768.00", "id": 77680000, "side": "Buy", "size": 10},
+                {"price": "7768.50", "id": 77685000, "side": "Sell", "size": 10},
+            ]
+        )
+        self.assertEqual((book.bid, book.ask), (7768.0, 7768.5))
+        book.on_orderbook(
+            {
+                "delete": [{"id": 77680000, "side": "Buy"}],
+                "update": [],
+                "insert": [{"price": "7769.0", "id": 77690000, "side": "Sell"}],
+            }
+        )
+        self.assertEqual((book.bid, book.ask), (7767.5, 7768.5))
+        self.assertLess(book.age, 1)
+
+    def test_instrument(self):
+        book = bot.TopOfBook()
+        book.on_instrument({"bid1_price": "7767.5", "ask1_price": "7768.0"})
+        book.on_instrument({"update": [{"ask1_price": "7768.5"}]})
+        self.assertEqual((book.bid, book.ask), (7767.5, 7768.5))
+
+
+class TestPositionStore(unittest.TestCase):
+    def setUp(self):
+        self.store = bot.PositionStore("BTCUSD")
+        self.store.on_rest(
+            {
+                "result": {
+                    "side": "Buy",
+                    "size": 1,
+                    "entry_price": "60000",
+                    "unrealised_pnl": 0,
+                    "liq_price": "30000",
+                },
+                "rate_limit_status": 119,
+                "rate_limit_reset_ms": 1619024009784,
+                "rate_limit": 120,
+            }
+        )
+
+    def execution(self, side, qty, price):
+        return {
+            "symbol": "BTCUSD",
+            "side": side,
+            "exec_type": "Trade",
+            "exec_qty": qty,
+            "price": price,
+        }
+
+    def position(self, size, entry_price="58000.7"):
+        return {
+            "symbol": "BTCUSD",
+            "side": "Buy" if size else "None",
+            "size": size,
+            "entry_price": entry_price,
+            "liq_price": "29000",
+        }
+
+    def test_execution(self):
+        self.store.on_execution([self.execution("Buy", 2, "40000")])
+        self.assertEqual(self.store.trades, 1)
+        # the size waits for the position topic
+        self.assertEqual(self.store.position.quantity, 1)
+        self.store.on_position([self.position(3)])
+        self.assertEqual(self.store.position.quantity, 3)
+        self.assertEqual(self.store.updates, 1)
+        self.store.on_position([self.position(0, "0")])
+        with self.assertRaises(bot.NotInCycle):
+            self.store.position
+
+    def test_position_before_execution(self):
+        self.store.on_position([self.position(3)])
+        self.store.on_execution([self.execution("Buy", 2, "40000")])
+        self.assertEqual(self.store.position.quantity, 3)
+        self.assertEqual((self.store.trades, self.store.updates), (1, 1))
+
+    def test_partial_fill(self):
+        execution = dict(self.execution("Buy", 1, "60000"), leaves_qty="1")
+        with self.assertLogs("crypto_bot", "INFO"):
+            self.store.on_execution([execution, dict(execution, leaves_qty="0")])
+        self.assertEqual(self.store.trades, 2)
+
+    def test_position(self):
+        self.store.on_position(
+            [
+                {
+                    "symbol": "BTCUSD",
+                    "side": "Buy",
+                    "size": 3,
+                    "entry_price": "58000.7",
+                    "liq_price": "29000",
+                },
+                {"symbol": "ETHUSD", "side": "Buy", "size": 0},
+            ]
+        )
+        position = self.store.position
+        self.assertEqual(position.quantity, 3)
+        self.assertEqual(position.entry_price, 58000.5)
+        self.assertEqual(position.liq_price, 29000.0)
+
+
+class TestInFlight(unittest.TestCase):
+    def test_new(self):
+        in_flight = bot.InFlight()
+        request = in_flight.add("link", "Order_new")
+        in_flight.resolve([order_message("a")])
+        self.assertFalse(request.future.done())
+        in_flight.alias("link", "a")
+        in_flight.resolve([order_message("a")])
+        self.assertEqual(request.future.result()["order_id"], "a")
+        self.assertEqual(len(in_flight), 0)
+
+        rejected = in_flight.add("other", "Order_new")
+        in_flight.resolve([order_message("b", status="Cancelled", link="other")])
+        self.assertIsInstance(rejected.future.exception(), bot.OrderCancelled)
+
+    def test_cancel(self):
+        in_flight = bot.InFlight()
+        request = in_flight.add("a", "Order_cancel")
+        in_flight.resolve([order_message("a", status="PartiallyFilled")])
+        self.assertFalse(request.future.done())
+        in_flight.resolve([order_message("a", status="Cancelled")])
+        self.assertEqual(request.future.result()["order_status"], "Cancelled")
+
+    def test_fail(self):
+        in_flight = bot.InFlight()
+        request = in_flight.add("a", "Order_cancel")
+        in_flight.fail("a", ConnectionError())
+        in_flight.fail("a", bot.FeedbackTimeout())
+        self.assertIsInstance(request.future.exception(), ConnectionError)
+
+
+class TestPostOnlyPlacer(unittest.TestCase):
+    def setUp(self):
+        self.exchange = MagicMock(bid=60000.0, ask=60000.5)
+        self.placer = bot.PostOnlyPlacer(self.exchange, attempts=3, seed=0)
+
+    def test_not_crossing(self):
+        self.assertEqual(self.placer.place("Sell", 59990, 1, 10), 60000.5)
+        self.assertEqual(self.placer.place("Buy", 60010, 1, 10), 60000.0)
+        self.assertEqual(self.placer.place("Sell", 60050, 1, 10), 60050)
+        self.exchange.clock.sleep.assert_not_called()
+
+    def test_backoff(self):
+        self.exchange.long.side_effect = bot.OrderCancelled
+        with self.assertRaises(bot.OrderCancelled):
+            self.placer.place("Buy", 59990, 1, 5)
+        self.assertEqual(
+            [call[0] for call in self.exchange.long.call_args_list],
+            [(59990, 1), (59995.0, 1), (59995.0, 1)],
+        )
+        waits = [call[0][0] for call in self.exchange.clock.sleep.call_args_list]
+        self.assertEqual(len(waits), 2)
+        self.assertTrue(0.025 <= waits[0] <= 0.05)
+        self.assertTrue(0.05 <= waits[1] <= 0.1)
+        self.assertEqual(self.placer.rejection_rate("Buy", 10), 1.0)
+        self.assertEqual(self.placer.rejection_rate("Buy", 20), 1.0)
+
+    def test_retries_until_accepted(self):
+        placer = bot.PostOnlyPlacer(self.exchange, seed=0)
+        self.exchange.short.side_effect = [bot.OrderCancelled] * 40 + [None]
+        self.assertEqual(placer.place("Sell", 60010, 1, 10), 60010.5)
+        self.assertEqual(self.exchange.short.call_count, 41)
+        waits = [call[0][0] for call in self.exchange.clock.sleep.call_args_list]
+        self.assertTrue(1.0 <= waits[-1] <= 2.0)
+
+    def test_random_of_the_exchange(self):
+        self.exchange.random = Random(7)
+        placer = bot.PostOnlyPlacer(self.exchange)
+        self.assertEqual(placer.backoff(3), 0.2 * Random(7).uniform(0.5, 1))
+
+    def test_rejected(self):
+        self.exchange.short.side_effect = bot.OrderRejected(30031, "insufficient")
+        with self.assertRaises(bot.OrderRejected):
+            self.placer.place("Sell", 60010, 1, 10)
+        self.assertEqual(self.exchange.short.call_count, 1)
+        self.assertEqual(self.placer.rejection_rate("Sell", 19), 0.0)
+
+    def test_timeout(self):
+        self.exchange.short.side_effect = [bot.FeedbackTimeout, bot.FeedbackTimeout]
+        live = bot.Order("a", "Sell", 60010.5, 1, "New")
+        self.exchange.resync.side_effect = [
+            bot.Orders(),
+            bot.Orders(shorts={"a": live}),
+        ]
+        # not live after the first timeout, live after the second one
+        self.assertEqual(self.placer.place("Sell", 60010, 1, 10), 60010.5)
+        self.assertEqual(self.exchange.short.call_count, 2)
+
+    def test_learns_offset(self):
+        self.exchange.short.side_effect = [bot.OrderCancelled, None, None]
+        self.assertEqual(self.placer.place("Sell", 60000.5, 1, 0), 60001.0)
+        self.assertEqual(self.placer.rejection_rate("Sell", 0), 1.0)
+        self.assertEqual(self.placer.rejection_rate("Sell", 1), 0.0)
+        self.assertEqual(self.placer.offset("Sell"), 1)
+        self.assertEqual(self.placer.offset("Buy"), 0)
+        self.assertEqual(self.placer.place("Sell", 60000.5, 1, 0), 60001.0)
+
+
+@patch("crypto_bot.bot.SPEC_CACHE", None)
 @patch("crypto_bot.bot.BybitWebsocket")
 @patch("crypto_bot.bot.bybit")
 class TestCharlieBot(unittest.TestCase):
@@ -186,7 +558,150 @@ class TestCharlieBot(unittest.TestCase):
         self.assertEqual(sb.init_quantity, 1)
         self.assertEqual(sb.exchange_name, "bybit")
 
+    def test_reconcile_longs(self, bybit_mock, ws_mock):
+        sb = bot.CharlieBot(50, 10, 1, "bybit")
+        sb.exchange = MagicMock(supports_amend=True)
+        position = bot.Position(60000, 60000, 1, 0, "", 0, 0, 0)
+        sb.reconcile_longs(position, bot.Orders(longs={}, shorts={}))
+        ladder = list(sb.exchange.place_many.call_args[0][0])
+        self.assertEqual(ladder[0], ("Buy", 59909.0, 2))
+        self.assertEqual(len(ladder), 11)
+
+        orders = bot.Orders(
+            longs={
+                "a": bot.Order("a", "Buy", 59909.0, 2, "New"),
+                "b": bot.Order("b", "Buy", 59000.0, 4, "New"),
+                "c": bot.Order("c", "Buy", 58000.0, 3, "New"),
+            },
+            shorts={},
+        )
+        sb.reconcile_longs(position, orders)
+        sb.exchange.cancel.assert_not_called()
+        sb.exchange.amend.assert_any_call("b", 59790.5, 4)
+        self.assertEqual(sb.exchange.amend.call_count, 2)
+        self.assertEqual(len(list(sb.exchange.place_many.call_args[0][0])), 8)
+
+    def test_trigger_long(self, bybit_mock, ws_mock):
+        position = bot.Position(60000, 60000, 1, 0, "", 0, 0, 0)
+        exchange = MagicMock(supports_amend=True)
+        bids = iter([60000.0, 60001.0, 60010.0, 60010.0, 60010.0])
+        positions = iter([bot.NotInCycle] * 4 + [position] * 2)
 
+        def next_position():
+            result = next(positions)
+            if result is bot.NotInCycle:
+                raise result
+            return result
+
+        type(exchange).bid = PropertyMock(side_effect=lambda: next(bids))
+        type(exchange).position = PropertyMock(side_effect=next_position)
+        exchange.orders.longs = {"a": bot.Order("a", "Buy", 60000.0, 1, "New")}
+        exchange.wait_until.side_effect = lambda predicate, timeout: predicate()
+        sb = bot.CharlieBot(50, 10, 1, "bybit", exchange)
+
+        sb.trigger_long()
+        exchange.long.assert_called_once_with(60000.0, 1)
+        exchange.amend.assert_called_once_with("a", 60010.0, 1)
+        exchange.cancel.assert_not_called()
+        self.assertEqual(exchange.wait_until.call_count, 3)
+
+    def test_chase_long_rejected(self, bybit_mock, ws_mock):
+        exchange = MagicMock(supports_amend=True)
+        exchange.orders.longs = {"a": bot.Order("a", "Buy", 60000.0, 1, "New")}
+        exchange.amend.side_effect = bot.OrderCancelled
+        sb = bot.CharlieBot(50, 10, 1, "bybit", exchange)
+        sb.chase_long(60010.0)
+        exchange.cancel.assert_called_once_with("a")
+        exchange.long.assert_called_once_with(60010.0, 1)
+
+    def test_hedge(self, bybit_mock, ws_mock):
+        sb = bot.CharlieBot(50, 10, 2, "bybit", MagicMock())
+        position = bot.Position(60000, 60000, 5, 0, "", 0, 0, 0)
+        self.assertEqual(sb.hedge(position), (3, 2))
+        self.assertEqual(sb.hedge(position._replace(quantity=1)), (0, 1))
+
+    def test_trigger_complete_partial(self, bybit_mock, ws_mock):
+        exchange = MagicMock(ask=60000.5)
+        exchange.position = bot.Position(60000, 60000, 1, 0, "", 0, 0, 0)
+        exchange.orders = bot.Orders()
+        sb = bot.CharlieBot(50, 10, 2, "bybit", exchange)
+        sb.reconcile_longs = MagicMock()
+        sb.trigger_complete()
+        exchange.short.assert_called_once_with(60050, 1)
+
+    def test_trigger_complete_rejected(self, bybit_mock, ws_mock):
+        exchange = MagicMock(ask=60000.5)
+        exchange.position = bot.Position(60000, 60000, 3, 0, "", 0, 0, 0)
+        exchange.orders = bot.Orders()
+        exchange.short.side_effect = [None, bot.OrderCancelled, None]
+        sb = bot.CharlieBot(50, 10, 1, "bybit", exchange)
+        sb.reconcile_longs = MagicMock()
+        exchange.ask = 60080.0
+        sb.trigger_complete()
+        self.assertEqual(
+            [call[0] for call in exchange.short.call_args_list],
+            [(60080.0, 2), (60080.0, 1), (60130.0, 1)],
+        )
+        exchange.clock.sleep.assert_called_once()
+
+    def test_start_cycle_wakes_on_fill(self, bybit_mock, ws_mock):
+        exchange = MagicMock()
+        fills = iter([0, 1, 1])
+        type(exchange).fills = PropertyMock(side_effect=lambda: next(fills))
+        type(exchange).position = PropertyMock(side_effect=bot.NotInCycle)
+        woken = []
+        exchange.wait_until.side_effect = lambda predicate, timeout: woken.append(
+            predicate()
+        )
+        sb = bot.CharlieBot(50, 10, 1, "bybit", exchange)
+        sb.start_cycle()
+        self.assertEqual(woken, [True])
+        self.assertEqual(exchange.wait_until.call_args[0][1], bot.SLEEP_WS)
+        exchange.cancel_all.assert_called_once_with()
+
+    def test_recover_without_journal(self, bybit_mock, ws_mock):
+        sb = bot.CharlieBot(50, 10, 1, "bybit", MagicMock(journal=None))
+        self.assertEqual(sb.recover(), "trigger_long")
+        sb.exchange.resync.assert_not_called()
+
+    def test_recover(self, bybit_mock, ws_mock):
+        long = bot.Order("a", "Buy", 59000.0, 2, "New")
+        short = bot.Order("b", "Sell", 60250.0, 1, "New")
+        sb = bot.CharlieBot(50, 10, 1, "bybit", MagicMock())
+        sb.exchange.resync.return_value = bot.Orders(longs={"a": long}, shorts={})
+
+        sb.exchange.journal.phase = "start_cycle"
+        self.assertEqual(sb.recover(), "start_cycle")
+
+        sb.exchange.journal.phase = "trigger_complete"
+        self.assertEqual(sb.recover(), "trigger_complete")
+        sb.exchange.resync.return_value = bot.Orders(
+            longs={"a": long}, shorts={"b": short}
+        )
+        self.assertEqual(sb.recover(), "start_cycle")
+        sb.exchange.cancel.assert_not_called()
+
+        sb.exchange.journal.phase = "trigger_long"
+        type(sb.exchange).position = PropertyMock(side_effect=bot.NotInCycle)
+        self.assertEqual(sb.recover(), "trigger_long")
+        sb.exchange.cancel.assert_called_once_with("a")
+
+    def test_trade_resumes(self, bybit_mock, ws_mock):
+        sb = bot.CharlieBot(50, 10, 1, "bybit", MagicMock())
+        sb.recover = MagicMock(return_value="start_cycle")
+        sb.start_cycle = MagicMock(side_effect=[None, KeyboardInterrupt])
+        sb.trigger_long = MagicMock()
+        sb.trigger_complete = MagicMock()
+        with self.assertRaises(KeyboardInterrupt):
+            sb.trade()
+        sb.trigger_long.assert_called_once_with()
+        self.assertEqual(
+            [call[0][0] for call in sb.exchange.journal.enter.call_args_list],
+            ["start_cycle", "trigger_long", "trigger_complete", "start_cycle"],
+        )
+
+
+@patch("crypto_bot.bot.SPEC_CACHE", None)
 @patch("crypto_bot.bot.BybitWebsocket")
 @patch("crypto_bot.bot.bybit")
 class TestBybitExchange(unittest.TestCase):
@@ -265,6 +780,12 @@ class TestBybitExchange(unittest.TestCase):
             ),
         )
 
+    def test_position_streamed(self, bybit_mock, ws_mock):
+        ex = bot.BybitExchange()
+        ex.position
+        ex.position
+        bybit_mock.bybit().Positions.Positions_myPosition.assert_called_once()
+
     def test_position_empty(self, bybit_mock, ws_mock):
         ex = bot.BybitExchange()
         # mock_bybit.bybit().Positions.Positions_myPosition().result().__getitem__.return_value = (
@@ -320,13 +841,179 @@ class TestBybitExchange(unittest.TestCase):
         with self.assertRaises(bot.NotInCycle):
             ex.position
 
-    @unittest.skip
     def test_rest_orders(self, bybit_mock, ws_mock):
         ex = bot.BybitExchange()
-        ex.orders
+        bybit_mock.bybit().Order.Order_getOrders().result.return_value = (
+            {"result": {"data": [order_message("a"), order_message("b", "Sell")]}},
+            None,
+        )
+        orders = ex.rest_orders
         bybit_mock.bybit().Order.Order_getOrders.assert_called_with(
-            symbol="BTCUSD", order_status="New"
+            symbol="BTCUSD", order_status="New,PartiallyFilled", limit=50, page=1
+        )
+        self.assertEqual(list(orders.longs), ["a"])
+        self.assertEqual(list(orders.shorts), ["b"])
+
+    def test_resync(self, bybit_mock, ws_mock):
+        recovered = bot.Order("a", "Buy", 55600.0, 1, "New")
+        journal = MagicMock(orders={"a": recovered._asdict()})
+        ex = bot.BybitExchange(journal=journal)
+        self.assertEqual(list(ex.orders.longs), ["a"])
+
+        bybit_mock.bybit().Order.Order_getOrders().result.return_value = (
+            {"result": {"data": [order_message("b", "Sell")]}},
+            None,
+        )
+        ex.resync()
+        self.assertEqual((list(ex.orders.longs), list(ex.orders.shorts)), ([], ["b"]))
+        self.assertEqual(
+            [order["order_id"] for order in journal.reset.call_args[0][0]], ["b"]
+        )
+
+    def test_journal_intents_and_acks(self, bybit_mock, ws_mock):
+        journal = MagicMock(orders={})
+        ex = bot.BybitExchange(journal=journal)
+        feed(ws_mock.BybitWebsocket(), [order_message("a")])
+        bybit_mock.bybit().Order.Order_new().result.return_value = (
+            {"result": {"order_id": "a"}},
+            None,
         )
+        ex.long(55600, 1)
+        journal.intent.assert_called_once()
+        self.assertEqual(journal.intent.call_args[0][0], "Order_new")
+        self.assertEqual(list(journal.ack.call_args[0][0])[0]["order_id"], "a")
+
+    def test_reconcile(self, bybit_mock, ws_mock):
+        ex = bot.BybitExchange()
+        ex.orders = [
+            bot.Order("a", "Buy", 55600.0, 1, "New"),
+            bot.Order("b", "Buy", 55500.0, 2, "New"),
+            bot.Order("c", "Sell", 56000.0, 1, "New"),
+        ]
+        bybit_mock.bybit().Order.Order_getOrders().result.return_value = (
+            {
+                "result": {
+                    "data": [
+                        order_message("a", price="55600", qty="1"),
+                        order_message("b", price="55400", qty="2"),
+                        order_message("d", "Sell", "56100"),
+                    ]
+                }
+            },
+            None,
+        )
+        registry = bot.metrics.Metrics()
+        with patch("crypto_bot.bot.METRICS", registry):
+            corrections = ex.reconcile()
+
+        self.assertEqual({order.order_id for order in corrections}, {"b", "c", "d"})
+        orders = ex.orders
+        self.assertEqual(orders.longs["b"].price, 55400.0)
+        self.assertEqual((list(orders.longs), list(orders.shorts)), (["a", "b"], ["d"]))
+        self.assertEqual(
+            registry.counters,
+            {
+                "orders.drift.changed": 1,
+                "orders.drift.closed": 1,
+                "orders.drift.unacked": 1,
+            },
+        )
+
+    def test_reconciler(self, bybit_mock, ws_mock):
+        ex = MagicMock()
+        done = Event()
+        errors = iter([ConnectionError])
+
+        def reconcile():
+            error = next(errors, None)
+            if error is not None:
+                raise error
+            done.set()
+
+        ex.reconcile.side_effect = reconcile
+        reconciler = bot.OrderReconciler(ex, 0.001)
+        reconciler.start()
+        try:
+            self.assertTrue(done.wait(5))
+        finally:
+            reconciler.stop()
+
+    def test_heartbeat_beat(self, bybit_mock, ws_mock):
+        clock = MagicMock()
+        clock.time.return_value = 0
+        ex = bot.BybitExchange(clock=clock)
+        heartbeat = bot.Heartbeat(ex, 1, 10)
+        feed(ws_mock.BybitWebsocket(), {"success": True}, topic="pong")
+
+        clock.time.return_value = 5
+        self.assertTrue(heartbeat.beat())
+        self.assertEqual(ex.feedback.received, 5)
+        ws_mock.BybitWebsocket().ping.assert_called_once_with()
+
+        clock.time.return_value = 16
+        self.assertFalse(heartbeat.beat())
+        ex.feedback.received = 16
+        ws_mock.BybitWebsocket().ping.side_effect = ConnectionError
+        self.assertFalse(heartbeat.beat())
+
+    def test_keep_alive(self, bybit_mock, ws_mock):
+        ex = bot.BybitExchange()
+        ex.keep_alive()
+        ws_mock.BybitWebsocket().ping.assert_called_once_with()
+        with patch.object(bot.Heartbeat, "running", True):
+            ex.keep_alive()
+        ws_mock.BybitWebsocket().ping.assert_called_once_with()
+
+    def test_reconnect(self, bybit_mock, ws_mock):
+        dead, alive = MagicMock(), MagicMock()
+        ws_mock.BybitWebsocket.side_effect = [dead, alive]
+        ex = bot.BybitExchange()
+        ex.keep_alive()
+        with patch.object(ex, "reconcile") as reconcile, patch.object(
+            ex, "sync_position"
+        ) as sync_position:
+            ex.reconnect()
+
+        dead.exit.assert_called_once_with()
+        alive.subscribe_order.assert_called_once_with()
+        alive.subscribe_instrument_info.assert_called_once_with("BTCUSD")
+        self.assertIs(ex.feedback.ws, alive)
+        reconcile.assert_called_once_with()
+        sync_position.assert_called_once_with()
+
+    def test_reconnect_given_ws(self, bybit_mock, ws_mock):
+        ws = MagicMock()
+        # a BybitWebsocket, not a feed of a SharedWebsocket
+        del ws.reconnect
+        ex = bot.BybitExchange(ws=ws)
+        with patch.object(ex, "reconcile"), patch.object(ex, "sync_position"):
+            ex.reconnect()
+        self.assertIs(ex.ws, ws)
+        self.assertEqual(ws.subscribe_order.call_count, 2)
+
+    def test_heartbeat_backoff(self, bybit_mock, ws_mock):
+        ex = MagicMock()
+        ex.feedback.received = 0
+        ex.clock.time.return_value = 100
+        done = Event()
+        errors = iter([ConnectionError, ConnectionError])
+
+        def reconnect():
+            error = next(errors, None)
+            if error is not None:
+                raise error
+            ex.feedback.received = 100
+            done.set()
+
+        ex.reconnect.side_effect = reconnect
+        heartbeat = bot.Heartbeat(ex, 0.001, 10)
+        with patch("crypto_bot.bot.RECONNECT_MIN", 0.001):
+            heartbeat.start()
+            try:
+                self.assertTrue(done.wait(5))
+            finally:
+                heartbeat.stop()
+        self.assertEqual(ex.reconnect.call_count, 3)
 
     def test_orders_empty(self, bybit_mock, ws_mock):
         ex = bot.BybitExchange()
@@ -337,92 +1024,95 @@ class TestBybitExchange(unittest.TestCase):
     def test_orders(self, bybit_mock, ws_mock):
         ex = bot.BybitExchange()
 
-        ws_mock.BybitWebsocket().get_data.return_value = [
-            {
-                "user_id": 2681267,
-                "position_idx": 0,
-                "order_status": "New",
-                "symbol": "BTCUSD",
-                "side": "Buy",
-                "order_type": "Limit",
-                "price": "55600",
-                "qty": "2",
-                "time_in_force": "PostOnly",
-                "order_link_id": "",
-                "order_id": "d0aa620e-bcbd-41c6-9315-f1be7570bfe3",
-                "created_at": "2021-04-20T12:35:28.941Z",
-                "updated_at": "2021-04-20T12:35:28.941Z",
-                "leaves_qty": "2",
-                "leaves_value": "0.00003597",
-                "cum_exec_qty": "0",
-                "cum_exec_value": "0",
-                "cum_exec_fee": "0",
-                "reject_reason": "EC_NoError",
-            },
-            {
-                "user_id": 2681267,
-                "position_idx": 0,
-                "order_status": "New",
-                "symbol": "BTCUSD",
-                "side": "Buy",
-                "order_type": "Limit",
-                "price": "55600",
-                "qty": "1",
-                "time_in_force": "PostOnly",
-                "order_link_id": "",
-                "order_id": "d3aa620e-bcbd-41c6-9315-f1be7570bfe3",
-                "created_at": "2021-04-20T12:35:28.941Z",
-                "updated_at": "2021-04-20T12:35:28.941Z",
-                "leaves_qty": "1",
-                "leaves_value": "0.00003597",
-                "cum_exec_qty": "0",
-                "cum_exec_value": "0",
-                "cum_exec_fee": "0",
-                "reject_reason": "EC_NoError",
-            },
-            {
-                "user_id": 2681267,
-                "position_idx": 0,
-                "order_status": "New",
-                "symbol": "BTCUSD",
-                "side": "Sell",
-                "order_type": "Limit",
-                "price": "56300",
-                "qty": "1",
-                "time_in_force": "PostOnly",
-                "order_link_id": "",
-                "order_id": "5b7eebcf-c43c-4396-8aea-07c6d9dad76e",
-                "created_at": "2021-04-20T12:35:09.135Z",
-                "updated_at": "2021-04-20T12:35:09.135Z",
-                "leaves_qty": "1",
-                "leaves_value": "0.00001776",
-                "cum_exec_qty": "0",
-                "cum_exec_value": "0",
-                "cum_exec_fee": "0",
-                "reject_reason": "EC_NoError",
-            },
-            {
-                "user_id": 2681267,
-                "position_idx": 0,
-                "order_status": "New",
-                "symbol": "BTCUSD",
-                "side": "Sell",
-                "order_type": "Limit",
-                "price": "56500",
-                "qty": "1",
-                "time_in_force": "PostOnly",
-                "order_link_id": "",
-                "order_id": "88d6be9c-c6f4-4c2b-87c4-05cb67d2bfc4",
-                "created_at": "2021-04-20T12:35:00.350Z",
-                "updated_at": "2021-04-20T12:35:00.350Z",
-                "leaves_qty": "1",
-                "leaves_value": "0.00001769",
-                "cum_exec_qty": "0",
-                "cum_exec_value": "0",
-                "cum_exec_fee": "0",
-                "reject_reason": "EC_NoError",
-            },
-        ]
+        feed(
+            ws_mock.BybitWebsocket(),
+            [
+                {
+                    "user_id": 2681267,
+                    "position_idx": 0,
+                    "order_status": "New",
+                    "symbol": "BTCUSD",
+                    "side": "Buy",
+                    "order_type": "Limit",
+                    "price": "55600",
+                    "qty": "2",
+                    "time_in_force": "PostOnly",
+                    "order_link_id": "",
+                    "order_id": "d0aa620e-bcbd-41c6-9315-f1be7570bfe3",
+                    "created_at": "2021-04-20T12:35:28.941Z",
+                    "updated_at": "2021-04-20T12:35:28.941Z",
+                    "leaves_qty": "2",
+                    "leaves_value": "0.00003597",
+                    "cum_exec_qty": "0",
+                    "cum_exec_value": "0",
+                    "cum_exec_fee": "0",
+                    "reject_reason": "EC_NoError",
+                },
+                {
+                    "user_id": 2681267,
+                    "position_idx": 0,
+                    "order_status": "New",
+                    "symbol": "BTCUSD",
+                    "side": "Buy",
+                    "order_type": "Limit",
+                    "price": "55600",
+                    "qty": "1",
+                    "time_in_force": "PostOnly",
+                    "order_link_id": "",
+                    "order_id": "d3aa620e-bcbd-41c6-9315-f1be7570bfe3",
+                    "created_at": "2021-04-20T12:35:28.941Z",
+                    "updated_at": "2021-04-20T12:35:28.941Z",
+                    "leaves_qty": "1",
+                    "leaves_value": "0.00003597",
+                    "cum_exec_qty": "0",
+                    "cum_exec_value": "0",
+                    "cum_exec_fee": "0",
+                    "reject_reason": "EC_NoError",
+                },
+                {
+                    "user_id": 2681267,
+                    "position_idx": 0,
+                    "order_status": "New",
+                    "symbol": "BTCUSD",
+                    "side": "Sell",
+                    "order_type": "Limit",
+                    "price": "56300",
+                    "qty": "1",
+                    "time_in_force": "PostOnly",
+                    "order_link_id": "",
+                    "order_id": "5b7eebcf-c43c-4396-8aea-07c6d9dad76e",
+                    "created_at": "2021-04-20T12:35:09.135Z",
+                    "updated_at": "2021-04-20T12:35:09.135Z",
+                    "leaves_qty": "1",
+                    "leaves_value": "0.00001776",
+                    "cum_exec_qty": "0",
+                    "cum_exec_value": "0",
+                    "cum_exec_fee": "0",
+                    "reject_reason": "EC_NoError",
+                },
+                {
+                    "user_id": 2681267,
+                    "position_idx": 0,
+                    "order_status": "New",
+                    "symbol": "BTCUSD",
+                    "side": "Sell",
+                    "order_type": "Limit",
+                    "price": "56500",
+                    "qty": "1",
+                    "time_in_force": "PostOnly",
+                    "order_link_id": "",
+                    "order_id": "88d6be9c-c6f4-4c2b-87c4-05cb67d2bfc4",
+                    "created_at": "2021-04-20T12:35:00.350Z",
+                    "updated_at": "2021-04-20T12:35:00.350Z",
+                    "leaves_qty": "1",
+                    "leaves_value": "0.00001769",
+                    "cum_exec_qty": "0",
+                    "cum_exec_value": "0",
+                    "cum_exec_fee": "0",
+                    "reject_reason": "EC_NoError",
+                },
+            ],
+        )
 
         self.assertEqual(
             ex.orders,
@@ -472,13 +1162,35 @@ class TestBybitExchange(unittest.TestCase):
         ex.ask
         bybit_mock.bybit().Market.Market_symbolInfo.assert_called_once()
 
+    def test_bid_cached(self, bybit_mock, ws_mock):
+        ex = bot.BybitExchange()
+        feed(
+            ws_mock.BybitWebsocket(),
+            {"bid1_price": "7767.5", "ask1_price": "7768.0"},
+            topic="instrument_info.100ms.BTCUSD",
+        )
+        self.assertEqual((ex.bid, ex.ask), (7767.5, 7768.0))
+        bybit_mock.bybit().Market.Market_symbolInfo.assert_not_called()
+        ex.book.updated -= ex.book_max_age + 1
+        ex.bid
+        bybit_mock.bybit().Market.Market_symbolInfo.assert_called_once()
+
     def test_cancel_all(self, bybit_mock, ws_mock):
         ex = bot.BybitExchange()
+        feed(ws_mock.BybitWebsocket(), [order_message("88d6be9c", status="Cancelled")])
         ex.cancel_all()
         bybit_mock.bybit().Order.Order_cancelAll.assert_called_with(symbol="BTCUSD")
 
     def test_cancel(self, bybit_mock, ws_mock):
         ex = bot.BybitExchange()
+        bybit_mock.bybit().Order.Order_cancel.return_value.result.return_value = (
+            {"ret_code": 0, "result": {}},
+            None,
+        )
+        feed(
+            ws_mock.BybitWebsocket(),
+            [order_message("88d6be9c-c6f4-4c2b-87c4-05cb67d2bfc4", status="Cancelled")],
+        )
         ex.cancel("88d6be9c-c6f4-4c2b-87c4-05cb67d2bfc4")
         bybit_mock.bybit().Order.Order_cancel.assert_called_with(
             symbol="BTCUSD", order_id="88d6be9c-c6f4-4c2b-87c4-05cb67d2bfc4"
@@ -486,6 +1198,11 @@ class TestBybitExchange(unittest.TestCase):
 
     def test_long(self, bybit_mock, ws_mock):
         ex = bot.BybitExchange()
+        bybit_mock.bybit().Order.Order_new().result.return_value = (
+            {"result": {"order_id": "d0aa620e"}},
+            None,
+        )
+        feed(ws_mock.BybitWebsocket(), [order_message("d0aa620e")])
         ex.long(0, 0)
         bybit_mock.bybit().Order.Order_new.assert_called_with(
             side="Buy",
@@ -494,10 +1211,178 @@ class TestBybitExchange(unittest.TestCase):
             qty=0,
             price=0,
             time_in_force="PostOnly",
+            order_link_id=ANY,
+        )
+
+    def test_long_cancelled(self, bybit_mock, ws_mock):
+        ex = bot.BybitExchange()
+        bybit_mock.bybit().Order.Order_new().result.return_value = (
+            {"result": {"order_id": "d0aa620e"}},
+            None,
+        )
+        feed(ws_mock.BybitWebsocket(), [order_message("d0aa620e", status="Cancelled")])
+        with self.assertRaises(bot.OrderCancelled):
+            ex.long(0, 0)
+
+    def test_long_timeout(self, bybit_mock, ws_mock):
+        ex = bot.BybitExchange()
+        bybit_mock.bybit().Order.Order_new().result.return_value = (
+            {"ret_code": 0, "result": {"order_id": "d0aa620e"}},
+            None,
+        )
+        ws_mock.BybitWebsocket().get_data.return_value = []
+        with self.assertRaises(bot.FeedbackTimeout):
+            ex.long(0, 0, timeout=0.05)
+
+    def test_long_rejected(self, bybit_mock, ws_mock):
+        ex = bot.BybitExchange()
+        bybit_mock.bybit().Order.Order_new().result.return_value = (
+            {
+                "ret_code": 30024,
+                "ret_msg": "PostOnly will take liquidity",
+                "result": {},
+            },
+            None,
+        )
+        ws_mock.BybitWebsocket().get_data.return_value = []
+        with self.assertRaisesRegex(bot.OrderRejected, "PostOnly will take liquidity"):
+            ex.long(0, 0, timeout=1)
+        self.assertEqual(len(ex.in_flight), 0)
+
+    def test_amend_rejected(self, bybit_mock, ws_mock):
+        ex = bot.BybitExchange()
+        bybit_mock.bybit().Order.Order_replace().result.return_value = (
+            {"ret_code": 30076, "ret_msg": "order not modified", "result": {}},
+            None,
+        )
+        ws_mock.BybitWebsocket().get_data.return_value = []
+        with self.assertRaisesRegex(bot.OrderRejected, "order not modified"):
+            ex.amend("d0aa620e", 59000, 1, timeout=5)
+
+    def test_place_many(self, bybit_mock, ws_mock):
+        ex = bot.BybitExchange()
+        pushed = []
+
+        def order_new(side, symbol, order_type, qty, price, time_in_force, order_link_id):
+            status = "Cancelled" if price == 3 else "New"
+            pushed.append([order_message(str(price), side=side, status=status)])
+            return MagicMock(
+                result=lambda: ({"result": {"order_id": str(price)}}, None)
+            )
+
+        bybit_mock.bybit().Order.Order_new = order_new
+        ws_mock.BybitWebsocket().get_data = lambda topic: (
+            pushed.pop() if topic == "order" and pushed else []
         )
+        placements = ex.place_many([("Buy", 1, 1), ("Buy", 2, 2), ("Sell", 3, 1)])
+        self.assertEqual([p.price for p in placements], [1, 2, 3])
+        self.assertEqual([p.ok for p in placements], [True, True, False])
+        self.assertIsInstance(placements[2].error, bot.OrderCancelled)
+        self.assertEqual(list(ex.orders.longs), ["1", "2"])
+
+    def test_submit_pipelined(self, bybit_mock, ws_mock):
+        ex = bot.BybitExchange()
+        sent = Event()
+        released = Event()
+        link_ids = []
+
+        def order_new(**params):
+            link_ids.append(params["order_link_id"])
+            sent.set()
+            released.wait(5)
+            return MagicMock(result=lambda: ({"result": {"order_id": "a"}}, None))
+
+        bybit_mock.bybit().Order.Order_new = order_new
+        requests = [ex.submit("Buy", 1, 1), ex.submit("Buy", 2, 1)]
+        self.assertTrue(sent.wait(5))
+        self.assertEqual(len(ex.in_flight), 2)
+        self.assertFalse(any(request.future.done() for request in requests))
+
+        feed(
+            ws_mock.BybitWebsocket(),
+            [order_message("b", link=requests[1].key)],
+            [order_message("a", link=requests[0].key, status="Cancelled")],
+        )
+        released.set()
+        ex.collect(requests, 5)
+        self.assertEqual(sorted(link_ids), sorted(request.key for request in requests))
+        self.assertIsInstance(requests[0].future.exception(), bot.OrderCancelled)
+        self.assertEqual(requests[1].future.result()["order_id"], "b")
+        self.assertEqual(len(ex.in_flight), 0)
+
+    def test_cancel_finished(self, bybit_mock, ws_mock):
+        ex = bot.BybitExchange()
+        bybit_mock.bybit().Order.Order_cancel.return_value.result.return_value = (
+            {"ret_code": 20001, "ret_msg": "order not exists or too late to cancel"},
+            None,
+        )
+        ws_mock.BybitWebsocket().get_data.return_value = []
+        # the order was filled meanwhile, the cancel is done
+        ex.cancel("d0aa620e", timeout=5)
+        self.assertEqual(len(ex.in_flight), 0)
+
+    def test_cancel_rejected(self, bybit_mock, ws_mock):
+        ex = bot.BybitExchange()
+        bybit_mock.bybit().Order.Order_cancel.return_value.result.return_value = (
+            {"ret_code": 10006, "ret_msg": "too many visits"},
+            None,
+        )
+        ws_mock.BybitWebsocket().get_data.return_value = []
+        with self.assertRaisesRegex(bot.OrderRejected, "too many visits"):
+            ex.cancel("d0aa620e", timeout=5)
+
+    def test_timed_out_not_sent(self, bybit_mock, ws_mock):
+        ex = bot.BybitExchange()
+        released = Event()
+        for _ in range(bot.PLACE_WORKERS):
+            ex._pipeline.submit(released.wait, 5)
+        request = ex.submit("Buy", 1, 1)
+        # the request times out while the pipeline is busy
+        ex.collect([request], 0.01)
+        released.set()
+        ex._pipeline.shutdown(wait=True)
+        self.assertIsInstance(request.future.exception(), bot.FeedbackTimeout)
+        bybit_mock.bybit().Order.Order_new.assert_not_called()
+
+    def test_given_up_in_scheduler(self, bybit_mock, ws_mock):
+        scheduler = MagicMock()
+        ex = bot.BybitExchange(scheduler=scheduler)
+
+        def call(group, operation, params, send, name):
+            # the request times out while the rate limit holds it
+            ex.in_flight.fail(params["order_link_id"], bot.FeedbackTimeout())
+            return send()
+
+        scheduler.call.side_effect = call
+        request = ex.submit("Buy", 1, 1)
+        ex.collect([request], 1)
+        self.assertIsInstance(request.future.exception(), bot.FeedbackTimeout)
+        bybit_mock.bybit().Order.Order_new.assert_not_called()
+
+    def test_cancel_many(self, bybit_mock, ws_mock):
+        ex = bot.BybitExchange()
+        bybit_mock.bybit().Order.Order_cancel.return_value.result.return_value = (
+            {"ret_code": 0, "result": {}},
+            None,
+        )
+        feed(
+            ws_mock.BybitWebsocket(),
+            [order_message("a", status="Cancelled")],
+            [order_message("b", status="Filled")],
+        )
+        with patch("crypto_bot.bot.FEEDBACK_TIMEOUT", 0.2):
+            errors = ex.cancel_many(["a", "b", "c"])
+        self.assertEqual(errors[:2], [None, None])
+        self.assertIsInstance(errors[2], bot.FeedbackTimeout)
+        self.assertEqual(bybit_mock.bybit().Order.Order_cancel.call_count, 3)
 
     def test_short(self, bybit_mock, ws_mock):
         ex = bot.BybitExchange()
+        bybit_mock.bybit().Order.Order_new().result.return_value = (
+            {"result": {"order_id": "5b7eebcf"}},
+            None,
+        )
+        feed(ws_mock.BybitWebsocket(), [order_message("5b7eebcf", side="Sell")])
         ex.short(0, 0)
         bybit_mock.bybit().Order.Order_new.assert_called_with(
             side="Sell",
@@ -506,6 +1391,7 @@ class TestBybitExchange(unittest.TestCase):
             qty=0,
             price=0,
             time_in_force="PostOnly",
+            order_link_id=ANY,
         )
 
     # def test_trigger_long(self):
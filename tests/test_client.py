@@ -0,0 +1,78 @@
+# Standard Library
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+from crypto_bot import client
+
+SPEC_URI = client.TESTNET + client.SPEC_PATH
+SPEC = {"swagger": "2.0", "paths": {}}
+
+
+class TestLazy(unittest.TestCase):
+    def test_built_once_on_first_use(self):
+        factory = MagicMock()
+        lazy = client.Lazy(factory)
+        self.assertFalse(lazy.built)
+        factory.assert_not_called()
+
+        lazy.Order.Order_new(side="Buy")
+        lazy.Order.Order_cancel(order_id="1")
+        factory.assert_called_once_with()
+        self.assertTrue(lazy.built)
+        self.assertEqual(factory.return_value.Order.Order_new.call_count, 1)
+
+
+class TestSpecCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = tempfile.mkdtemp()
+
+    def test_round_trip(self):
+        self.assertIsNone(client.read_spec(self.cache, SPEC_URI))
+        client.write_spec(self.cache, SPEC_URI, SPEC)
+        self.assertEqual(client.read_spec(self.cache, SPEC_URI), SPEC)
+        self.assertEqual(os.listdir(self.cache), ["api-testnet.bybit.com-v_0_2_12.txt.json"])
+
+    def test_other_version(self):
+        client.write_spec(self.cache, SPEC_URI, SPEC)
+        with open(client.spec_path(self.cache, SPEC_URI)) as f:
+            stored = f.read()
+        with open(client.spec_path(self.cache, SPEC_URI), "w") as f:
+            f.write(stored.replace(client.TESTNET, "https://api-testnet.bybit.com/v2"))
+        self.assertIsNone(client.read_spec(self.cache, SPEC_URI))
+
+    def test_corrupted(self):
+        os.makedirs(self.cache, exist_ok=True)
+        with open(client.spec_path(self.cache, SPEC_URI), "w") as f:
+            f.write("{")
+        self.assertIsNone(client.read_spec(self.cache, SPEC_URI))
+
+
+class TestCachedClient(unittest.TestCase):
+    def setUp(self):
+        self.cache = tempfile.mkdtemp()
+
+    def test_without_bravado(self):
+        with patch.object(client, "SwaggerClient", None):
+            self.assertIsNone(client.cached_client(self.cache))
+
+    def test_downloaded_once(self):
+        swagger = MagicMock()
+        load_url = MagicMock(return_value=SPEC)
+        with patch.object(client, "SwaggerClient", swagger), patch.object(
+            client, "load_url", load_url, create=True
+        ), patch.object(client, "RequestsClient", MagicMock(), create=True):
+            client.cached_client(self.cache)
+            rest = client.cached_client(self.cache)
+
+        load_url.assert_called_once()
+        self.assertIs(rest, swagger.from_spec.return_value)
+        self.assertEqual(swagger.from_spec.call_args_list[1][0][0], SPEC)
+
+    def test_failure(self):
+        load_url = MagicMock(side_effect=OSError("offline"))
+        with patch.object(client, "SwaggerClient", MagicMock()), patch.object(
+            client, "load_url", load_url, create=True
+        ), patch.object(client, "RequestsClient", MagicMock(), create=True):
+            self.assertIsNone(client.cached_client(self.cache))
@@ -0,0 +1,110 @@
+# Standard Library
+import json
+import os
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+from crypto_bot.journal import Journal
+
+
+def order(order_id, status="New", side="Buy", price=59000.0, quantity=1):
+    return {
+        "order_id": order_id,
+        "side": side,
+        "price": price,
+        "quantity": quantity,
+        "order_status": status,
+    }
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def journal(self, **kwargs):
+        return Journal(self.directory, "BTCUSD", **kwargs)
+
+    def test_recover(self):
+        journal = self.journal()
+        self.assertIsNone(journal.phase)
+        journal.enter("trigger_complete")
+        journal.intent("Order_new", {"side": "Sell", "qty": 1})
+        journal.ack([order("a"), order("b", side="Sell")])
+        journal.ack([order("a", "Filled")])
+        journal.close()
+
+        journal = self.journal()
+        self.assertEqual(journal.phase, "trigger_complete")
+        self.assertEqual(list(journal.orders), ["b"])
+        self.assertEqual((journal.seq, journal.intents), (4, 1))
+
+    def test_torn_line(self):
+        journal = self.journal()
+        journal.enter("start_cycle")
+        journal.ack([order("a")])
+        journal.close()
+        with open(journal.path, "a") as f:
+            f.write('{"seq": 3, "kind": "ack", "ord')
+
+        journal = self.journal()
+        self.assertEqual((journal.seq, list(journal.orders)), (2, ["a"]))
+
+    def test_snapshot(self):
+        journal = self.journal(snapshot_every=3)
+        journal.enter("start_cycle")
+        journal.ack([order("a")])
+        journal.ack([order("b")])
+        journal.ack([order("c")])
+        journal.close()
+        with open(journal.path) as f:
+            self.assertEqual(len(f.readlines()), 1)
+        with open(journal.snapshot_path) as f:
+            self.assertEqual(json.load(f)["seq"], 3)
+
+        journal = self.journal()
+        self.assertEqual(journal.phase, "start_cycle")
+        self.assertEqual(list(journal.orders), ["a", "b", "c"])
+
+    def test_snapshot_before_truncate(self):
+        journal = self.journal()
+        journal.enter("start_cycle")
+        journal.ack([order("a")])
+        journal.close()
+        with open(journal.path) as f:
+            records = f.read()
+        journal = self.journal()
+        journal.reset([order("b")])
+        journal.close()
+        # a crash after the snapshot and before the journal restarts
+        with open(journal.path, "w") as f:
+            f.write(records)
+
+        journal = self.journal()
+        self.assertEqual((journal.seq, list(journal.orders)), (2, ["b"]))
+
+    def test_batched_sync(self):
+        with patch("crypto_bot.journal.os.fsync") as fsync:
+            journal = self.journal(sync_every=60)
+            journal.ack([order("a")])
+            journal.intent("Order_cancel", {"order_id": "a"})
+            self.assertEqual(fsync.call_count, 0)
+            # flushed at once, a crash of the bot loses nothing
+            with open(journal.path) as f:
+                self.assertEqual(len(f.readlines()), 2)
+            journal.enter("start_cycle")
+            self.assertEqual(fsync.call_count, 1)
+            journal.close()
+        self.assertTrue(os.path.exists(journal.path))
+
+    def test_background_sync(self):
+        with patch("crypto_bot.journal.os.fsync") as fsync:
+            journal = self.journal(sync_every=0.01)
+            journal.ack([order("a")])
+            for _ in range(100):
+                if fsync.call_count:
+                    break
+                time.sleep(0.01)
+            self.assertEqual(fsync.call_count, 1)
+            journal.close()
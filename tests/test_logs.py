@@ -0,0 +1,86 @@
+# Standard Library
+import io
+import json
+import logging
+import unittest
+
+from crypto_bot import logs
+
+
+def record(message, level=logging.INFO, lineno=1, *args, **extra):
+    entry = logging.LogRecord("crypto_bot", level, "bot.py", lineno, message, args, None)
+    entry.__dict__.update(extra)
+    return entry
+
+
+class TestSampler(unittest.TestCase):
+    def test_once_per_interval(self):
+        now = [0.0]
+        sampler = logs.Sampler(1.0, clock=lambda: now[0])
+        self.assertTrue(sampler.filter(record("a", **logs.SAMPLED)))
+        self.assertFalse(sampler.filter(record("b", **logs.SAMPLED)))
+        self.assertFalse(sampler.filter(record("c", **logs.SAMPLED)))
+        self.assertTrue(
+            sampler.filter(record("other site", logging.INFO, 2, **logs.SAMPLED))
+        )
+        self.assertTrue(
+            sampler.filter(record("warning", logging.WARNING, **logs.SAMPLED))
+        )
+        now[0] = 1.0
+        sampled = record("d", **logs.SAMPLED)
+        self.assertTrue(sampler.filter(sampled))
+        self.assertEqual(sampled.suppressed, 2)
+
+    def test_unmarked(self):
+        sampler = logs.Sampler(1.0, clock=lambda: 0.0)
+        # the orders and the phases always log
+        for message in ("Long(59000, 1)", "Enter start_cycle"):
+            self.assertTrue(sampler.filter(record(message)))
+            self.assertTrue(sampler.filter(record(message)))
+
+
+class TestLogBuffer(unittest.TestCase):
+    def test_order(self):
+        buffer = logs.LogBuffer()
+        for message, level in (("a", logging.INFO), ("b", logging.DEBUG), ("c", 30)):
+            buffer.put(record(message, level))
+        self.assertEqual([r.msg for r in buffer.get(0)], ["a", "b", "c"])
+        self.assertEqual(buffer.get(0), [])
+
+    def test_drops_debug_first(self):
+        buffer = logs.LogBuffer(3)
+        buffer.put(record("a", logging.DEBUG))
+        buffer.put(record("b"))
+        buffer.put(record("c", logging.DEBUG))
+        buffer.put(record("d", logging.DEBUG))
+        buffer.put(record("e"))
+        buffer.put(record("f"))
+        buffer.put(record("g", logging.WARNING))
+        self.assertEqual([r.msg for r in buffer.get(0)], ["e", "f", "g"])
+        self.assertEqual(buffer.dropped, {"DEBUG": 3, "INFO": 1})
+
+
+class TestAsyncHandler(unittest.TestCase):
+    def test_write(self):
+        stream = io.StringIO()
+        target = logging.StreamHandler(stream)
+        target.setFormatter(logging.Formatter("%(levelname)s %(message)s"))
+        handler = logs.AsyncHandler([target], logs.LogBuffer(1), drops_every=0)
+        handler.emit(record("Long(%s, %s)", logging.INFO, 1, 60000.0, 2))
+        handler.emit(record("dropped", logging.DEBUG))
+        handler.emit(record("rung", logging.INFO, 2, suppressed=3))
+        handler.start()
+        handler.stop()
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(lines[0], "INFO rung (+3 similar)")
+        self.assertEqual(lines[1], "WARNING Log buffer full, dropped: 1 DEBUG, 1 INFO")
+
+
+class TestJsonFormatter(unittest.TestCase):
+    def test_format(self):
+        entry = record("Orders status: %d longs", logging.INFO, 1, 3, symbol="BTCUSD")
+        line = json.loads(logs.JsonFormatter().format(entry))
+        self.assertEqual(line["message"], "Orders status: 3 longs")
+        self.assertEqual(line["args"], [3])
+        self.assertEqual(line["symbol"], "BTCUSD")
+        self.assertEqual(line["level"], "INFO")
@@ -0,0 +1,84 @@
+# Standard Library
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from urllib.request import urlopen
+
+from crypto_bot import metrics
+
+
+class TestHistogram(unittest.TestCase):
+    def test_percentile(self):
+        histogram = metrics.Histogram()
+        for index in range(1, 101):
+            histogram.record(index / 1000)
+        self.assertEqual(histogram.count, 100)
+        self.assertEqual(histogram.max, 0.1)
+        # the percentiles are the upper bound of a 10% wide bucket
+        self.assertTrue(0.05 <= histogram.percentile(50) <= 0.055)
+        self.assertTrue(0.099 <= histogram.percentile(99) <= 0.1)
+        self.assertEqual(histogram.percentile(100), 0.1)
+
+    def test_empty(self):
+        self.assertEqual(metrics.Histogram().percentile(99), 0.0)
+
+    def test_bounds(self):
+        histogram = metrics.Histogram()
+        histogram.record(0)
+        histogram.record(1e6)
+        self.assertEqual(histogram.counts[0], 1)
+        self.assertEqual(histogram.counts[-1], 1)
+
+
+class TestMetrics(unittest.TestCase):
+    def test_timer(self):
+        registry = metrics.Metrics()
+        with patch("crypto_bot.metrics.perf_counter", side_effect=[1.0, 1.25]):
+            with registry.timer("rest.Order_new"):
+                pass
+        self.assertEqual(registry.histogram("rest.Order_new").max, 0.25)
+
+    def test_timed(self):
+        registry = metrics.Metrics()
+
+        @registry.timed("add")
+        def add(a, b):
+            return a + b
+
+        self.assertEqual(add(1, 2), 3)
+        self.assertEqual(registry.histogram("add").count, 1)
+
+    def test_render(self):
+        registry = metrics.Metrics()
+        registry.record("ws.ack", 0.002)
+        lines = registry.render().splitlines()
+        self.assertEqual(lines[0], "name count p50_ms p99_ms max_ms")
+        self.assertEqual(lines[1], "ws.ack 1 2.000 2.000 2.000")
+
+    def test_counters(self):
+        registry = metrics.Metrics()
+        registry.count("orders.drift.closed")
+        registry.count("orders.drift.closed", 2)
+        lines = registry.render().splitlines()
+        self.assertEqual(lines[1:], ["name total", "orders.drift.closed 3"])
+
+    def test_writer(self):
+        registry = metrics.Metrics()
+        registry.record("cycle.decision", 0.001)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "metrics.txt")
+            metrics.MetricsWriter(path, registry).write()
+            with open(path) as f:
+                self.assertEqual(f.read(), registry.render())
+
+    def test_serve(self):
+        registry = metrics.Metrics()
+        registry.record("rest.Order_cancel", 0.01)
+        server = metrics.serve(0, registry)
+        try:
+            with urlopen(f"http://127.0.0.1:{server.server_port}/") as response:
+                self.assertEqual(response.read().decode(), registry.render())
+        finally:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,124 @@
+# Standard Library
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+import numpy as np  # type: ignore
+
+from crypto_bot import recorder
+
+SNAPSHOT = [
+    {"price": "9000.00", "symbol": "BTCUSD", "id": 90000000, "side": "Buy", "size": 10},
+    {"price": "9000.50", "symbol": "BTCUSD", "id": 90005000, "side": "Sell", "size": 7},
+]
+DELTA = {
+    "delete": [{"price": "9000.00", "symbol": "BTCUSD", "id": 90000000, "side": "Buy"}],
+    "update": [{"symbol": "BTCUSD", "id": 90005000, "side": "Sell", "size": 3}],
+    "insert": [
+        {"price": "8999.50", "symbol": "BTCUSD", "id": 89995000, "side": "Buy", "size": 4}
+    ],
+}
+ORDER = {
+    "order_id": "xxxxxxxx-xxxx-xxxx-9a8f-4a973eb5c418",
+    "order_link_id": "",
+    "side": "Buy",
+    "price": "8999.5",
+    "qty": 4,
+    "cum_exec_qty": 0,
+    "order_status": "New",
+}
+
+
+class TestRows(unittest.TestCase):
+    def test_book_rows(self):
+        rows = recorder.book_rows(1, SNAPSHOT) + recorder.book_rows(2, DELTA)
+        records = np.array(rows, recorder.BOOK)
+        self.assertEqual(list(records["action"]), [0, 0, 1, 2, 3])
+        self.assertEqual(list(records["side"]), [1, -1, 1, -1, 1])
+        self.assertEqual(list(records["size"]), [10, 7, 0, 3, 4])
+        self.assertTrue(np.isnan(records["price"][3]))
+        self.assertEqual(records["price"][4], 8999.5)
+
+    def test_instrument_rows(self):
+        rows = recorder.instrument_rows(1, {"update": [{"bid1_price": "9000.5"}]})
+        self.assertEqual(rows[0][2], 9000.5)
+        self.assertTrue(np.isnan(rows[0][3]))
+
+    def test_order_rows(self):
+        records = np.array(recorder.order_rows(1, [ORDER]), recorder.ORDER)
+        self.assertEqual(records["order_id"][0].decode(), ORDER["order_id"])
+        self.assertEqual(recorder.ORDER_STATUSES[records["status"][0]], "New")
+
+    def test_order_rows_unknown_status(self):
+        order = dict(ORDER, order_status="Expired")
+        records = np.array(recorder.order_rows(1, [order]), recorder.ORDER)
+        self.assertEqual(recorder.ORDER_STATUSES[records["status"][0]], "Unknown")
+
+
+class TestRecording(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, compress):
+        topic = os.path.join(self.directory.name, "orderBookL2_25.BTCUSD")
+        writer = recorder.ChunkWriter(topic, recorder.BOOK, rows=4, compress=compress)
+        for second in range(10):
+            writer.append(recorder.book_rows(second * 10 ** 9, SNAPSHOT))
+        writer.flush()
+        return recorder.Recording(self.directory.name)
+
+    def test_round_trip(self):
+        recording = self.write(compress=False)
+        self.assertEqual(recording.topics, ["orderBookL2_25.BTCUSD"])
+        index = recording.index("orderBookL2_25.BTCUSD")
+        self.assertEqual(list(index["rows"]), [4, 4, 4, 4, 4])
+        records = recording.read("orderBookL2_25.BTCUSD")
+        self.assertEqual(len(records), 20)
+        self.assertEqual(list(records["id"][:2]), [90000000, 90005000])
+
+    def test_memory_mapped(self):
+        recording = self.write(compress=False)
+        chunk = next(recording.chunks("orderBookL2_25.BTCUSD"))
+        self.assertIsInstance(chunk, np.memmap)
+
+    def test_range(self):
+        for compress in (False, True):
+            with self.subTest(compress=compress):
+                recording = self.write(compress)
+                records = recording.read("orderBookL2_25.BTCUSD", 3, 6)
+                self.assertEqual(list(records["ts"] // 10 ** 9), [3, 3, 4, 4, 5, 5])
+                self.assertEqual(len(recording.read("orderBookL2_25.BTCUSD", 20)), 0)
+                self.directory.cleanup()
+                os.makedirs(self.directory.name)
+
+    def test_resume(self):
+        self.write(compress=False)
+        recording = self.write(compress=False)
+        self.assertEqual(len(recording.read("orderBookL2_25.BTCUSD")), 40)
+
+
+class TestRecorder(unittest.TestCase):
+    def test_pump(self):
+        messages = {
+            "orderBookL2_25.BTCUSD": [SNAPSHOT, DELTA],
+            "order": [[ORDER]],
+        }
+        ws = MagicMock()
+        ws.get_data.side_effect = lambda topic: (
+            messages[topic].pop() if messages.get(topic) else []
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            record = recorder.Recorder(ws, directory, recorder.topics())
+            self.assertEqual(record.pump(), 3)
+            self.assertEqual(record.pump(), 0)
+            record.flush()
+
+            recording = recorder.Recording(directory)
+            self.assertEqual(recording.topics, ["order", "orderBookL2_25.BTCUSD"])
+            book = recording.read("orderBookL2_25.BTCUSD")
+            # the snapshot was received first
+            self.assertEqual(list(book["action"]), [0, 0, 1, 2, 3])
+            self.assertEqual(len(recording.read("order")), 1)
+            self.assertEqual(len(recording.read("position")), 0)
@@ -0,0 +1,156 @@
+# Standard Library
+import os
+import tempfile
+import unittest
+
+from crypto_bot import recorder, replay
+
+START = 1600000000
+LONG_ID = "11111111-1111-1111-1111-111111111111"
+SHORT_ID = "22222222-2222-2222-2222-222222222222"
+
+
+def ns(seconds):
+    return int((START + seconds) * 10 ** 9)
+
+
+def order(order_id, side, price, qty, status):
+    return {
+        "order_id": order_id,
+        "order_link_id": "",
+        "side": side,
+        "price": str(price),
+        "qty": qty,
+        "order_status": status,
+    }
+
+
+def level(price, side, size):
+    return {"id": int(price * 10000), "price": str(price), "side": side, "size": size}
+
+
+def record(directory, short_status="New"):
+    """A session where the first long is filled and the short is placed, or
+    rejected with the `short_status` Cancelled"""
+    streams = {
+        "orderBookL2_25.BTCUSD": [
+            (0, [level(9000, "Buy", 10), level(9000.5, "Sell", 10)]),
+            (20, {"update": [level(9000, "Buy", 5)]}),
+        ],
+        "instrument_info.100ms.BTCUSD": [
+            (0, {"bid1_price": "9000", "ask1_price": "9000.5", "last_price": "9000"}),
+        ],
+        "order": [
+            (0.1, [order(LONG_ID, "Buy", 9000, 1, "New")]),
+            (3, [order(LONG_ID, "Buy", 9000, 1, "Filled")]),
+            (5.1, [order(SHORT_ID, "Sell", 9250, 1, short_status)]),
+        ],
+        "execution": [
+            (
+                3,
+                [
+                    {
+                        "symbol": "BTCUSD",
+                        "order_id": LONG_ID,
+                        "side": "Buy",
+                        "price": "9000",
+                        "exec_qty": 1,
+                    }
+                ],
+            ),
+        ],
+        "position": [
+            (
+                3,
+                [
+                    {
+                        "symbol": "BTCUSD",
+                        "side": "Buy",
+                        "size": 1,
+                        "entry_price": "9000",
+                        "liq_price": "4500",
+                    }
+                ],
+            ),
+        ],
+    }
+    for topic, messages in streams.items():
+        dtype, parser = recorder.KINDS[recorder.kind(topic)]
+        writer = recorder.ChunkWriter(os.path.join(directory, topic), dtype)
+        for seconds, message in messages:
+            writer.append(parser(ns(seconds), message))
+        writer.flush()
+
+
+class TestBookMessages(unittest.TestCase):
+    def test_round_trip(self):
+        snapshot = [level(9000, "Buy", 10), level(9000.5, "Sell", 10)]
+        delta = {
+            "delete": [{"id": 90000000, "price": 9000.0, "side": "Buy"}],
+            "update": [level(9000.5, "Sell", 3)],
+            "insert": [],
+        }
+        rows = recorder.book_rows(1, snapshot) + recorder.book_rows(1, delta)
+        rows += recorder.book_rows(1, {"delete": [level(9000.5, "Sell", 0)]})
+        messages = [message for _, message in replay.book_messages(rows)]
+        # the actions of a delta only go forward, a delete starts a new one
+        self.assertEqual(len(messages), 3)
+        self.assertEqual([m["size"] for m in messages[0]], [10, 10])
+        self.assertEqual(messages[1]["delete"][0]["id"], 90000000)
+        self.assertNotIn("size", messages[1]["delete"][0])
+        self.assertEqual(messages[1]["update"][0]["size"], 3)
+        self.assertEqual(messages[2]["delete"][0]["id"], 90005000)
+
+
+class TestReplayClock(unittest.TestCase):
+    def test_sleep(self):
+        clock = replay.ReplayClock(START, START + 10)
+        clock.sleep(5)
+        self.assertEqual(clock.time(), START + 5)
+        clock.sleep(6)
+        with self.assertRaises(replay.EndOfData):
+            clock.sleep(1)
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        record(self.directory.name)
+
+    def test_exchange(self):
+        exchange = replay.replay_exchange(recorder.Recording(self.directory.name))
+        self.assertEqual(exchange.clock.time(), START)
+        self.assertEqual((exchange.bid, exchange.ask), (9000.0, 9000.5))
+        exchange.long(9000.0, 1)
+        self.assertEqual(list(exchange.orders.longs), [LONG_ID])
+        self.assertEqual(exchange.rest.divergences, [])
+        # nothing was recorded for this one
+        exchange.long(8990.0, 2)
+        self.assertEqual(len(exchange.rest.divergences), 1)
+        self.assertEqual(len(exchange.orders.longs), 2)
+
+    def test_replay(self):
+        report = replay.replay(self.directory.name, 250, 25, 1)
+        self.assertEqual(report.start, START)
+        self.assertGreaterEqual(report.end, START + 20)
+        # the long and the short are in the recording, not the ladder
+        requests = [divergence.request for divergence in report.divergences]
+        self.assertEqual(report.requests, len(requests) + 2)
+        self.assertTrue(requests)
+        self.assertEqual(set(requests), {"Order_new"})
+
+    def test_deterministic(self):
+        reports = [replay.replay(self.directory.name, 250, 25, 1) for _ in range(2)]
+        self.assertEqual(reports[0], reports[1])
+
+    def test_deterministic_rejection(self):
+        with tempfile.TemporaryDirectory() as directory:
+            record(directory, short_status="Cancelled")
+            reports = [replay.replay(directory, 250, 25, 1) for _ in range(2)]
+        # the short is sent again after a jittered backoff, the same each time
+        self.assertEqual(reports[0], reports[1])
+        resent = reports[0].divergences[0]
+        self.assertEqual(resent.request, "Order_new")
+        self.assertIn("'side': 'Sell'", resent.detail)
+        self.assertGreater(resent.time, START + 5.1)
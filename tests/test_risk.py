@@ -0,0 +1,45 @@
+# Standard Library
+import unittest
+
+import numpy as np  # type: ignore
+
+from crypto_bot import bot, risk
+
+
+class TestRisk(unittest.TestCase):
+    def test_round_points(self):
+        entries = np.array([60827.25060827, 60827.5060827, 60827.7060827])
+        self.assertEqual(
+            list(risk.round_points(entries)), [bot.round_point(e) for e in entries]
+        )
+
+    def test_ladder_prices(self):
+        entries = np.linspace(30000, 60000, 97)
+        prices, quantities = risk.ladder_prices(entries, 2)
+        for index, entry in enumerate(entries):
+            ladder = list(bot.allocate_longs(entry, 2))
+            self.assertEqual(list(prices[index]), [price for price, _, _ in ladder])
+            self.assertEqual(list(quantities), [qty for _, qty, _ in ladder])
+
+    def test_ladder_shape(self):
+        ladder = bot.Ladder(10, 5, 1.5, 512)
+        prices, quantities = risk.ladder_prices(np.array([60000.0]), 4, ladder)
+        expected = list(bot.allocate_longs(60000.0, 4, 1, *ladder))
+        self.assertEqual(list(prices[0]), [price for price, _, _ in expected])
+        self.assertEqual(list(quantities), [qty for _, qty, _ in expected])
+
+    def test_ladder_risk(self):
+        result = risk.ladder_risk([60000.0, 50000.0], [0.01, 0.1, 0.5], 1)
+        rungs = len(result.quantities)
+        self.assertEqual(result.prices.shape, (2, rungs))
+        self.assertEqual(result.liquidation_prices.shape, (2, 3, rungs))
+        self.assertEqual(list(result.positions[:3]), [3, 7, 15])
+
+        entry = 3 / (1 / 60000 + 2 / result.prices[0, 0])
+        self.assertAlmostEqual(result.entry_prices[0, 0], entry)
+        self.assertAlmostEqual(
+            result.liquidation_prices[0, 1, 0],
+            bot.liquidation_price(3, entry, 0.1, 0, 0, 0.005),
+        )
+        # a bigger balance pushes the liquidation further away
+        self.assertTrue(np.all(np.diff(result.liquidation_prices, axis=1) < 0))
@@ -0,0 +1,142 @@
+# Standard Library
+import unittest
+from unittest.mock import MagicMock, patch
+
+from crypto_bot import bot, runner
+
+
+def order(order_id, symbol):
+    return {
+        "order_id": order_id,
+        "order_link_id": "",
+        "symbol": symbol,
+        "side": "Buy",
+        "price": "100",
+        "qty": "1",
+        "order_status": "New",
+    }
+
+
+def websocket(messages):
+    """ A BybitWebsocket whose topics hold `messages`, oldest first """
+    ws = MagicMock()
+    ws.get_data.side_effect = lambda topic: (
+        messages[topic].pop() if messages.get(topic) else []
+    )
+    return ws
+
+
+class TestParseBot(unittest.TestCase):
+    def test_parse_bot(self):
+        self.assertEqual(
+            runner.parse_bot("ETHUSD:10:1:2"), runner.BotSpec("ETHUSD", 10, 1, 2)
+        )
+        spec = runner.parse_bot("BTCUSD:250:25:1:10:5:1.5:512")
+        self.assertEqual(spec.ladder, bot.Ladder(10, 5, 1.5, 512))
+        with self.assertRaises(ValueError):
+            runner.parse_bot("BTCUSD:250")
+
+
+class TestSharedWebsocket(unittest.TestCase):
+    def test_route(self):
+        ws = websocket(
+            {
+                "order": [[order("a", "BTCUSD"), order("b", "ETHUSD")]],
+                "orderBookL2_25.ETHUSD": [{"update": []}],
+            }
+        )
+        hub = runner.SharedWebsocket(ws, poll=0)
+        btc, eth = hub.feed("BTCUSD"), hub.feed("ETHUSD")
+        for feed, symbol in ((btc, "BTCUSD"), (eth, "ETHUSD")):
+            feed.subscribe_order()
+            feed.subscribe_orderBookL2(symbol)
+        ws.subscribe_order.assert_called_once_with()
+        self.assertEqual(ws.subscribe_orderBookL2.call_count, 2)
+
+        self.assertEqual(btc.get_data("order"), [order("a", "BTCUSD")])
+        self.assertEqual(btc.get_data("orderBookL2_25.BTCUSD"), [])
+        self.assertEqual(eth.get_data("order"), [order("b", "ETHUSD")])
+        self.assertEqual(eth.get_data("orderBookL2_25.ETHUSD"), {"update": []})
+        self.assertEqual(eth.get_data("order"), [])
+
+    def test_one_bot_per_symbol(self):
+        hub = runner.SharedWebsocket(MagicMock())
+        hub.feed("BTCUSD")
+        with self.assertRaises(ValueError):
+            hub.feed("BTCUSD")
+
+    def test_ping(self):
+        ws = MagicMock()
+        hub = runner.SharedWebsocket(ws)
+        hub.feed("BTCUSD").ping()
+        hub.feed("ETHUSD").ping()
+        ws.ping.assert_called_once_with()
+
+    def test_pong(self):
+        hub = runner.SharedWebsocket(websocket({"pong": [{"success": True}]}), poll=0)
+        btc, eth = hub.feed("BTCUSD"), hub.feed("ETHUSD")
+        self.assertEqual(btc.get_data("pong"), {"success": True})
+        self.assertEqual(eth.get_data("pong"), {"success": True})
+
+    def test_reconnect(self):
+        dead, alive = MagicMock(), MagicMock()
+        hub = runner.SharedWebsocket(dead, connect=lambda: alive)
+        btc, eth = hub.feed("BTCUSD"), hub.feed("ETHUSD")
+        btc.subscribe_order()
+        eth.subscribe_orderBookL2("ETHUSD")
+        hub._connected -= bot.RECONNECT_MIN
+        btc.reconnect()
+        # the bot of ETHUSD finds the connection dead too, it is replaced once
+        eth.reconnect()
+        self.assertIs(hub.ws, alive)
+        dead.exit.assert_called_once_with()
+        alive.subscribe_order.assert_called_once_with()
+        alive.subscribe_orderBookL2.assert_called_once_with("ETHUSD")
+
+    def test_exchange_reconnect(self):
+        dead, alive = websocket({}), websocket({})
+        hub = runner.SharedWebsocket(dead, connect=lambda: alive)
+        exchange = bot.BybitExchange("BTCUSD", rest=MagicMock(), ws=hub.feed("BTCUSD"))
+        hub._connected -= bot.RECONNECT_MIN
+        with patch.object(exchange, "reconcile"), patch.object(
+            exchange, "sync_position"
+        ):
+            exchange.reconnect()
+        self.assertIs(hub.ws, alive)
+        alive.subscribe_order.assert_called_once_with()
+        alive.subscribe_instrument_info.assert_called_once_with("BTCUSD")
+
+
+class TestRunner(unittest.TestCase):
+    def test_runner(self):
+        rest, ws = MagicMock(), websocket({})
+        run = runner.Runner(
+            [runner.BotSpec("BTCUSD", 250, 25, 1), runner.BotSpec("ETHUSD", 10, 1, 1)],
+            rest=rest,
+            ws=ws,
+        )
+        self.assertEqual(list(run.bots), ["BTCUSD", "ETHUSD"])
+        exchanges = [charlie.exchange for charlie in run.bots.values()]
+        self.assertEqual([exchange.symbol for exchange in exchanges], list(run.bots))
+        self.assertTrue(all(exchange.rest is rest for exchange in exchanges))
+        self.assertTrue(
+            all(exchange.scheduler is run.scheduler for exchange in exchanges)
+        )
+        ws.subscribe_order.assert_called_once_with()
+
+    def test_failing_bot(self):
+        run = runner.Runner(
+            [runner.BotSpec("BTCUSD", 250, 25, 1)], rest=MagicMock(), ws=websocket({})
+        )
+        with patch.object(
+            run.bots["BTCUSD"], "trade", side_effect=RuntimeError("boom")
+        ), self.assertLogs("crypto_bot", "ERROR"):
+            run.run()
+
+    def test_budget_call(self):
+        scheduler = MagicMock()
+        exchange = bot.BybitExchange(
+            "BTCUSD", rest=MagicMock(), ws=MagicMock(), scheduler=scheduler
+        )
+        exchange._call("Order", "Order_cancel", order_id="a")
+        self.assertEqual(scheduler.call.call_args[0][4], "BTCUSD")
@@ -0,0 +1,148 @@
+# Standard Library
+import unittest
+from threading import Event, Thread, Timer
+from unittest.mock import MagicMock
+
+from crypto_bot import scheduler
+
+NOW = 1600000000.0
+
+
+def response(remaining, limit=100, reset=NOW + 30):
+    body = {
+        "ret_code": 0,
+        "result": {},
+        "rate_limit_status": remaining,
+        "rate_limit_reset_ms": int(reset * 1000),
+        "rate_limit": limit,
+    }
+    return body, None
+
+
+class TestRateLimit(unittest.TestCase):
+    def test_body(self):
+        budget = scheduler.rate_limit(response(99)[0])
+        self.assertEqual((budget.limit, budget.remaining), (100, 99))
+        self.assertEqual(budget.reset, NOW + 30)
+
+    def test_headers(self):
+        headers = {
+            "X-Bapi-Limit": "50",
+            "X-Bapi-Limit-Status": "49",
+            "X-Bapi-Limit-Reset-Timestamp": str(int(NOW * 1000)),
+        }
+        budget = scheduler.rate_limit({"result": {}}, headers)
+        self.assertEqual((budget.limit, budget.remaining, budget.reset), (50, 49, NOW))
+
+    def test_none(self):
+        self.assertIsNone(scheduler.rate_limit({"result": {}}, MagicMock()))
+
+
+class TestRequestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = scheduler.RequestScheduler(clock=lambda: NOW)
+
+    def test_update(self):
+        self.scheduler.call("Order", "Order_new", {}, lambda: response(42))
+        self.assertEqual(self.scheduler.budgets["Order_new"].remaining, 42)
+
+    def test_reserve(self):
+        self.scheduler.call("Positions", "Positions_myPosition", {}, lambda: response(20))
+        # the reads leave the last 20% to the orders
+        self.assertAlmostEqual(self.scheduler._delay("Positions_myPosition", scheduler.READ), 30)
+        self.assertIsNone(self.scheduler._delay("Positions_myPosition", scheduler.ORDER))
+        self.scheduler.budgets["Positions_myPosition"].remaining = 0
+        self.assertAlmostEqual(self.scheduler._delay("Positions_myPosition", scheduler.ORDER), 30)
+
+    def test_reset(self):
+        self.scheduler.call("Order", "Order_new", {}, lambda: response(0, reset=NOW))
+        self.assertIsNone(self.scheduler._delay("Order_new", scheduler.ORDER))
+        self.assertEqual(self.scheduler.budgets["Order_new"].remaining, 100)
+
+    def test_priority(self):
+        self.scheduler._waiting = [
+            (scheduler.READ, 0, "Positions_myPosition", "BTCUSD"),
+            (scheduler.READ, 1, "Order_getOrders", "BTCUSD"),
+            (scheduler.ORDER, 2, "Order_new", "BTCUSD"),
+        ]
+        self.assertEqual(
+            self.scheduler._turn(), (scheduler.ORDER, 2, "Order_new", "BTCUSD")
+        )
+        self.scheduler._waiting.pop()
+        self.assertEqual(
+            self.scheduler._turn(), (scheduler.READ, 0, "Positions_myPosition", "BTCUSD")
+        )
+
+    def test_priority_over_budget(self):
+        # an order of the exhausted endpoint waits, the reads of others go on
+        self.scheduler.budgets["Order_new"] = scheduler.Budget(100, 0, NOW + 30)
+        self.scheduler._waiting = [
+            (scheduler.ORDER, 0, "Order_new", "BTCUSD"),
+            (scheduler.READ, 1, "Positions_myPosition", "BTCUSD"),
+        ]
+        self.assertEqual(
+            self.scheduler._turn(), (scheduler.READ, 1, "Positions_myPosition", "BTCUSD")
+        )
+
+    def test_turn(self):
+        self.scheduler._served = {"BTCUSD": 5, "ETHUSD": 3}
+        self.scheduler._waiting = [
+            (scheduler.READ, 6, "Order_getOrders", "BTCUSD"),
+            (scheduler.READ, 7, "Order_getOrders", "ETHUSD"),
+            (scheduler.READ, 8, "Order_getOrders", "XRPUSD"),
+        ]
+        # XRPUSD was never served, then ETHUSD was served the longest ago
+        self.assertEqual(self.scheduler._turn()[3], "XRPUSD")
+        self.scheduler._waiting.pop()
+        self.assertEqual(self.scheduler._turn()[3], "ETHUSD")
+
+    def test_budget_per_operation(self):
+        # the reads of the orders do not spend the budget of Order_new
+        self.scheduler.call("Order", "Order_getOrders", {}, lambda: response(0))
+        self.assertIsNotNone(self.scheduler._delay("Order_getOrders", scheduler.READ))
+        self.assertIsNone(self.scheduler._delay("Order_new", scheduler.ORDER))
+        self.assertNotIn("Order", self.scheduler.budgets)
+
+    def test_limit(self):
+        now = [NOW]
+        limited = scheduler.RequestScheduler(limit=2, clock=lambda: now[0])
+        for _ in range(2):
+            limited.call("Market", "Market_symbolInfo", {}, lambda: ({}, None))
+        self.assertIsNone(self.scheduler._account_delay())
+        self.assertEqual(limited._account_delay(), scheduler.RATE_WINDOW)
+        now[0] += scheduler.RATE_WINDOW
+        self.assertIsNone(limited._account_delay())
+
+    def test_coalesce(self):
+        sent, release = Event(), Event()
+        calls, results = [], []
+
+        def send():
+            calls.append(1)
+            sent.set()
+            release.wait(1)
+            return response(90)
+
+        def read():
+            return self.scheduler.call(
+                "Positions", "Positions_myPosition", {"symbol": "BTCUSD"}, send
+            )
+
+        first = Thread(target=lambda: results.append(read()))
+        first.start()
+        sent.wait(1)
+        # the first read is in flight until the timer releases it
+        Timer(0.05, release.set).start()
+        results.append(read())
+        first.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [response(90)] * 2)
+        self.assertEqual(self.scheduler._in_flight, {})
+
+    def test_error(self):
+        def send():
+            raise ConnectionError
+
+        with self.assertRaises(ConnectionError):
+            self.scheduler.call("Market", "Market_symbolInfo", {}, send)
+        self.assertEqual(self.scheduler._in_flight, {})
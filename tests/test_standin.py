@@ -0,0 +1,146 @@
+# Standard Library
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from crypto_bot import standin
+from crypto_bot.bot import BybitExchange
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestParsePath(unittest.TestCase):
+    def test_trend(self):
+        path = standin.parse_path("trend:100:2")
+        self.assertEqual(path(0), 100)
+        self.assertEqual(path(10), 120)
+
+    def test_sine(self):
+        path = standin.parse_path("sine:100:10:4")
+        self.assertAlmostEqual(path(1), 110)
+        self.assertAlmostEqual(path(3), 90)
+
+    def test_walk_is_seeded(self):
+        path = standin.parse_path("walk:100:10:7")
+        prices = [path(t) for t in (0, 1, 5, 1)]
+        self.assertEqual(prices[0], 100)
+        self.assertEqual(prices[1], prices[3])
+        self.assertEqual(
+            prices, [standin.parse_path("walk:100:10:7")(t) for t in (0, 1, 5, 1)]
+        )
+
+    def test_file(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False) as f:
+            f.write("100\n101.5\n\n")
+        path = standin.parse_path(f"file:{f.name}")
+        self.assertEqual([path(t) for t in (0, 1.5, 10)], [100, 101.5, 101.5])
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            standin.parse_path("walk:100")
+
+
+class TestStandinEngine(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.price = 100.2
+        self.engine = standin.StandinEngine(lambda _: self.price, clock=self.clock)
+        self.rest = standin.StandinRest(self.engine)
+        self.ws = standin.StandinWebsocket(self.engine)
+
+    def test_quote(self):
+        self.assertEqual((self.engine.bid, self.engine.ask), (100.0, 100.5))
+        self.price = 98.7
+        self.engine.step()
+        self.assertEqual(
+            self.ws.get_data("instrument_info.100ms.BTCUSD"),
+            {"update": [{"bid1_price": 98.5, "ask1_price": 99.0, "last_price": 98.7}]},
+        )
+
+    def test_post_only_rejected(self):
+        body, _ = self.rest.Order_new(
+            side="Buy", symbol="BTCUSD", qty=10, price=100.5
+        ).result()
+        self.assertEqual(body["result"]["order_status"], "Cancelled")
+        self.assertEqual(self.engine.orders, {})
+        self.assertEqual(self.ws.get_data("order")[0]["order_status"], "Cancelled")
+
+    def test_fill(self):
+        body, _ = self.rest.Order_new(
+            side="Buy", symbol="BTCUSD", qty=10, price=99
+        ).result()
+        order_id = body["result"]["order_id"]
+        self.price = 99.2
+        self.engine.step()
+        self.assertIn(order_id, self.engine.orders)
+        self.price = 98.9
+        self.engine.step()
+        self.assertEqual(self.engine.orders, {})
+        self.assertEqual(
+            (self.engine.size, self.engine.entry_price, self.engine.fills), (10, 99, 1)
+        )
+        self.assertEqual(self.ws.get_data("execution")[0]["exec_qty"], 10)
+        self.assertEqual(self.ws.get_data("position")[0]["size"], 10)
+        self.assertEqual(self.ws.get_data("order")[0]["order_status"], "Filled")
+
+    def test_partial_fill(self):
+        self.engine.partial_rate = 1.0
+        self.rest.Order_new(side="Sell", symbol="BTCUSD", qty=10, price=101)
+        self.price = 101
+        self.engine.step()
+        (order,) = self.engine.orders.values()
+        self.assertEqual(order["order_status"], "PartiallyFilled")
+        self.assertEqual(-self.engine.size, order["cum_exec_qty"])
+        self.assertLess(order["cum_exec_qty"], 10)
+
+        body, _ = self.rest.Order_getOrders(
+            symbol="BTCUSD", order_status="New,PartiallyFilled"
+        ).result()
+        self.assertEqual(body["result"]["data"], [order])
+
+    def test_rate_limit(self):
+        self.engine.rate_limit = 2
+        body, _ = self.rest.Market_symbolInfo().result()
+        self.assertEqual((body["rate_limit"], body["rate_limit_status"]), (2, 1))
+        body, _ = self.rest.Market_symbolInfo().result()
+        self.assertEqual(body["rate_limit_status"], 0)
+        self.assertEqual(self.engine.requests["Market_symbolInfo"], 2)
+
+    def test_latency(self):
+        self.engine.latency = 1.0
+        self.rest.Order_new(side="Buy", symbol="BTCUSD", qty=1, price=90)
+        self.rest.Order_new(side="Buy", symbol="BTCUSD", qty=2, price=91)
+        self.assertEqual(self.ws.get_data("order"), [])
+        self.clock.now = 1.0
+        # the most recent message first, like BybitWebsocket
+        self.assertEqual(self.ws.get_data("order")[0]["qty"], 2)
+        self.assertEqual(self.ws.get_data("order")[0]["qty"], 1)
+        self.assertEqual(self.ws.get_data("order"), [])
+
+    def test_exchange(self):
+        exchange = BybitExchange(rest=self.rest, ws=self.ws)
+        exchange.long(99, 10, timeout=0.1)
+        (order,) = exchange.orders.longs.values()
+        self.assertEqual((order.price, order.quantity), (99, 10))
+        exchange.amend(order.order_id, 98, 5, timeout=0.1)
+        self.assertEqual(exchange.orders.longs[order.order_id].price, 98)
+        exchange.cancel_all(timeout=0.1)
+        self.assertEqual(exchange.orders.longs, {})
+
+
+class TestLoadtest(unittest.TestCase):
+    def test_runs(self):
+        engine = standin.StandinEngine(
+            standin.parse_path("sine:60000:20:2"), latency=0.001
+        )
+        with patch.object(standin, "STEP", 0.01):
+            report = standin.loadtest(engine, 10, 5, 10, 1.0)
+        self.assertIsNone(report.error)
+        self.assertGreater(report.requests["Order_new"], 0)
+        self.assertGreater(report.messages, 0)
@@ -0,0 +1,30 @@
+# Standard Library
+import unittest
+
+from crypto_bot import sweep
+
+
+class TestSweep(unittest.TestCase):
+    def test_parse_values(self):
+        self.assertEqual(sweep.parse_values("10,25", int), [10, 25])
+        self.assertEqual(sweep.parse_values("100:200:50", int), [100, 150, 200])
+        self.assertEqual(sweep.parse_values("1.2:1.4:0.1", float), [1.2, 1.3, 1.4])
+
+    def test_combinations(self):
+        grid = {"a": [1, 2], "b": [3, 4, 5]}
+        self.assertEqual(len(list(sweep.combinations(grid))), 6)
+        self.assertEqual(
+            list(sweep.combinations(grid, 4, seed=1)),
+            list(sweep.combinations(grid, 4, seed=1)),
+        )
+        self.assertEqual(len(list(sweep.combinations(grid, 4))), 4)
+
+    def test_ranking(self):
+        results = [
+            sweep.Result({}, 1, 0.1, 0.2, 1, 0.5),
+            sweep.Result({}, 1, 0.2, 0.3, 1, 0.5),
+            sweep.Result({}, 1, 0.2, 0.1, 1, 0.5),
+        ]
+        self.assertEqual(
+            sorted(results, key=sweep.ranking), [results[2], results[1], results[0]]
+        )